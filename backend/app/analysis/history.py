@@ -0,0 +1,136 @@
+"""銘柄ごとに既定の指標の履歴を保存し、新しい日足の分だけ状態を進めて伸ばす。
+
+指標のDataFrame（daily_{code}.technical.{開始日}.<形式>）と、その最後の足まで進めた IndicatorState
+（daily_{code}.technical.{開始日}.json）を日足ストアの隣に置く。指標の値は開始日で変わるので、履歴は
+開始日ごとに持つ。同じ開始日の日足が伸びたときは増えた足だけ状態を進めて末尾に追加するので、全期間を
+計算し直さない。調整後株価が遡って変わったとき（株式分割など）は全期間を計算して保存し直す。
+銘柄ごとに最近保存した MAX_STARTS_PER_CODE 個の開始日の履歴だけを残す。
+"""
+
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from app.analysis.indicators import (
+    DEFAULT_INDICATORS,
+    IndicatorState,
+    compute_indicators_with_state,
+    output_columns,
+)
+from app.analysis.technical import source_arrays
+from app.cache_format import atomic_write, format_for_path
+from app.jquants_client import daily_store_path
+from app.utils import normalize_date
+
+logger = logging.getLogger(__name__)
+
+# 履歴の読み書きに使うエンドポイント名。スキーマがないので列の型は変換しない
+_ENDPOINT = "technical"
+
+# 銘柄ごとに残す開始日の履歴の数。開始日の違うリクエストが交互に来ても計算し直さずに済む
+MAX_STARTS_PER_CODE = 4
+
+
+def _history_paths(code: str, start: str) -> tuple[Path, Path]:
+    """開始日（YYYYMMDD）の指標の履歴のデータファイルと状態ファイルのパスを返す。"""
+    data_path = daily_store_path(code)
+    stem = f".technical.{start}"
+    return data_path.with_suffix(f"{stem}{data_path.suffix}"), data_path.with_suffix(f"{stem}.json")
+
+
+def _start_of(prices: pd.DataFrame) -> str:
+    return normalize_date(prices["date"].iloc[0]).replace("-", "")
+
+
+def _saved_at(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _prune_histories(code: str, start: str) -> None:
+    """start と、それ以外で最近保存した MAX_STARTS_PER_CODE - 1 個の開始日を残して履歴を削除する。"""
+    data_path = daily_store_path(code)
+    _, keep = _history_paths(code, start)
+    states = [path for path in data_path.parent.glob(f"{data_path.stem}.technical.*.json") if path != keep]
+    states.sort(key=_saved_at, reverse=True)
+    for state_path in states[MAX_STARTS_PER_CODE - 1 :]:
+        for path in data_path.parent.glob(f"{state_path.stem}.*"):
+            path.unlink(missing_ok=True)
+
+
+def _row_key(df: pd.DataFrame, position: int) -> str:
+    """1行の日付と終値。履歴と日足の同じ位置の足が同じかどうかの比較に使う。"""
+    row = df.iloc[position]
+    return f"{normalize_date(row['date'])}:{float(row['close'])!r}"
+
+
+def _load_history(code: str, start: str) -> tuple[pd.DataFrame, IndicatorState] | None:
+    """保存済みの履歴と状態を読み込む。ないか、壊れているか、両者が食い違っていればNone。"""
+    frame_path, state_path = _history_paths(code, start)
+    if not frame_path.exists() or not state_path.exists():
+        return None
+    try:
+        frame = format_for_path(frame_path).read(frame_path, _ENDPOINT)
+        meta = json.loads(state_path.read_text())
+        state = IndicatorState.from_dict(meta["state"])
+    except Exception:
+        logger.warning("読み込めない指標の履歴を破棄します: %s", frame_path)
+        return None
+    # 別のワーカーが書き換えている途中なら、データと状態が別々の世代になっていることがある
+    if frame.empty or len(frame) != state.bars or meta.get("last") != _row_key(frame, -1):
+        return None
+    if state.specs != DEFAULT_INDICATORS:
+        return None
+    return frame, state
+
+
+def _save_history(code: str, frame: pd.DataFrame, state: IndicatorState) -> None:
+    """履歴を保存する。データを先に書くので、途中で落ちても状態がデータより先に進まない。"""
+    frame_path, state_path = _history_paths(code, _start_of(frame))
+    format_for_path(frame_path).write(frame_path, frame, _ENDPOINT)
+    text = json.dumps({"last": _row_key(frame, -1), "state": state.to_dict()})
+    atomic_write(state_path, lambda tmp: tmp.write_text(text))
+
+
+def _rebuild(code: str, prices: pd.DataFrame) -> pd.DataFrame:
+    values, state = compute_indicators_with_state(source_arrays(prices, DEFAULT_INDICATORS), DEFAULT_INDICATORS)
+    frame = pd.concat([prices.reset_index(drop=True), pd.DataFrame(values)], axis=1)
+    _save_history(code, frame, state)
+    _prune_histories(code, _start_of(frame))
+    return frame
+
+
+def _extend(code: str, frame: pd.DataFrame, state: IndicatorState, prices: pd.DataFrame) -> pd.DataFrame:
+    new = prices.iloc[len(frame) :].reset_index(drop=True)
+    sources = source_arrays(new, DEFAULT_INDICATORS)
+    rows = [state.advance({name: values[i] for name, values in sources.items()}) for i in range(len(new))]
+    added = pd.concat([new, pd.DataFrame(rows, columns=list(output_columns(DEFAULT_INDICATORS)))], axis=1)
+    frame = pd.concat([frame, added], ignore_index=True)
+    _save_history(code, frame, state)
+    return frame
+
+
+def technical_history(code: str, prices: pd.DataFrame) -> pd.DataFrame:
+    """日付順の空でない株価（'date' と 'close' を含む列）の後ろに既定の指標の列を付けたDataFrameを返す。
+
+    同じ開始日の保存済みの履歴と先頭の足が同じで、重なる期間の最後の足も一致すれば、履歴の先頭を返すか、
+    増えた足だけ状態を進めて履歴を伸ばす。そうでなければ全期間を計算して履歴を保存し直す。
+    """
+    history = _load_history(code, _start_of(prices))
+    if history is not None:
+        frame, state = history
+        overlap = min(len(frame), len(prices))
+        columns = [*prices.columns, *output_columns(DEFAULT_INDICATORS)]
+        if (
+            list(frame.columns) == columns
+            and _row_key(frame, 0) == _row_key(prices, 0)
+            and _row_key(frame, overlap - 1) == _row_key(prices, overlap - 1)
+        ):
+            if len(prices) <= len(frame):
+                return frame.iloc[: len(prices)].reset_index(drop=True)
+            return _extend(code, frame, state, prices)
+    return _rebuild(code, prices)
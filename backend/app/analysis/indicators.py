@@ -0,0 +1,1101 @@
+"""テクニカル指標のレジストリと計算エンジン。
+
+各指標はパラメータの既定値と、出力列ごとの計算の節（Node）を宣言する。節は入力系列
+（終値・高値など）や中間系列（移動平均・EMA・真の値幅など）を引数に持つので、要求された
+指標の節をたどると依存グラフ（DAG）になる。エンジンはそのグラフを1度だけ評価し、
+同じ中間系列（例: MACDとシグナルのEMA、SMAとボリンジャーバンドの累積和）を共有する。
+
+SMA・RSI・MACD・ボリンジャーバンドの式と欠損値の扱いは ta ライブラリ（pandas の
+rolling / ewm）と同じで、結果は浮動小数点の誤差の範囲で一致する。
+
+新しい日足を追加するときは IndicatorState で各節の状態（窓のリングバッファ、EMAの累積値、
+Welford の分散など）を1本あたり定数時間で進める。状態は to_dict / from_dict でJSONにできる。
+
+Glue の enrich ジョブ（Python 3.9）にも同じファイルを配布するので、app パッケージには
+依存せず NumPy と pandas だけを使う。
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+from collections import deque
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+# 系列の値と、系列の区切りや位置の配列の型
+FloatArray = npt.NDArray[np.float64]
+IndexArray = npt.NDArray[np.intp]
+BoolArray = npt.NDArray[np.bool_]
+
+# 指標の入力にできる系列
+SOURCES = ("open", "high", "low", "close", "volume")
+
+# EMAのブロック内で使う減衰率の逆数の上限（e^EXPONENT）。float64があふれない範囲にする
+_MAX_EXPONENT = 500.0
+
+# 指標のパラメータ（窓幅・期間・倍率）の上限。リクエストで指定できるので、大きすぎる値は受け付けない
+MAX_PARAM_VALUE = 1000
+
+
+@dataclass(frozen=True)
+class Node:
+    """依存グラフの節。kind は計算の種類、args はその引数（依存する節や窓幅などの定数）。"""
+
+    kind: str
+    args: tuple[Any, ...] = ()
+
+    def dependencies(self) -> list[Node]:
+        return [arg for arg in self.args if isinstance(arg, Node)]
+
+
+def source(name: str) -> Node:
+    """入力系列の節。"""
+    return Node("source", (name,))
+
+
+CLOSE = source("close")
+HIGH = source("high")
+LOW = source("low")
+VOLUME = source("volume")
+
+
+# ---- 中間系列の節 ----
+
+
+def diff(values: Node) -> Node:
+    """前日との差（先頭は欠損）。"""
+    return Node("diff", (values,))
+
+
+def sma(values: Node, window: int) -> Node:
+    """単純移動平均（rolling(window, min_periods=window).mean()）。同じ系列の窓は累積和を共有する。"""
+    return Node("sma", (Node("sums", (values,)), window))
+
+
+def rolling_std(values: Node, window: int) -> Node:
+    """母標準偏差（ddof=0）。同じ窓の移動平均を共有する。"""
+    return Node("std", (values, sma(values, window), window))
+
+
+def ema(values: Node, alpha: float, min_periods: int) -> Node:
+    """adjust=False の指数移動平均（ewm(alpha=alpha, min_periods=min_periods, adjust=False).mean()）。"""
+    return Node("ema", (values, alpha, min_periods))
+
+
+def span_ema(values: Node, span: int) -> Node:
+    """期間 span のEMA（ewm(span=span, min_periods=span, adjust=False).mean()）。"""
+    return ema(values, 2.0 / (span + 1.0), span)
+
+
+def wilder(values: Node, window: int) -> Node:
+    """Wilder の平滑化（alpha = 1 / window）。"""
+    return ema(values, 1.0 / window, window)
+
+
+def rolling_max(values: Node, window: int) -> Node:
+    return Node("rolling_max", (values, window))
+
+
+def rolling_min(values: Node, window: int) -> Node:
+    return Node("rolling_min", (values, window))
+
+
+def true_range() -> Node:
+    """真の値幅。先頭の日は高値 - 安値。"""
+    return Node("true_range", (HIGH, LOW, CLOSE))
+
+
+# ---- 節の計算 ----
+
+
+class _Segments:
+    """複数の系列（銘柄）を連結した入力の区切り。starts は各系列の先頭の位置。
+
+    窓や再帰の計算は全体を1回で行い、系列の境目をまたぐ位置を欠損にするか、境目で計算をやり直す。
+    """
+
+    def __init__(self, starts: IndexArray, n: int) -> None:
+        self.starts = starts
+        self.lengths = np.diff(np.append(starts, n))
+        # 各位置の系列の番号と、系列の中での位置（系列の先頭が0）
+        self.ids = np.repeat(np.arange(len(starts)), self.lengths)
+        self.positions = np.arange(n) - starts[self.ids]
+
+    @classmethod
+    def create(cls, starts: Iterable[int] | None, n: int) -> _Segments:
+        if starts is None or n == 0:
+            return cls(np.zeros(1 if n else 0, dtype=np.intp), n)
+        array = np.asarray(list(starts), dtype=np.intp)
+        if len(array) == 0 or array[0] != 0 or array[-1] >= n or (np.diff(array) <= 0).any():
+            raise ValueError("系列の区切りは0から始まり、系列の長さ未満で増加する位置にしてください")
+        return cls(array, n)
+
+    def first_valid(self, valid: BoolArray) -> IndexArray:
+        """系列ごとの最初の有効値の位置。有効値のない系列は -1。"""
+        positions = np.flatnonzero(valid)
+        index = np.searchsorted(positions, self.starts)
+        found = np.append(positions, len(valid))[index]
+        return np.where(found < self.starts + self.lengths, found, -1)
+
+
+def _segment_cumsum(values: FloatArray, segments: _Segments) -> FloatArray:
+    """系列ごとの累積和。
+
+    全体をそのまま累積すると後ろの系列ほど値が大きくなって桁落ちするので、系列の先頭で前の系列の
+    合計を引いてから全体の累積和を取り、系列ごとに残った基準の値を引く。
+    """
+    starts = segments.starts
+    if len(starts) <= 1:
+        return np.cumsum(values)
+    totals = np.add.reduceat(values, starts)
+    corrected = values.copy()
+    corrected[starts[1:]] -= totals[:-1]
+    sums = np.cumsum(corrected)
+    base = np.zeros(len(starts))
+    base[1:] = sums[starts[1:] - 1] - totals[:-1]
+    return np.asarray(sums - np.repeat(base, segments.lengths))
+
+
+class _RollingSums:
+    """移動平均で共有する累積和。精度のため系列ごとに最初の有効値を引いてから足し合わせる。"""
+
+    def __init__(self, values: FloatArray, segments: _Segments | None = None) -> None:
+        segments = segments if segments is not None else _Segments.create(None, len(values))
+        self.values = values
+        self.positions = segments.positions
+        valid = ~np.isnan(values)
+        first = segments.first_valid(valid)
+        refs = np.zeros(len(first))
+        refs[first >= 0] = values[first[first >= 0]]
+        self.ref = np.repeat(refs, segments.lengths)
+        self.sums = _segment_cumsum(np.where(valid, values - self.ref, 0.0), segments)
+        self.counts = np.concatenate(([0], np.cumsum(valid)))
+
+    def mean(self, window: int) -> FloatArray:
+        """窓の値がすべて同じ系列の中で揃っている位置だけ平均を返す。"""
+        n = len(self.sums)
+        out = np.full(n, np.nan)
+        if n < window:
+            return out
+        # 系列の先頭から始まる窓は、その系列の累積和をそのまま使う
+        before = np.concatenate(([0.0], self.sums[: n - window]))
+        total = self.sums[window - 1 :] - np.where(self.positions[window - 1 :] >= window, before, 0.0)
+        full = (self.counts[window:] - self.counts[:-window]) == window
+        out[window - 1 :] = np.where(full, self.ref[window - 1 :] + total / window, np.nan)
+        out[self.positions < window - 1] = np.nan
+        return out
+
+
+def _diff(values: FloatArray, segments: _Segments) -> FloatArray:
+    out = np.full(len(values), np.nan)
+    out[1:] = values[1:] - values[:-1]
+    out[segments.starts] = np.nan
+    return out
+
+
+def _rolling_std(values: FloatArray, mean: FloatArray, window: int) -> FloatArray:
+    """共有した移動平均からの偏差で計算するので桁落ちしない。"""
+    n = len(values)
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
+    center = mean[window - 1 :]
+    total = np.zeros(n - window + 1)
+    # 窓内の位置ごとに連続したスライスで偏差の2乗を足す（窓の長さ回のベクトル演算）
+    for offset in range(window):
+        deviation = values[offset : n - window + 1 + offset] - center
+        total += deviation * deviation
+    out[window - 1 :] = np.sqrt(total / window)
+    return out
+
+
+@functools.lru_cache(maxsize=64)
+def _decay_powers(alpha: float, size: int) -> FloatArray:
+    """EMAの1ブロック分の減衰率のべき乗 d^1, d^2, ...（d = 1 - alpha）。
+
+    ブロックは size 以下にする。size は系列の長さを2のべき乗に切り上げた値を渡し、
+    長さの近い系列で同じ配列を使い回す。
+    """
+    decay = 1.0 - alpha
+    block = max(1, int(_MAX_EXPONENT / -math.log(decay))) if decay > 0 else 1
+    block = min(block, size)
+    powers = decay ** np.arange(1, block + 1, dtype=np.float64)
+    powers.flags.writeable = False
+    return powers
+
+
+def _ema(values: FloatArray, alpha: float, min_periods: int, segments: _Segments | None = None) -> FloatArray:
+    """adjust=False の指数移動平均。
+
+    values は1次元、または同じalphaで計算する複数の系列を列に並べた2次元配列。segments で区切った
+    系列ごとに最初の有効値から計算をやり直す。系列を最初の有効値で揃えて行列の列に並べ、
+    e[t] = (1 - alpha) * e[t-1] + alpha * x[t] の再帰を全系列まとめてブロックごとに
+    e[i+k] = d^k * (e[i] + alpha * Σ x[i+l] / d^l) として累積和で計算する（d = 1 - alpha）。
+    最初の有効値のあとに欠損がある系列は pandas と同じ重みの減衰にするため pandas で計算する。
+    """
+    segments = segments if segments is not None else _Segments.create(None, len(values))
+    if values.ndim == 2:
+        return np.column_stack([_ema(column, alpha, min_periods, segments) for column in values.T])
+
+    out = np.full(len(values), np.nan)
+    missing = np.isnan(values)
+    if len(segments.starts) == 1:
+        # 1系列で最初の有効値のあとに欠損がなければ、系列を揃える並べ替えは要らない
+        valid = np.flatnonzero(~missing)
+        if len(valid) == 0:
+            return out
+        if len(valid) == len(values) - valid[0]:
+            return _ema_block(values, alpha, min_periods, int(valid[0]))
+    first = segments.first_valid(~missing)
+    segment_of = segments.ids
+    # 各位置の、系列の最初の有効値からの行
+    offset = first - segments.starts
+    row = segments.positions - offset[segment_of]
+    used = (first[segment_of] >= 0) & (row >= 0)
+    gaps = np.bincount(segment_of[used & missing], minlength=len(first)) > 0
+
+    fast = used & ~gaps[segment_of]
+    if fast.any():
+        column = _ranks((first >= 0) & ~gaps)[segment_of[fast]]
+        # 系列ごとの行が連続するよう (系列, 行) の順に置き、転置して列ごとに計算する
+        block = np.zeros((int(column[-1]) + 1, int(row[fast].max()) + 1))
+        block[column, row[fast]] = values[fast]
+        out[fast] = _ema_block(block.T, alpha, min_periods, 0).T[column, row[fast]]
+
+    if gaps.any():
+        inside = gaps[segment_of]
+        column = _ranks(gaps)[segment_of[inside]]
+        positions = segments.positions[inside]
+        frame = np.full((int(segments.lengths[gaps].max()), int(column[-1]) + 1), np.nan)
+        frame[positions, column] = values[inside]
+        ewm = pd.DataFrame(frame).ewm(alpha=alpha, min_periods=min_periods, adjust=False).mean()
+        out[inside] = ewm.to_numpy(dtype=np.float64)[positions, column]
+    return out
+
+
+def _ranks(selected: BoolArray) -> IndexArray:
+    """選んだ系列を詰めて並べたときの列番号（選んでいない系列は -1）。"""
+    return np.where(selected, np.cumsum(selected) - 1, -1)
+
+
+def _ema_block(values: FloatArray, alpha: float, min_periods: int, first: int) -> FloatArray:
+    """values[first:] に欠損がない系列（列）のEMA。"""
+    out = np.full(values.shape, np.nan)
+    x = values[first:]
+    if len(x) == 0:
+        return out
+    result = np.empty(x.shape)
+    result[0] = x[0]
+    powers = _decay_powers(alpha, 1 << (len(x) - 1).bit_length())
+    if x.ndim == 2:
+        powers = powers[:, None]
+    i = 1
+    while i < len(x):
+        j = min(len(x), i + len(powers))
+        p = powers[: j - i]
+        result[i:j] = p * (result[i - 1] + alpha * np.cumsum(x[i:j] / p, axis=0))
+        i = j
+    out[first:] = result
+    # 観測値が min_periods に満たない位置は欠損
+    out[first : first + min_periods - 1] = np.nan
+    return out
+
+
+def _moves(change: FloatArray) -> FloatArray:
+    """上昇幅と下落幅を列に並べる。RSIでは同じ平滑化を1回の計算で済ませる。"""
+    with np.errstate(invalid="ignore"):
+        return np.column_stack((np.where(change > 0, change, 0.0), np.where(change < 0, -change, 0.0)))
+
+
+def _rsi(smoothed: FloatArray) -> FloatArray:
+    up, down = smoothed[:, 0], smoothed[:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.asarray(np.where(down == 0, 100.0, 100 - (100 / (1 + up / down))))
+
+
+def _rolling_extreme(
+    values: FloatArray, window: int, reduce: Callable[..., FloatArray], segments: _Segments
+) -> FloatArray:
+    """窓内の最大値・最小値。窓に欠損があるか、窓が系列の境目をまたぐ位置は欠損。"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1 :] = reduce(np.lib.stride_tricks.sliding_window_view(values, window), axis=1)
+    out[segments.positions < window - 1] = np.nan
+    return out
+
+
+def _true_range(high: FloatArray, low: FloatArray, close: FloatArray, segments: _Segments) -> FloatArray:
+    """真の値幅。系列の先頭の日は前日の終値がないので高値と安値の差。"""
+    out = np.asarray(high - low)
+    if len(close) > 1:
+        previous = close[:-1]
+        out[1:] = np.maximum(out[1:], np.maximum(np.abs(high[1:] - previous), np.abs(low[1:] - previous)))
+    starts = segments.starts
+    out[starts] = high[starts] - low[starts]
+    return out
+
+
+def _stochastic(close: FloatArray, highest: FloatArray, lowest: FloatArray) -> FloatArray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.asarray(100 * (close - lowest) / (highest - lowest))
+
+
+def _obv(change: FloatArray, volume: FloatArray, segments: _Segments) -> FloatArray:
+    """On Balance Volume。前日比が上げなら出来高を足し、下げなら引く（系列の先頭の日は0）。"""
+    signed = np.where(np.isnan(change) | np.isnan(volume), 0.0, np.sign(change) * volume)
+    return _segment_cumsum(signed, segments)
+
+
+_KERNELS: dict[str, Callable[..., Any]] = {
+    "diff": _diff,
+    "sums": _RollingSums,
+    "sma": lambda sums, window: sums.mean(window),
+    "std": _rolling_std,
+    "ema": _ema,
+    "moves": _moves,
+    "rsi": _rsi,
+    "sub": lambda left, right: left - right,
+    "band": lambda center, width, k: center + k * width,
+    "rolling_max": lambda values, window, segments: _rolling_extreme(values, window, np.max, segments),
+    "rolling_min": lambda values, window, segments: _rolling_extreme(values, window, np.min, segments),
+    "true_range": _true_range,
+    "stochastic": _stochastic,
+    "obv": _obv,
+}
+
+# 系列の区切り（segments=）を受け取る計算
+_SEGMENTED = frozenset({"diff", "sums", "ema", "rolling_max", "rolling_min", "true_range", "obv"})
+
+
+# ---- 指標のレジストリ ----
+
+
+@dataclass(frozen=True)
+class Indicator:
+    """レジストリに登録した指標。
+
+    outputs はパラメータを受け取り {列名のテンプレート: 節} を返す。テンプレートは
+    str.format でパラメータを埋める（例: "sma_{window}"）。
+    """
+
+    name: str
+    description: str
+    params: Mapping[str, float]
+    outputs: Callable[..., dict[str, Node]]
+
+
+REGISTRY: dict[str, Indicator] = {}
+
+
+def register(
+    name: str, description: str, **params: float
+) -> Callable[[Callable[..., dict[str, Node]]], Callable[..., dict[str, Node]]]:
+    """指標を登録するデコレータ。キーワード引数がパラメータとその既定値（int か float）。"""
+
+    def decorator(outputs: Callable[..., dict[str, Node]]) -> Callable[..., dict[str, Node]]:
+        if name in REGISTRY:
+            raise ValueError(f"指標 {name} は登録済みです")
+        REGISTRY[name] = Indicator(name, description, dict(params), outputs)
+        return outputs
+
+    return decorator
+
+
+@register("sma", "単純移動平均", window=25)
+def _sma_indicator(window: int) -> dict[str, Node]:
+    return {"sma_{window}": sma(CLOSE, window)}
+
+
+@register("ema", "指数移動平均", span=20)
+def _ema_indicator(span: int) -> dict[str, Node]:
+    return {"ema_{span}": span_ema(CLOSE, span)}
+
+
+@register("rsi", "RSI（Wilder の平滑化）", window=14)
+def _rsi_indicator(window: int) -> dict[str, Node]:
+    return {"rsi_{window}": Node("rsi", (wilder(Node("moves", (diff(CLOSE),)), window),))}
+
+
+@register("macd", "MACD・シグナル・ヒストグラム", fast=12, slow=26, signal=9)
+def _macd_indicator(fast: int, slow: int, signal: int) -> dict[str, Node]:
+    macd = Node("sub", (span_ema(CLOSE, fast), span_ema(CLOSE, slow)))
+    macd_signal = span_ema(macd, signal)
+    return {"macd": macd, "macd_signal": macd_signal, "macd_histogram": Node("sub", (macd, macd_signal))}
+
+
+@register("bb", "ボリンジャーバンド", window=20, k=2.0)
+def _bollinger_indicator(window: int, k: float) -> dict[str, Node]:
+    middle = sma(CLOSE, window)
+    width = rolling_std(CLOSE, window)
+    return {
+        "bb_upper": Node("band", (middle, width, k)),
+        "bb_middle": middle,
+        "bb_lower": Node("band", (middle, width, -k)),
+    }
+
+
+@register("atr", "ATR（真の値幅の Wilder 平滑化）", window=14)
+def _atr_indicator(window: int) -> dict[str, Node]:
+    return {"atr_{window}": wilder(true_range(), window)}
+
+
+@register("stoch", "ストキャスティクス（%K・%D）", window=14, smooth=3)
+def _stochastic_indicator(window: int, smooth: int) -> dict[str, Node]:
+    k = Node("stochastic", (CLOSE, rolling_max(HIGH, window), rolling_min(LOW, window)))
+    return {"stoch_k": k, "stoch_d": sma(k, smooth)}
+
+
+@register("obv", "OBV（On Balance Volume）")
+def _obv_indicator() -> dict[str, Node]:
+    return {"obv": Node("obv", (diff(CLOSE), VOLUME))}
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """パラメータを決めた指標。params はレジストリの宣言順の (名前, 値)。"""
+
+    name: str
+    params: tuple[tuple[str, float], ...]
+
+    @classmethod
+    def create(cls, name: str, **overrides: float) -> IndicatorSpec:
+        """既定値に overrides を上書きした指標を作る。未知の指標やパラメータは ValueError。"""
+        indicator = REGISTRY.get(name)
+        if indicator is None:
+            raise ValueError(f"未知の指標です: {name}（{', '.join(REGISTRY)}）")
+        unknown = set(overrides) - set(indicator.params)
+        if unknown:
+            raise ValueError(f"指標 {name} のパラメータではありません: {', '.join(sorted(unknown))}")
+        params = []
+        for key, default in indicator.params.items():
+            value = overrides.get(key, default)
+            if not 0 < value <= MAX_PARAM_VALUE:
+                raise ValueError(f"{name} の {key} は0より大きく{MAX_PARAM_VALUE}以下の値を指定してください")
+            params.append((key, type(default)(value)))
+        return cls(name, tuple(params))
+
+    def columns(self) -> dict[str, Node]:
+        """{出力列名: 節}。
+
+        列名のテンプレートに含まれないパラメータが既定値と違う場合は、同じ指標の既定の列と
+        区別するため、そのパラメータの値を列名の末尾に付ける（例: macd_8_17_9）。
+        """
+        indicator = REGISTRY[self.name]
+        params = dict(self.params)
+        columns = {}
+        for template, node in indicator.outputs(**params).items():
+            named = {field for _, field, _, _ in Formatter().parse(template) if field}
+            rest = [key for key in params if key not in named]
+            column = template.format(**params)
+            if any(params[key] != indicator.params[key] for key in rest):
+                column += "_" + "_".join(_format_value(params[key]) for key in rest)
+            columns[column] = node
+        return columns
+
+    def __str__(self) -> str:
+        return ":".join([self.name, *(_format_value(value) for _, value in self.params)])
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def parse_indicators(text: str) -> tuple[IndicatorSpec, ...]:
+    """ "sma:5,sma:25,macd:fast=8,bb:20:2.5" のような指定を解析する。
+
+    指標はカンマ区切りで、パラメータはコロンで続ける。パラメータは宣言順の位置指定か
+    名前=値で指定し、省略したものは既定値になる。不正な指定は ValueError。
+    """
+    specs: list[IndicatorSpec] = []
+    for token in text.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        name, *args = token.split(":")
+        name = name.strip().lower()
+        indicator = REGISTRY.get(name)
+        if indicator is None:
+            raise ValueError(f"未知の指標です: {name}（{', '.join(REGISTRY)}）")
+        keys = list(indicator.params)
+        if len(args) > len(keys):
+            raise ValueError(f"指標 {name} のパラメータは {len(keys)} 個までです: {token}")
+        overrides: dict[str, float] = {}
+        for position, arg in enumerate(args):
+            key, sep, value = arg.partition("=")
+            if not sep:
+                key, value = keys[position], arg
+            key = key.strip()
+            default = indicator.params.get(key)
+            if default is None:
+                raise ValueError(f"指標 {name} のパラメータではありません: {key}")
+            try:
+                overrides[key] = type(default)(value.strip())
+            except ValueError:
+                raise ValueError(f"{name} の {key} が数値ではありません: {value}") from None
+        specs.append(IndicatorSpec.create(name, **overrides))
+    return tuple(specs)
+
+
+def output_columns(specs: Iterable[IndicatorSpec]) -> dict[str, Node]:
+    """指標の出力列と節。後の指標が同じ列名を出す場合は後の方を使う。"""
+    columns: dict[str, Node] = {}
+    for spec in specs:
+        columns.update(spec.columns())
+    return columns
+
+
+def _evaluation_order(outputs: Iterable[Node]) -> list[Node]:
+    """出力に必要な節を、依存する節が先に来る順に並べる（深さ優先の帰りがけ順）。"""
+    order: list[Node] = []
+    seen: set[Node] = set()
+
+    def visit(node: Node) -> None:
+        if node in seen:
+            return
+        seen.add(node)
+        for dependency in node.dependencies():
+            visit(dependency)
+        order.append(node)
+
+    for node in outputs:
+        visit(node)
+    return order
+
+
+@functools.lru_cache(maxsize=256)
+def _plan(specs: tuple[IndicatorSpec, ...]) -> tuple[dict[str, Node], list[Node]]:
+    """指標の組ごとの (出力列と節, 評価順)。同じ組は2回目から組み立てを省く。"""
+    outputs = output_columns(specs)
+    return outputs, _evaluation_order(outputs.values())
+
+
+def required_sources(specs: Iterable[IndicatorSpec]) -> list[str]:
+    """指標の計算に必要な入力系列の名前。"""
+    _, order = _plan(tuple(specs))
+    return [node.args[0] for node in order if node.kind == "source"]
+
+
+def _evaluate(order: list[Node], sources: Mapping[str, Any], starts: Iterable[int] | None = None) -> dict[Node, Any]:
+    """節を依存順に一括で評価する。"""
+    values: dict[Node, Any] = {}
+    for node in order:
+        if node.kind == "source":
+            name = node.args[0]
+            if name not in sources:
+                raise ValueError(f"指標の計算に {name} の系列が必要です")
+            values[node] = np.ascontiguousarray(sources[name], dtype=np.float64)
+    segments = _Segments.create(starts, len(next(iter(values.values()))) if values else 0)
+    for node in order:
+        if node.kind == "source":
+            continue
+        args = [values[arg] if isinstance(arg, Node) else arg for arg in node.args]
+        kernel = _KERNELS[node.kind]
+        values[node] = kernel(*args, segments=segments) if node.kind in _SEGMENTED else kernel(*args)
+    return values
+
+
+def compute_indicators(
+    sources: Mapping[str, Any], specs: Iterable[IndicatorSpec], starts: Iterable[int] | None = None
+) -> dict[str, FloatArray]:
+    """入力系列（同じ長さの配列）から指標を計算し、{列名: 配列} を返す。
+
+    要求された指標が使う節だけを依存順に1度ずつ評価する。必要な入力系列がなければ ValueError。
+    starts を渡すと、入力は複数の系列（銘柄）を連結したものとして扱い、starts の各位置（各系列の
+    先頭）で窓と再帰の計算をやり直す。結果は系列ごとに計算した場合と浮動小数点の誤差の範囲で一致する。
+    """
+    outputs, order = _plan(tuple(specs))
+    values = _evaluate(order, sources, starts)
+    return {column: values[node] for column, node in outputs.items()}
+
+
+# ---- 1本ずつ進める計算 ----
+#
+# 状態を持つ節はそれぞれ step で1本分の入力から1本分の値を返す。warm は一括計算した入力の
+# 配列（引数の節は評価済みの値）から、その最後の足まで進めたのと同じ状態を作る。
+
+
+def _is_nan(value: float) -> bool:
+    return value != value
+
+
+class _LagStream:
+    """前日の値（diff）。"""
+
+    def __init__(self, previous: float = math.nan) -> None:
+        self.previous = previous
+
+    @classmethod
+    def warm(cls, values: FloatArray) -> _LagStream:
+        return cls(float(values[-1]) if len(values) else math.nan)
+
+    def step(self, value: float) -> float:
+        change = value - self.previous
+        self.previous = value
+        return change
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"previous": self.previous}
+
+
+class _MeanStream:
+    """単純移動平均。窓のリングバッファと合計を持ち、窓が一巡するごとに合計を計算し直して誤差をためない。"""
+
+    def __init__(self, window: int, buffer: Iterable[float] = (), total: float = 0.0, since_refresh: int = 0) -> None:
+        self.window = window
+        self.buffer: deque[float] = deque(buffer, maxlen=window)
+        self.total = total
+        self.valid = sum(1 for value in self.buffer if not _is_nan(value))
+        self.since_refresh = since_refresh
+
+    @classmethod
+    def warm(cls, values: FloatArray, window: int) -> _MeanStream:
+        tail = values[-window:]
+        return cls(window, tail.tolist(), float(np.nansum(tail)))
+
+    def step(self, value: float, window: int) -> float:
+        if len(self.buffer) == self.window:
+            oldest = self.buffer[0]
+            if not _is_nan(oldest):
+                self.total -= oldest
+                self.valid -= 1
+        self.buffer.append(value)
+        if not _is_nan(value):
+            self.total += value
+            self.valid += 1
+        self.since_refresh += 1
+        if self.since_refresh >= self.window:
+            self.total = math.fsum(v for v in self.buffer if not _is_nan(v))
+            self.since_refresh = 0
+        return self.total / self.window if self.valid == self.window else math.nan
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "window": self.window,
+            "buffer": list(self.buffer),
+            "total": self.total,
+            "since_refresh": self.since_refresh,
+        }
+
+
+class _StdStream:
+    """窓の母標準偏差。値の入れ替えを Welford の更新で反映し、窓が一巡するごとに計算し直す。"""
+
+    def __init__(
+        self,
+        window: int,
+        buffer: Iterable[float] = (),
+        mean: float = 0.0,
+        m2: float = 0.0,
+        ready: bool = False,
+        since_refresh: int = 0,
+    ) -> None:
+        self.window = window
+        self.buffer: deque[float] = deque(buffer, maxlen=window)
+        self.missing = sum(1 for value in self.buffer if _is_nan(value))
+        self.mean = mean
+        self.m2 = m2
+        self.ready = ready
+        self.since_refresh = since_refresh
+
+    @classmethod
+    def warm(cls, values: FloatArray, mean: FloatArray, window: int) -> _StdStream:
+        return cls(window, values[-window:].tolist())
+
+    def step(self, value: float, mean: float, window: int) -> float:
+        oldest = self.buffer[0] if len(self.buffer) == self.window else None
+        self.buffer.append(value)
+        if oldest is not None and _is_nan(oldest):
+            self.missing -= 1
+        if _is_nan(value):
+            self.missing += 1
+        if len(self.buffer) < self.window or self.missing:
+            self.ready = False
+            return math.nan
+        if self.ready and oldest is not None and self.since_refresh < self.window:
+            # 窓の大きさは変わらないので、古い値を新しい値に置き換える形で平均と偏差平方和を更新する
+            new_mean = self.mean + (value - oldest) / self.window
+            self.m2 += (value - oldest) * (value - new_mean + oldest - self.mean)
+            self.mean = new_mean
+            self.since_refresh += 1
+        else:
+            self.mean = math.fsum(self.buffer) / self.window
+            self.m2 = math.fsum((v - self.mean) ** 2 for v in self.buffer)
+            self.ready = True
+            self.since_refresh = 1
+        return math.sqrt(max(self.m2, 0.0) / self.window)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "window": self.window,
+            "buffer": list(self.buffer),
+            "mean": self.mean,
+            "m2": self.m2,
+            "ready": self.ready,
+            "since_refresh": self.since_refresh,
+        }
+
+
+class _EmaStream:
+    """adjust=False の指数移動平均。pandas の ewm と同じく、欠損の間も前の値の重みを減衰させる。
+
+    RSI の上昇幅・下落幅のように複数の系列をまとめて受け取る場合は、系列ごとに状態を持つ。
+    """
+
+    def __init__(
+        self,
+        alpha: float,
+        min_periods: int,
+        weighted: list[float] | None = None,
+        old_weight: list[float] | None = None,
+        observations: list[int] | None = None,
+    ) -> None:
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.weighted = weighted if weighted is not None else []
+        self.old_weight = old_weight if old_weight is not None else []
+        self.observations = observations if observations is not None else []
+
+    @classmethod
+    def warm(cls, values: FloatArray, alpha: float, min_periods: int) -> _EmaStream:
+        return cls.warm_segments(values, alpha, min_periods, np.zeros(1, dtype=np.intp))[0]
+
+    @classmethod
+    def warm_segments(cls, values: FloatArray, alpha: float, min_periods: int, starts: IndexArray) -> list[_EmaStream]:
+        """starts で区切った系列ごとの状態。全系列のEMAを1回で計算してから系列の末尾の値を取り出す。"""
+        n = len(values)
+        ends = np.append(starts[1:], n)
+        weighted = _ema(values, alpha, 1, _Segments.create(starts if n else None, n))
+        columns = values if values.ndim == 2 else values[:, None]
+        results = weighted if weighted.ndim == 2 else weighted[:, None]
+        fields = []
+        for component in range(columns.shape[1]):
+            valid = ~np.isnan(columns[:, component])
+            counts = np.concatenate(([0], np.cumsum(valid)))
+            observations = counts[ends] - counts[starts]
+            # 系列の末尾までの最後の観測値の位置。そのあとの欠損の数だけ前の値の重みが減衰している
+            latest = np.concatenate(([-1], np.maximum.accumulate(np.where(valid, np.arange(n), -1))))[ends]
+            observed = observations > 0
+            last = np.concatenate(([np.nan], results[:, component]))[ends]
+            with np.errstate(over="ignore"):
+                old_weight = np.where(observed, (1.0 - alpha) ** (ends - 1 - latest), 1.0)
+            fields.append((np.where(observed, last, np.nan).tolist(), old_weight.tolist(), observations.tolist()))
+        return [
+            cls(
+                alpha,
+                min_periods,
+                [weighted_values[segment] for weighted_values, _, _ in fields],
+                [old_weights[segment] for _, old_weights, _ in fields],
+                [counts[segment] for _, _, counts in fields],
+            )
+            for segment in range(len(starts))
+        ]
+
+    def _append(self, weighted: float, old_weight: float, observations: int) -> None:
+        self.weighted.append(weighted)
+        self.old_weight.append(old_weight)
+        self.observations.append(observations)
+
+    def _step_one(self, i: int, value: float) -> float:
+        if i == len(self.weighted):
+            self._append(math.nan, 1.0, 0)
+        observed = not _is_nan(value)
+        self.observations[i] += observed
+        weighted = self.weighted[i]
+        if not _is_nan(weighted):
+            self.old_weight[i] *= 1.0 - self.alpha
+            if observed:
+                if weighted != value:
+                    old_weight = self.old_weight[i]
+                    weighted = (old_weight * weighted + self.alpha * value) / (old_weight + self.alpha)
+                self.old_weight[i] = 1.0
+        elif observed:
+            weighted = value
+        self.weighted[i] = weighted
+        return weighted if self.observations[i] >= self.min_periods else math.nan
+
+    def step(self, value: Any, alpha: float, min_periods: int) -> Any:
+        if isinstance(value, tuple):
+            return tuple(self._step_one(i, v) for i, v in enumerate(value))
+        return self._step_one(0, value)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "alpha": self.alpha,
+            "min_periods": self.min_periods,
+            "weighted": self.weighted,
+            "old_weight": self.old_weight,
+            "observations": self.observations,
+        }
+
+
+class _ExtremeStream:
+    """窓内の最大値・最小値。単調なキュー（位置, 値）を持ち、1本あたり償却定数時間で更新する。"""
+
+    def __init__(
+        self,
+        window: int,
+        largest: bool,
+        position: int = 0,
+        buffer: Iterable[float] = (),
+        candidates: Iterable[Iterable[float]] = (),
+    ) -> None:
+        self.window = window
+        self.largest = largest
+        self.position = position
+        self.buffer: deque[float] = deque(buffer, maxlen=window)
+        self.missing = sum(1 for value in self.buffer if _is_nan(value))
+        self.candidates: deque[tuple[int, float]] = deque((int(i), float(v)) for i, v in candidates)
+
+    @classmethod
+    def warm_max(cls, values: FloatArray, window: int) -> _ExtremeStream:
+        return cls._replay(values, window, largest=True)
+
+    @classmethod
+    def warm_min(cls, values: FloatArray, window: int) -> _ExtremeStream:
+        return cls._replay(values, window, largest=False)
+
+    @classmethod
+    def _replay(cls, values: FloatArray, window: int, largest: bool) -> _ExtremeStream:
+        stream = cls(window, largest, position=max(0, len(values) - window))
+        for value in values[-window:].tolist():
+            stream.step(value, window)
+        return stream
+
+    def step(self, value: float, window: int) -> float:
+        if len(self.buffer) == self.window and _is_nan(self.buffer[0]):
+            self.missing -= 1
+        self.buffer.append(value)
+        self.position += 1
+        if _is_nan(value):
+            self.missing += 1
+        else:
+            while self.candidates and (
+                self.candidates[-1][1] <= value if self.largest else self.candidates[-1][1] >= value
+            ):
+                self.candidates.pop()
+            self.candidates.append((self.position, value))
+        while self.candidates and self.candidates[0][0] <= self.position - self.window:
+            self.candidates.popleft()
+        if len(self.buffer) < self.window or self.missing or not self.candidates:
+            return math.nan
+        return self.candidates[0][1]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "window": self.window,
+            "largest": self.largest,
+            "position": self.position,
+            "buffer": list(self.buffer),
+            "candidates": [list(item) for item in self.candidates],
+        }
+
+
+class _TrueRangeStream:
+    """真の値幅。前日の終値を持つ。"""
+
+    def __init__(self, previous_close: float = math.nan, started: bool = False) -> None:
+        self.previous_close = previous_close
+        self.started = started
+
+    @classmethod
+    def warm(cls, high: FloatArray, low: FloatArray, close: FloatArray) -> _TrueRangeStream:
+        return cls(float(close[-1]), True) if len(close) else cls()
+
+    def step(self, high: float, low: float, close: float) -> float:
+        value = high - low
+        if self.started:
+            candidates = (value, abs(high - self.previous_close), abs(low - self.previous_close))
+            value = math.nan if any(_is_nan(c) for c in candidates) else max(candidates)
+        self.previous_close = close
+        self.started = True
+        return value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"previous_close": self.previous_close, "started": self.started}
+
+
+class _ObvStream:
+    """OBVの累積値。"""
+
+    def __init__(self, total: float = 0.0) -> None:
+        self.total = total
+
+    @classmethod
+    def warm(cls, change: FloatArray, volume: FloatArray) -> _ObvStream:
+        return cls(float(_obv(change, volume, _Segments.create(None, len(change)))[-1]) if len(change) else 0.0)
+
+    def step(self, change: float, volume: float) -> float:
+        if not (_is_nan(change) or _is_nan(volume)):
+            self.total += math.copysign(volume, change) if change else 0.0
+        return self.total
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"total": self.total}
+
+
+def _stochastic_step(close: float, highest: float, lowest: float) -> float:
+    numerator = 100 * (close - lowest)
+    denominator = highest - lowest
+    if denominator == 0:
+        # 一括計算（NumPy）の 0 除算と同じ値にする
+        return math.nan if numerator == 0 or _is_nan(numerator) else math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+def _rsi_step(smoothed: tuple[float, float]) -> float:
+    up, down = smoothed
+    return 100.0 if down == 0 else 100 - (100 / (1 + up / down))
+
+
+# 状態を持つ節: kind → (状態のクラス, 一括計算の値から状態を作る関数)
+_STREAMS: dict[str, tuple[Callable[..., Any], Callable[..., Any]]] = {
+    "diff": (_LagStream, _LagStream.warm),
+    "sma": (_MeanStream, _MeanStream.warm),
+    "std": (_StdStream, _StdStream.warm),
+    "ema": (_EmaStream, _EmaStream.warm),
+    "rolling_max": (_ExtremeStream, _ExtremeStream.warm_max),
+    "rolling_min": (_ExtremeStream, _ExtremeStream.warm_min),
+    "true_range": (_TrueRangeStream, _TrueRangeStream.warm),
+    "obv": (_ObvStream, _ObvStream.warm),
+}
+
+# 状態を持たない節の1本分の計算
+_STEPS: dict[str, Callable[..., Any]] = {
+    # 累積和は一括計算のためのもので、1本ずつ進めるときは値をそのまま移動平均に渡す
+    "sums": lambda value: value,
+    "moves": lambda change: (change if change > 0 else 0.0, -change if change < 0 else 0.0),
+    "rsi": _rsi_step,
+    "sub": lambda left, right: left - right,
+    "band": lambda center, width, k: center + k * width,
+    "stochastic": _stochastic_step,
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _step_plan(
+    specs: tuple[IndicatorSpec, ...],
+) -> tuple[list[tuple[Node, list[tuple[bool, Any]]]], list[tuple[str, int]]]:
+    """IndicatorState が1本ずつ進める手順と出力列の位置。銘柄ごとの状態で共有する。"""
+    outputs, order = _plan(specs)
+    index = {node: position for position, node in enumerate(order)}
+    # 節のハッシュを毎回計算しないよう、引数を評価済みの値の位置（節）か定数にしておく
+    steps = [
+        (node, [(True, index[arg]) if isinstance(arg, Node) else (False, arg) for arg in node.args]) for node in order
+    ]
+    return steps, [(column, index[node]) for column, node in outputs.items()]
+
+
+class IndicatorState:
+    """指標の組を1本ずつ進める状態。
+
+    compute_indicators_with_state で過去の日足から作り、新しい日足ごとに advance で進める。
+    to_dict の結果はJSONにでき、from_dict で復元できる。
+    """
+
+    def __init__(self, specs: tuple[IndicatorSpec, ...], streams: dict[int, Any], bars: int) -> None:
+        self.specs = specs
+        self.bars = bars
+        self._streams = streams
+        self._steps, self._outputs = _step_plan(specs)
+
+    def advance(self, bar: Mapping[str, float]) -> dict[str, float]:
+        """1本分の入力（{系列名: 値}）で状態を進め、その日の指標の値を返す。"""
+        values: list[Any] = []
+        for position, (node, arguments) in enumerate(self._steps):
+            if node.kind == "source":
+                name = node.args[0]
+                if name not in bar:
+                    raise ValueError(f"指標の計算に {name} の値が必要です")
+                values.append(float(bar[name]))
+                continue
+            args = [values[arg] if is_node else arg for is_node, arg in arguments]
+            stream = self._streams.get(position)
+            values.append(stream.step(*args) if stream is not None else _STEPS[node.kind](*args))
+        self.bars += 1
+        return {column: float(values[position]) for column, position in self._outputs}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "specs": ",".join(map(str, self.specs)),
+            "bars": self.bars,
+            "streams": {str(position): stream.to_dict() for position, stream in self._streams.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> IndicatorState:
+        """to_dict の結果から復元する。指標の組と状態が合わなければ ValueError。"""
+        specs = parse_indicators(data["specs"])
+        _, order = _plan(specs)
+        streams: dict[int, Any] = {}
+        for key, fields in data["streams"].items():
+            position = int(key)
+            if position >= len(order) or order[position].kind not in _STREAMS:
+                raise ValueError(f"指標の状態が指標の組と一致しません: {data['specs']}")
+            stream_class, _ = _STREAMS[order[position].kind]
+            streams[position] = stream_class(**fields)
+        if len(streams) != sum(node.kind in _STREAMS for node in order):
+            raise ValueError(f"指標の状態が指標の組と一致しません: {data['specs']}")
+        return cls(specs, streams, int(data["bars"]))
+
+
+def _segment_value(value: Any, start: int, end: int) -> Any:
+    """評価済みの節の値のうち、1つの系列の部分。累積和は元の系列を返す。"""
+    if isinstance(value, _RollingSums):
+        return value.values[start:end]
+    return value[start:end]
+
+
+def compute_indicators_with_states(
+    sources: Mapping[str, Any], specs: Iterable[IndicatorSpec], starts: Iterable[int] | None = None
+) -> tuple[dict[str, FloatArray], list[IndicatorState]]:
+    """compute_indicators と同じ結果と、系列ごとにその最後の足まで進めた IndicatorState のリストを返す。
+
+    starts を渡さなければ入力全体を1つの系列として扱い、状態は1つになる。
+    """
+    specs = tuple(specs)
+    starts = None if starts is None else list(starts)
+    outputs, order = _plan(specs)
+    values = _evaluate(order, sources, starts)
+    n = len(next(iter(values.values()))) if values else 0
+    if n == 0:
+        bounds = np.zeros((1 if starts is None else 0, 2), dtype=np.intp)
+    else:
+        segments = _Segments.create(starts, n)
+        bounds = np.column_stack((segments.starts, segments.starts + segments.lengths))
+    streams: list[dict[int, Any]] = [{} for _ in range(len(bounds))]
+    for position, node in enumerate(order):
+        if node.kind not in _STREAMS or not len(bounds):
+            continue
+        if node.kind == "ema":
+            source, alpha, min_periods = node.args
+            warmed = _EmaStream.warm_segments(values[source], alpha, min_periods, bounds[:, 0])
+        else:
+            _, warm = _STREAMS[node.kind]
+            warmed = [
+                warm(*(_segment_value(values[arg], start, end) if isinstance(arg, Node) else arg for arg in node.args))
+                for start, end in bounds.tolist()
+            ]
+        for segment, stream in enumerate(warmed):
+            streams[segment][position] = stream
+    lengths = (bounds[:, 1] - bounds[:, 0]).tolist()
+    states = [IndicatorState(specs, streams[segment], length) for segment, length in enumerate(lengths)]
+    return {column: values[node] for column, node in outputs.items()}, states
+
+
+def compute_indicators_with_state(
+    sources: Mapping[str, Any], specs: Iterable[IndicatorSpec]
+) -> tuple[dict[str, FloatArray], IndicatorState]:
+    """compute_indicators と同じ結果と、その最後の足まで進めた IndicatorState を返す。"""
+    columns, states = compute_indicators_with_states(sources, specs)
+    return columns, states[0]
+
+
+# 既定で計算する指標（従来のAPIの列）
+DEFAULT_INDICATORS = parse_indicators("sma:5,sma:25,sma:75,rsi,macd,bb")
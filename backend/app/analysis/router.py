@@ -1,74 +1,105 @@
+import asyncio
 import logging
-from typing import Any, cast
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Query
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
-from app.analysis.technical import compute_technical_indicators
-from app.jquants_client import get_daily_quotes
-from app.utils import nan_to_none, normalize_date
+from app.analysis.indicators import DEFAULT_INDICATORS, IndicatorSpec, parse_indicators
+from app.analysis.service import get_technical_batch, get_technical_frame, technical_records
+from app.columnar import FormatQuery, columnar_response
+from app.http_cache import (
+    check_batch_not_modified,
+    check_daily_not_modified,
+    daily_version,
+    peek_batch_version,
+    set_cache_headers,
+)
+from app.jquants_client import daily_data_version, get_daily_quotes_async
+from app.utils import parse_codes
 
 logger = logging.getLogger(__name__)
 
+# データが前回から変わっていなければ、ルートの依存関数がエンドポイントを実行せずに304を返す
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 
 
-@router.get("/{code}/technical")
-def technical_indicators(
+# バッチで算出できる銘柄数の上限
+MAX_BATCH_CODES = 100
+
+
+def indicator_specs(
+    indicators: str = Query(
+        "",
+        description="算出する指標（例: sma:5,sma:200,rsi:9,macd:fast=8,bb:20:2.5）。省略時は従来の指標",
+    ),
+) -> tuple[IndicatorSpec, ...]:
+    """indicators= の指定を解析する。不正な指定は422。"""
+    if not indicators.strip():
+        return DEFAULT_INDICATORS
+    try:
+        specs = parse_indicators(indicators)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from None
+    return specs or DEFAULT_INDICATORS
+
+
+IndicatorsQuery = Annotated[tuple[IndicatorSpec, ...], Depends(indicator_specs)]
+
+
+@router.get("/technical", dependencies=[Depends(check_batch_not_modified)])
+async def technical_indicators_batch(
+    request: Request,
+    response: Response,
+    codes: str = Query(..., description="カンマ区切りの銘柄コード"),
+    from_date: str = Query("", alias="from", description="開始日 (YYYYMMDD)"),
+    to_date: str = Query("", alias="to", description="終了日 (YYYYMMDD)"),
+    indicators: IndicatorsQuery = DEFAULT_INDICATORS,
+) -> dict[str, Any]:
+    """複数銘柄のテクニカル指標をまとめて算出し、銘柄コードごとに返す。
+
+    取得に失敗した銘柄は results に含めず、errors に理由を入れる。
+    """
+    code_list = parse_codes(codes)
+    if not code_list:
+        raise HTTPException(status_code=422, detail="銘柄コードを指定してください")
+    if len(code_list) > MAX_BATCH_CODES:
+        raise HTTPException(status_code=422, detail=f"銘柄コードは{MAX_BATCH_CODES}件までです")
+    results, errors = await get_technical_batch(code_list, from_date, to_date, indicators)
+    # 一部の銘柄が失敗した結果や空の結果は、検証子を付けずに毎回取り直させる
+    if not errors and any(results.values()):
+        set_cache_headers(request, response, await peek_batch_version(codes, from_date, to_date))
+    return {"results": results, "errors": errors}
+
+
+@router.get("/{code}/technical", response_model=None, dependencies=[Depends(check_daily_not_modified)])
+async def technical_indicators(
     code: str,
+    request: Request,
+    response: Response,
     from_date: str = Query("", alias="from", description="開始日 (YYYYMMDD)"),
     to_date: str = Query("", alias="to", description="終了日 (YYYYMMDD)"),
-) -> list[dict[str, Any]]:
-    """テクニカル指標を算出して返す。"""
+    response_format: FormatQuery = "records",
+    indicators: IndicatorsQuery = DEFAULT_INDICATORS,
+) -> list[dict[str, Any]] | Response:
+    """指定した指標を算出して返す。format=columns なら {列名: 値の配列} で返す。"""
+    columnar = response_format == "columns"
     try:
-        df = get_daily_quotes(code, from_date, to_date)
+        df = await get_daily_quotes_async(code, from_date, to_date)
     except Exception:
         logger.exception("J-Quants API error for code=%s", code)
-        return []
-
-    # v2 APIカラム名を内部名にマッピング（調整後の値を優先）
-    col_map: dict[str, str] = {
-        "Date": "date",
-        "AdjC": "close",
-        "AdjO": "open",
-        "AdjH": "high",
-        "AdjL": "low",
-        "AdjVo": "volume",
-    }
-    # v2カラムがない場合のフォールバック
-    if "AdjC" not in df.columns and "C" in df.columns:
-        col_map["C"] = "close"
-
-    df = df.rename(columns=col_map)
-
-    if "close" not in df.columns or df.empty:
-        return []
-
-    # 日付形式を "YYYY-MM-DD" に統一する
-    if "date" in df.columns:
-        df["date"] = df["date"].map(normalize_date)
-
-    df = compute_technical_indicators(df)
-
-    result_columns = [
-        "date",
-        "open",
-        "high",
-        "low",
-        "close",
-        "volume",
-        "sma_5",
-        "sma_25",
-        "sma_75",
-        "rsi_14",
-        "macd",
-        "macd_signal",
-        "macd_histogram",
-        "bb_upper",
-        "bb_middle",
-        "bb_lower",
-    ]
-    available = [c for c in result_columns if c in df.columns]
-    df = df[available]
-    records: list[dict[str, Any]] = cast(list[dict[str, Any]], df.to_dict(orient="records"))
-    # NaN→Noneに変換（JSONではnullとして返す）
-    return nan_to_none(records)
+        return columnar_response(pd.DataFrame()) if columnar else []
+    version = daily_version(daily_data_version(df))
+
+    # 指標の履歴の読み書きがあるので、イベントループを止めないようスレッドで実行する
+    df = await asyncio.to_thread(get_technical_frame, code, df, indicators)
+    if df.empty:
+        return columnar_response(pd.DataFrame()) if columnar else []
+
+    if columnar:
+        result = columnar_response(df)
+        set_cache_headers(request, result, version)
+        return result
+
+    set_cache_headers(request, response, version)
+    return technical_records(df)
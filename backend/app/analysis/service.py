@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Any, cast
+
+import pandas as pd
+
+from app.analysis.history import technical_history
+from app.analysis.indicators import DEFAULT_INDICATORS, IndicatorSpec, output_columns
+from app.analysis.technical import (
+    INDICATOR_COLUMNS,
+    compute_technical_indicators,
+    compute_technical_indicators_batch,
+)
+from app.config import settings
+from app.daily_store import OPEN_START, missing_ranges, parse_yyyymmdd
+from app.jquants_client import (
+    daily_data_version,
+    get_daily_quotes_async,
+    get_rate_limit_stats,
+    mark_stale,
+    pending_daily_fetches,
+)
+from app.market_calendar import latest_published_trading_day, trading_days
+from app.memory_cache import MemoryCache
+from app.prefetch.service import load_market_coverage, prefetch_market
+from app.utils import nan_to_none, normalize_date
+
+logger = logging.getLogger(__name__)
+
+# v2 APIカラム名を内部名にマッピング（調整後の値を優先）
+QUOTE_COLUMNS: dict[str, str] = {
+    "Date": "date",
+    "AdjC": "close",
+    "AdjO": "open",
+    "AdjH": "high",
+    "AdjL": "low",
+    "AdjVo": "volume",
+}
+
+# レスポンスで指標の前に並べる株価の列
+PRICE_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+# 既定の指標でのレスポンスの列と並び順
+TECHNICAL_COLUMNS = [*PRICE_COLUMNS, *INDICATOR_COLUMNS]
+
+# 算出済みの指標のDataFrame。キーに日足ストアの世代を含むので、ストアが更新されると古い結果は
+# 使われなくなり、LRUで追い出される
+_indicator_cache = MemoryCache(
+    max_entries=settings.indicator_cache_max_entries,
+    max_bytes=settings.indicator_cache_max_bytes,
+    ttl_seconds=settings.memory_cache_ttl_seconds,
+)
+
+
+def _price_frame(quotes: pd.DataFrame) -> pd.DataFrame:
+    """J-Quantsの日足を内部の列名にする。終値がなければ空のDataFrameを返す。"""
+    col_map = dict(QUOTE_COLUMNS)
+    # v2カラムがない場合のフォールバック
+    if "AdjC" not in quotes.columns and "C" in quotes.columns:
+        col_map["C"] = "close"
+
+    df = quotes.rename(columns=col_map)
+    if "close" not in df.columns or df.empty:
+        return pd.DataFrame()
+    return df
+
+
+def _response_columns(df: pd.DataFrame, indicators: tuple[IndicatorSpec, ...]) -> list[str]:
+    columns = [*PRICE_COLUMNS, *output_columns(indicators)]
+    return [c for c in columns if c in df.columns]
+
+
+def build_technical_frame(
+    quotes: pd.DataFrame, indicators: tuple[IndicatorSpec, ...] = DEFAULT_INDICATORS
+) -> pd.DataFrame:
+    """J-Quantsの日足から指定した指標のDataFrameを作る。終値がなければ空のDataFrameを返す。"""
+    df = _price_frame(quotes)
+    if df.empty:
+        return df
+    df = compute_technical_indicators(df, indicators)
+    return df[_response_columns(df, indicators)]
+
+
+def _indicator_cache_key(code: str, prices: pd.DataFrame, indicators: tuple[IndicatorSpec, ...]) -> str | None:
+    """(銘柄コード, 日足ストアの世代, 期間, 指標) のキー。世代の分からない日足はキャッシュしない。"""
+    version = daily_data_version(prices)
+    if version is None or prices.empty or "date" not in prices.columns:
+        return None
+    dates = prices["date"]
+    span = f"{dates.iloc[0]}:{dates.iloc[-1]}:{len(prices)}"
+    return f"{code}:{version}:{span}:{','.join(map(str, indicators))}"
+
+
+def get_technical_frame(
+    code: str, quotes: pd.DataFrame, indicators: tuple[IndicatorSpec, ...] = DEFAULT_INDICATORS
+) -> pd.DataFrame:
+    """build_technical_frame の結果を、同じ日足・同じ指標なら計算せずにキャッシュから返す。
+
+    既定の指標は銘柄ごとに保存した履歴（app.analysis.history）を使い、日足が伸びた分だけ計算する。
+    """
+    prices = _price_frame(quotes)
+    key = _indicator_cache_key(code, prices, indicators)
+    if key is not None:
+        cached = _indicator_cache.get(key)
+        if cached is not None:
+            return cached
+    if indicators == DEFAULT_INDICATORS and not prices.empty and "date" in prices.columns:
+        df = technical_history(code, prices[[c for c in PRICE_COLUMNS if c in prices.columns]])
+    else:
+        df = build_technical_frame(quotes, indicators)
+    if key is not None:
+        _indicator_cache.put(key, df)
+    return df
+
+
+def get_indicator_cache_stats() -> dict[str, Any]:
+    """指標キャッシュのヒット率などの統計情報を返す。"""
+    return _indicator_cache.stats()
+
+
+def technical_records(df: pd.DataFrame) -> list[dict[str, Any]]:
+    """テクニカル指標のDataFrameをAPIレスポンスのレコードにする。"""
+    # 日付形式を "YYYY-MM-DD" に統一する
+    if "date" in df.columns:
+        df = df.assign(date=df["date"].map(normalize_date))
+    records = cast(list[dict[str, Any]], df.to_dict(orient="records"))
+    # NaN→Noneに変換（JSONではnullとして返す）
+    return nan_to_none(records)
+
+
+def _plan_market_fetch(codes: list[str], from_date: str, to_date: str) -> tuple[date, date] | None:
+    """銘柄ごとに取得するより日付単位で全銘柄を取得する方がリクエストが少なければ、その期間を返す。
+
+    日付単位の取得は1営業日1リクエストで全銘柄が揃う。開始日のない（全期間の）リクエストは
+    営業日数が多すぎるので常に銘柄ごとに取得する。取得する営業日数が
+    settings.market_fetch_max_days_per_request を超える場合や、レート制限の残りから見積もった
+    取得時間が settings.jquants_rate_limit_max_wait_seconds を超える場合も、リクエストが長く止まらないように
+    銘柄ごとに取得する。それより長い期間の全銘柄の日足は prefetch（make prefetch）で先読みする。
+    ストアのファイルを読むので、イベントループからは asyncio.to_thread で呼ぶ。
+    """
+    start = parse_yyyymmdd(from_date, OPEN_START)
+    if start == OPEN_START:
+        return None
+    latest = latest_published_trading_day()
+    end = min(parse_yyyymmdd(to_date, latest), latest)
+    if start > end:
+        return None
+    per_code = sum(pending_daily_fetches(code, from_date, to_date) for code in codes)
+    if per_code == 0:
+        return None
+    per_date = sum(len(trading_days(*gap)) for gap in missing_ranges(load_market_coverage(), start, end))
+    if not 0 < per_date < per_code or per_date > settings.market_fetch_max_days_per_request:
+        return None
+    rate_limit = get_rate_limit_stats()
+    rate = rate_limit["rate_per_minute"]
+    expected_wait = rate_limit["expected_wait_seconds"] + (per_date - 1) * 60 / rate if rate > 0 else 0.0
+    if expected_wait > settings.jquants_rate_limit_max_wait_seconds:
+        logger.info("レート制限の待ちが長いため銘柄ごとに取得します（見込み %.0f 秒）", expected_wait)
+        return None
+    return start, end
+
+
+async def get_technical_batch(
+    codes: list[str],
+    from_date: str = "",
+    to_date: str = "",
+    indicators: tuple[IndicatorSpec, ...] = DEFAULT_INDICATORS,
+) -> tuple[dict[str, list[dict[str, Any]]], dict[str, str]]:
+    """複数銘柄のテクニカル指標をまとめて算出し、(銘柄コードごとの結果, 失敗した銘柄のエラー) を返す。
+
+    上流の取得はまとめて計画する。日付単位の全銘柄取得の方が安ければ先に実行し、残りは銘柄ごとに
+    並行して取得する。指標はキャッシュにない銘柄を連結して一度に計算する。
+    """
+    market_range = await asyncio.to_thread(_plan_market_fetch, codes, from_date, to_date)
+    if market_range is not None:
+        logger.info("日付単位で全銘柄の日足を取得します: %s - %s（%d銘柄分）", *market_range, len(codes))
+        await asyncio.to_thread(prefetch_market, *market_range)
+
+    fetched = await asyncio.gather(
+        *(get_daily_quotes_async(code, from_date, to_date) for code in codes), return_exceptions=True
+    )
+    results: dict[str, list[dict[str, Any]]] = {}
+    errors: dict[str, str] = {}
+    frames: list[pd.DataFrame] = []
+    keys: dict[str, str] = {}
+    for code, quotes in zip(codes, fetched, strict=True):
+        if isinstance(quotes, BaseException):
+            if not isinstance(quotes, Exception):
+                raise quotes
+            logger.error("J-Quants API error for code=%s: %s", code, quotes)
+            errors[code] = str(quotes) or type(quotes).__name__
+            continue
+        # 取得は別タスクで行ったので、古いスナップショットの記録をこのリクエストに移す
+        mark_stale(quotes)
+        results[code] = []
+        prices = _price_frame(quotes)
+        if prices.empty:
+            continue
+        key = _indicator_cache_key(code, prices, indicators)
+        cached = _indicator_cache.get(key) if key is not None else None
+        if cached is not None:
+            results[code] = technical_records(cached)
+            continue
+        if key is not None:
+            keys[code] = key
+        frames.append(prices.assign(code=code))
+    if not frames:
+        return results, errors
+
+    df = compute_technical_indicators_batch(pd.concat(frames, ignore_index=True), indicators=indicators)
+    columns = _response_columns(df, indicators)
+    for group_code, group in df.groupby("code", sort=False):
+        frame = group[columns].reset_index(drop=True)
+        if str(group_code) in keys:
+            _indicator_cache.put(keys[str(group_code)], frame)
+        results[str(group_code)] = technical_records(frame)
+    return results, errors
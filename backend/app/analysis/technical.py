@@ -1,32 +1,62 @@
+"""株価DataFrameにテクニカル指標を追加する。
+
+計算は app.analysis.indicators のエンジンで行い、ここでは DataFrame との受け渡しだけを行う。
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
 import pandas as pd
-import ta
 
+from app.analysis.indicators import (
+    DEFAULT_INDICATORS,
+    FloatArray,
+    IndicatorSpec,
+    compute_indicators,
+    output_columns,
+    required_sources,
+)
 
-def compute_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    """株価DataFrameにテクニカル指標を追加する。
+# 既定の指標で出力する列
+INDICATOR_COLUMNS = list(output_columns(DEFAULT_INDICATORS))
 
-    入力DataFrameには 'close' カラム（調整後終値）が必要。
-    """
-    close = df["close"].astype(float)
 
-    # 移動平均線 (SMA)
-    df["sma_5"] = ta.trend.sma_indicator(close, window=5)
-    df["sma_25"] = ta.trend.sma_indicator(close, window=25)
-    df["sma_75"] = ta.trend.sma_indicator(close, window=75)
+def source_arrays(df: pd.DataFrame, indicators: Sequence[IndicatorSpec]) -> dict[str, FloatArray]:
+    """指標が使う入力系列。DataFrameにない列は欠損の系列にする。"""
+    return {
+        name: pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+        if name in df.columns
+        else np.full(len(df), np.nan)
+        for name in required_sources(indicators)
+    }
 
-    # RSI (14日)
-    df["rsi_14"] = ta.momentum.rsi(close, window=14)
 
-    # MACD (12/26/9)
-    macd_indicator = ta.trend.MACD(close, window_slow=26, window_fast=12, window_sign=9)
-    df["macd"] = macd_indicator.macd()
-    df["macd_signal"] = macd_indicator.macd_signal()
-    df["macd_histogram"] = macd_indicator.macd_diff()
+def compute_technical_indicators(
+    df: pd.DataFrame, indicators: Sequence[IndicatorSpec] = DEFAULT_INDICATORS
+) -> pd.DataFrame:
+    """株価DataFrameにテクニカル指標を追加する。
+
+    入力DataFrameには 'close' カラム（調整後終値）が必要。ATRなど高値・安値・出来高を使う指標は
+    'high' 'low' 'volume' カラムも使う。
+    """
+    values = compute_indicators(source_arrays(df, indicators), indicators)
+    indicators_df = pd.DataFrame(values, index=df.index)
+    # 列を1つずつ追加するより、まとめて連結する方が速い
+    return pd.concat([df.drop(columns=list(values), errors="ignore"), indicators_df], axis=1)
 
-    # ボリンジャーバンド (20日, ±2σ)
-    bb = ta.volatility.BollingerBands(close, window=20, window_dev=2)
-    df["bb_upper"] = bb.bollinger_hband()
-    df["bb_middle"] = bb.bollinger_mavg()
-    df["bb_lower"] = bb.bollinger_lband()
 
-    return df
+def compute_technical_indicators_batch(
+    df: pd.DataFrame, by: str = "code", indicators: Sequence[IndicatorSpec] = DEFAULT_INDICATORS
+) -> pd.DataFrame:
+    """複数銘柄を縦に連結した株価DataFrameに、銘柄ごとのテクニカル指標をまとめて追加する。
+
+    行を銘柄ごとにまとめ（最初に現れた銘柄の順、銘柄内の順序は保つ）、全銘柄を1回の計算で処理する。
+    窓と再帰の計算は銘柄の境目でやり直す。各銘柄の行は日付順に並んでいる必要がある。
+    """
+    codes, _ = pd.factorize(df[by])
+    order = np.argsort(codes, kind="stable")
+    df = df.iloc[order].reset_index(drop=True)
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-2)) if len(sorted_codes) else None
+    values = compute_indicators(source_arrays(df, indicators), indicators, starts)
+    return pd.concat([df.drop(columns=list(values), errors="ignore"), pd.DataFrame(values)], axis=1)
@@ -0,0 +1,222 @@
+"""ディスクキャッシュのファイル形式。
+
+エンドポイントごとに明示的なスキーマを持ち、型付きの列指向形式（Arrow IPC / Parquet）で
+DataFrameを保存する。CSVは旧形式として読み込みとマイグレーションのために残している。
+"""
+
+import os
+import tempfile
+from collections.abc import Callable, Hashable, Iterator
+from pathlib import Path
+from typing import Protocol
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# エンドポイントごとの列の型。ここにない列は pandas / Arrow の型推論に任せる。
+STRING = "string"
+TIMESTAMP = "timestamp"
+FLOAT = "float"
+
+SCHEMAS: dict[str, dict[str, str]] = {
+    "master": {
+        "Date": TIMESTAMP,
+        "Code": STRING,
+        "CoName": STRING,
+        "CoNameEn": STRING,
+        "S17": STRING,
+        "S17Nm": STRING,
+        "S33": STRING,
+        "S33Nm": STRING,
+        "ScaleCat": STRING,
+        "Mkt": STRING,
+        "MktNm": STRING,
+        "Mrgn": STRING,
+        "MrgnNm": STRING,
+        "ProdCat": STRING,
+    },
+    "daily": {
+        "Date": TIMESTAMP,
+        "Code": STRING,
+        "O": FLOAT,
+        "H": FLOAT,
+        "L": FLOAT,
+        "C": FLOAT,
+        "Vo": FLOAT,
+        "Va": FLOAT,
+        "AdjFactor": FLOAT,
+        "AdjO": FLOAT,
+        "AdjH": FLOAT,
+        "AdjL": FLOAT,
+        "AdjC": FLOAT,
+        "AdjVo": FLOAT,
+    },
+    "financials": {
+        "DiscDate": TIMESTAMP,
+        "DiscTime": STRING,
+        "Code": STRING,
+        "DiscNo": STRING,
+        "CurPerSt": TIMESTAMP,
+        "CurPerEn": TIMESTAMP,
+        "CurFYSt": TIMESTAMP,
+        "CurFYEn": TIMESTAMP,
+        "NxtFYSt": TIMESTAMP,
+        "NxtFYEn": TIMESTAMP,
+    },
+}
+
+
+def apply_schema(df: pd.DataFrame, endpoint: str) -> pd.DataFrame:
+    """エンドポイントのスキーマに従って列の型を揃える。
+
+    文字列列は欠損値を保ったまま str に変換するので、"0130" のような先頭ゼロや
+    英字を含む銘柄コードがそのまま残る。
+    """
+    schema = SCHEMAS.get(endpoint, {})
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == STRING:
+            values = df[col]
+            df[col] = values.where(values.isna(), values.astype(str))
+        elif kind == TIMESTAMP:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif kind == FLOAT:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def _string_dtypes(endpoint: str) -> dict[Hashable, type[str]]:
+    """CSVを読み込むときに文字列のまま読む列（スキーマの文字列列）。"""
+    return {col: str for col, kind in SCHEMAS.get(endpoint, {}).items() if kind == STRING}
+
+
+def _read_csv_with_schema(path: Path, endpoint: str) -> pd.DataFrame:
+    """スキーマの文字列列は文字列のままCSVを読み込む。"""
+    return apply_schema(pd.read_csv(path, dtype=_string_dtypes(endpoint)), endpoint)
+
+
+def atomic_write(path: Path, write: Callable[[Path], object]) -> None:
+    """一時ファイルに書き込んでから置き換える。読み込み中のプロセスに書きかけのファイルを見せない。"""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(Path(tmp_name))
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class CacheFormat(Protocol):
+    """キャッシュファイル形式のインタフェース。"""
+
+    suffix: str
+
+    def read(self, path: Path, endpoint: str) -> pd.DataFrame: ...
+
+    def write(self, path: Path, df: pd.DataFrame, endpoint: str) -> None: ...
+
+    def iter_batches(self, path: Path, endpoint: str, batch_size: int) -> Iterator[pa.RecordBatch]:
+        """ファイル全体を読み込まず、batch_size 行以下のレコードバッチに分けて順に読む。"""
+        ...
+
+
+def _split_batch(batch: pa.RecordBatch, batch_size: int) -> Iterator[pa.RecordBatch]:
+    """レコードバッチを batch_size 行以下のバッチに分ける。スライスはコピーしない。"""
+    for offset in range(0, batch.num_rows, batch_size):
+        yield batch.slice(offset, batch_size)
+
+
+class CsvFormat:
+    """旧形式のCSV。読み込みのたびに型推論と日付パースが走る。"""
+
+    suffix = ".csv"
+
+    def read(self, path: Path, endpoint: str) -> pd.DataFrame:
+        return _read_csv_with_schema(path, endpoint)
+
+    def write(self, path: Path, df: pd.DataFrame, endpoint: str) -> None:
+        atomic_write(path, lambda tmp: df.to_csv(tmp, index=False))
+
+    def iter_batches(self, path: Path, endpoint: str, batch_size: int) -> Iterator[pa.RecordBatch]:
+        with pd.read_csv(path, dtype=_string_dtypes(endpoint), chunksize=batch_size) as reader:
+            for chunk in reader:
+                yield pa.RecordBatch.from_pandas(apply_schema(chunk, endpoint), preserve_index=False)
+
+
+class ArrowIpcFormat:
+    """Arrow IPC (Feather v2)。メモリマップで読み込み、型はファイルに保存されたものをそのまま使う。
+
+    バッファは圧縮しないので、読み込みはマップしたページをそのまま参照し、展開もコピーもしない。
+    batch_rows 行ごとのレコードバッチに分けて書くので、iter_batches はファイルの先頭から
+    必要な分だけを読み進められる。
+    """
+
+    suffix = ".arrow"
+    batch_rows = 5000
+
+    def read(self, path: Path, endpoint: str) -> pd.DataFrame:
+        with pa.memory_map(str(path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        df: pd.DataFrame = table.to_pandas()
+        return df
+
+    def iter_batches(self, path: Path, endpoint: str, batch_size: int) -> Iterator[pa.RecordBatch]:
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield from _split_batch(reader.get_batch(i), batch_size)
+
+    def write(self, path: Path, df: pd.DataFrame, endpoint: str) -> None:
+        table = pa.Table.from_pandas(apply_schema(df.copy(), endpoint), preserve_index=False)
+
+        def _write(tmp: Path) -> None:
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=self.batch_rows)
+
+        atomic_write(path, _write)
+
+
+class ParquetFormat:
+    """Parquet。Arrow IPCよりファイルは小さいが、読み込み時のデコードが必要。"""
+
+    suffix = ".parquet"
+
+    def read(self, path: Path, endpoint: str) -> pd.DataFrame:
+        df: pd.DataFrame = pq.read_table(str(path), memory_map=True).to_pandas()
+        return df
+
+    def iter_batches(self, path: Path, endpoint: str, batch_size: int) -> Iterator[pa.RecordBatch]:
+        with pq.ParquetFile(str(path), memory_map=True) as parquet_file:
+            yield from parquet_file.iter_batches(batch_size=batch_size)
+
+    def write(self, path: Path, df: pd.DataFrame, endpoint: str) -> None:
+        table = pa.Table.from_pandas(apply_schema(df.copy(), endpoint), preserve_index=False)
+        atomic_write(path, lambda tmp: pq.write_table(table, str(tmp), compression="zstd"))
+
+
+FORMATS: dict[str, CacheFormat] = {
+    "arrow": ArrowIpcFormat(),
+    "parquet": ParquetFormat(),
+    "csv": CsvFormat(),
+}
+
+CACHE_SUFFIXES = frozenset(fmt.suffix for fmt in FORMATS.values())
+
+
+def get_format(name: str) -> CacheFormat:
+    """設定名からキャッシュ形式を返す。"""
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(f"未対応のキャッシュ形式: {name}") from None
+
+
+def format_for_path(path: Path) -> CacheFormat:
+    """ファイルの拡張子からキャッシュ形式を判定する。"""
+    for fmt in FORMATS.values():
+        if path.suffix == fmt.suffix:
+            return fmt
+    raise ValueError(f"未対応のキャッシュファイル: {path}")
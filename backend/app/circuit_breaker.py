@@ -0,0 +1,108 @@
+"""上流（J-Quants）への呼び出しを失敗が続いたら止めるサーキットブレーカー。
+
+連続失敗が閾値に達すると open になり、reset_timeout 秒のあいだ呼び出しを即座に拒否する。
+その後は half_open として1件だけ試し、成功すれば closed に戻り、失敗すれば再び open になる。
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+
+class CircuitOpenError(Exception):
+    """ブレーカーが開いているため上流を呼ばなかったことを表す。"""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"上流への呼び出しを停止中です（再試行まで {retry_after:.1f} 秒）")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """スレッドセーフなサーキットブレーカー。"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """ "closed" / "open" / "half_open" のいずれか。"""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        """呼び出してよいか確認する。だめなら CircuitOpenError を送出する。"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial_in_flight:
+                # 試しの1件だけ通す
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+            assert self._opened_at is not None
+            raise CircuitOpenError(max(0.0, self._opened_at + self.reset_timeout - self._clock()))
+
+    def record_success(self) -> None:
+        """呼び出しの成功を記録し、ブレーカーを閉じる。"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """呼び出しの失敗を記録する。閾値に達したか試しの1件が失敗したらブレーカーを開く。"""
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._state() != "open":
+                    self.opened += 1
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def record_ignored(self) -> None:
+        """上流の状態と無関係に終わった呼び出し（ローカルの待ち時間超過やキャンセル）を記録する。"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> dict[str, Any]:
+        """状態・連続失敗数・拒否数などの統計情報を返す。"""
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+    def reset(self) -> None:
+        """状態と統計をリセットする。"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+            self.rejected = 0
+            self.opened = 0
@@ -0,0 +1,64 @@
+"""DataFrameを列指向のJSONレスポンスにする。
+
+行ごとのdictを作らず、列をNumPy配列のままorjsonでエンコードする。NaNはorjsonがnullとして
+書き出し、日付列はまとめて "YYYY-MM-DD" 文字列にする。
+"""
+
+from __future__ import annotations
+
+from typing import Annotated, Any, Literal
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Query, Response
+
+# レスポンス形式。records は行ごとのオブジェクト配列（従来の形式）、columns は列ごとの配列
+ResponseFormat = Literal["records", "columns"]
+FormatQuery = Annotated[
+    ResponseFormat, Query(alias="format", description="records: 行ごとの配列 / columns: 列ごとの配列")
+]
+
+
+def format_dates(values: pd.Series[Any]) -> list[str | None]:
+    """日付列を "YYYY-MM-DD" 文字列のリストにする。解釈できない値や欠損はNone。"""
+    parsed = (
+        values
+        if pd.api.types.is_datetime64_any_dtype(values.dtype)
+        else pd.to_datetime(values, errors="coerce", format="ISO8601")
+    )
+    text = np.datetime_as_string(parsed.to_numpy(dtype="datetime64[D]"), unit="D").astype(object)
+    text[parsed.isna().to_numpy()] = None
+    return list(text)
+
+
+def _column_values(values: pd.Series[Any]) -> Any:
+    """1列をorjsonでエンコードできる値にする。数値列はNumPy配列のまま返す。"""
+    if pd.api.types.is_bool_dtype(values.dtype) and not values.hasnans:
+        return np.ascontiguousarray(values.to_numpy(dtype=bool))
+    if pd.api.types.is_integer_dtype(values.dtype) and not values.hasnans:
+        return np.ascontiguousarray(values.to_numpy(dtype=np.int64))
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        # NaNはorjsonがnullとして書き出す
+        return np.ascontiguousarray(values.to_numpy(dtype=np.float64, na_value=np.nan))
+    objects = values.to_numpy(dtype=object, copy=True)
+    objects[values.isna().to_numpy()] = None
+    return objects.tolist()
+
+
+def frame_to_columns(df: pd.DataFrame, date_columns: tuple[str, ...] = ("date",)) -> dict[str, Any]:
+    """DataFrameを {列名: 値の配列} にする。date_columns と日時型の列は日付文字列にする。"""
+    columns: dict[str, Any] = {}
+    for name in df.columns:
+        values = df[name]
+        if name in date_columns or pd.api.types.is_datetime64_any_dtype(values.dtype):
+            columns[str(name)] = format_dates(values)
+        else:
+            columns[str(name)] = _column_values(values)
+    return columns
+
+
+def columnar_response(df: pd.DataFrame, date_columns: tuple[str, ...] = ("date",)) -> Response:
+    """DataFrameを列指向のJSONにエンコードしたレスポンスを返す。"""
+    content = orjson.dumps(frame_to_columns(df, date_columns), option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(content=content, media_type="application/json")
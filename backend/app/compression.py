@@ -0,0 +1,161 @@
+"""Accept-Encoding に応じてレスポンスをbrotliまたはgzipで圧縮するミドルウェア。
+
+brotliはオプションの依存で、brotliパッケージがなければgzipだけを使う。ストリーミングの
+レスポンスもチャンクごとに圧縮して送る。starlette の GZipMiddleware の内部（Responder の
+フック）には依存せず、公開されている Headers / MutableHeaders だけで ASGI のメッセージを書き換える。
+"""
+
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotliがなければgzipのみ
+    brotli = None
+
+# 圧縮しないコンテンツタイプ。Server-Sent Events は1件ずつすぐ届ける必要がある
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+def _accepted_codings(accept_encoding: str) -> dict[str, float]:
+    """Accept-Encoding を {コーディング: q値} にする。"""
+    codings: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        key, _, value = params.strip().partition("=")
+        if key.strip() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        codings[name.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """クライアントが受け付けるコーディングから使うものを選ぶ。br > gzip の順で、なければNone。"""
+    codings = _accepted_codings(accept_encoding)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    for name in candidates:
+        if codings.get(name, codings.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+class _Compressor(Protocol):
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        """body を圧縮したバイト列を返す。more_body が偽なら最後のチャンクなのでストリームを閉じる。"""
+        ...
+
+
+class _GzipCompressor:
+    def __init__(self, level: int) -> None:
+        # wbits=31 でgzipのヘッダーとトレーラーを付ける
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self._compressor.compress(body)
+        # ストリーミング中はチャンクごとに吐き出して、クライアントがすぐ読めるようにする
+        return data + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int) -> None:
+        assert brotli is not None
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self._compressor.process(body)
+        data += self._compressor.flush() if more_body else self._compressor.finish()
+        return bytes(data)
+
+
+class _Responder:
+    """1つのレスポンスのメッセージを受けて、本文を圧縮して送る。compressor がNoneなら圧縮しない。"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str | None, compressor: _Compressor | None) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.compressor = compressor
+        self.send: Send | None = None
+        self.start_message: Message | None = None
+        self.compressing = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        assert self.send is not None
+        if message["type"] == "http.response.start":
+            # 本文の大きさを見てからヘッダーを決めるので、開始のメッセージは本文まで送らずに持っておく
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is None:
+            if self.compressing:
+                assert self.compressor is not None
+                message = {**message, "body": self.compressor.compress(body, more_body=more_body)}
+            await self.send(message)
+            return
+
+        # 最初の本文: 圧縮するかどうかを決めてから、開始のメッセージと一緒に送る
+        start, self.start_message = self.start_message, None
+        headers = self._decide(start, body, more_body)
+        if self.compressing:
+            assert self.compressor is not None
+            message = {**message, "body": self.compressor.compress(body, more_body=more_body)}
+            if not more_body:
+                headers["Content-Length"] = str(len(message["body"]))
+        await self.send(start)
+        await self.send(message)
+
+    def _decide(self, start: Message, body: bytes, more_body: bool) -> MutableHeaders:
+        """最初の本文で圧縮するかどうかを決め、開始のメッセージのヘッダーを直す。"""
+        headers = MutableHeaders(raw=start["headers"])
+        already_encoded = "content-encoding" in headers
+        excluded = headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+        if not already_encoded and not excluded and (more_body or len(body) >= self.minimum_size):
+            # 圧縮するかどうかが Accept-Encoding で変わるので、キャッシュに知らせる
+            headers.add_vary_header("Accept-Encoding")
+            if self.compressor is not None:
+                self.compressing = True
+                headers["Content-Encoding"] = str(self.encoding)
+                # 圧縮後の長さは、本文を1回で送るときだけ圧縮してから付け直す
+                del headers["Content-Length"]
+        return headers
+
+
+class CompressionMiddleware:
+    """レスポンスをbrotli / gzipで圧縮する。minimum_size 未満の小さいレスポンスは圧縮しない。"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        compressor: _Compressor | None = None
+        if encoding == "br":
+            compressor = _BrotliCompressor(self.brotli_quality)
+        elif encoding == "gzip":
+            compressor = _GzipCompressor(self.gzip_level)
+        await _Responder(self.app, self.minimum_size, encoding, compressor)(scope, receive, send)
@@ -4,6 +4,41 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     quants_api_v2_api_key: str = ""
     cache_dir: str = "data"
+    # ディスクキャッシュの形式: "arrow"（Arrow IPC）/ "parquet" / "csv"
+    cache_format: str = "arrow"
+    # インメモリキャッシュ（ディスクキャッシュの手前に置くLRU/TTL層）
+    memory_cache_max_entries: int = 256
+    memory_cache_max_bytes: int = 256 * 1024 * 1024
+    memory_cache_ttl_seconds: int = 24 * 60 * 60
+    # 算出済みのテクニカル指標のLRUキャッシュ。0で無効
+    indicator_cache_max_entries: int = 512
+    indicator_cache_max_bytes: int = 64 * 1024 * 1024
+    # 空の結果（未知の銘柄コード・データのない期間・404）を覚えておく秒数。0で無効
+    negative_cache_ttl_seconds: float = 300
+    # J-Quantsのプラン（free / light / standard / premium）。レート制限の既定値を決める
+    jquants_plan: str = "free"
+    # 0より大きければプランの既定値の代わりに使うリクエスト上限（回/分）
+    jquants_rate_limit_per_minute: float = 0
+    jquants_rate_limit_burst: float = 1
+    # トークン待ちの上限（秒）。これを超える見込みならリクエストを送らずにエラーにする
+    jquants_rate_limit_max_wait_seconds: float = 120
+    # 今の世代のキャッシュがないとき、過去の世代をすぐ返して裏で再取得する（stale-while-revalidate）
+    stale_while_revalidate: bool = True
+    # 上流の連続失敗がこの回数に達したら、circuit_breaker_reset_seconds 秒は上流を呼ばない
+    circuit_breaker_failure_threshold: int = 5
+    circuit_breaker_reset_seconds: float = 30
+    # 非同期クライアントの接続プールの上限
+    jquants_http_max_connections: int = 100
+    # 東証の休業日CSV（date,name）。空ならリポジトリ同梱のカレンダーを使う
+    market_calendar_path: str = ""
+    # 営業日の日足などが公開される時刻（JST, HH:MM）。これより前は前営業日のデータが最新
+    market_data_publish_time: str = "16:30"
+    # 0より大きければ起動時に直近この日数分の全銘柄の日足をバックグラウンドで先読みする
+    prefetch_on_startup_days: int = 0
+    # 複数銘柄のリクエストの中で日付単位の全銘柄取得に使う営業日数の上限。超える期間は銘柄ごとに取得する
+    market_fetch_max_days_per_request: int = 20
+    # これ以上のサイズのレスポンスをgzip / brotli（brotliパッケージがあれば）で圧縮する（バイト）
+    compression_minimum_size: int = 1000
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
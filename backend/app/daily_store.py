@@ -0,0 +1,121 @@
+"""銘柄ごとの日足ストアで使う期間計算とマージ処理。
+
+日足は銘柄ごとに1ファイルへ日付順で蓄積し、取得済みの期間（カバレッジ）を併せて記録する。
+リクエストされた期間のうち未取得の端だけをJ-Quantsから取得してマージし、
+任意の部分期間はソート済みの日付インデックスをスライスして返す。
+"""
+
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+DateRange = tuple[date, date]
+
+# from を指定しない（全期間）リクエストの開始日
+OPEN_START = date.min
+
+
+def parse_yyyymmdd(value: str, default: date) -> date:
+    """日付文字列（"YYYYMMDD" / "YYYY-MM-DD"）を日付に変換する。空文字ならdefaultを返す。"""
+    if not value:
+        return default
+    return datetime.strptime(value.replace("-", ""), "%Y%m%d").date()
+
+
+def format_yyyymmdd(value: date) -> str:
+    """日付をJ-Quantsのパラメータ形式にする。OPEN_STARTは空文字（指定なし）になる。"""
+    if value == OPEN_START:
+        return ""
+    return value.strftime("%Y%m%d")
+
+
+def merge_ranges(ranges: list[DateRange]) -> list[DateRange]:
+    """重なる・隣接する期間をまとめ、開始日順に並べる。"""
+    merged: list[DateRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(covered: list[DateRange], start: date, end: date) -> list[DateRange]:
+    """[start, end] のうち covered に含まれない期間を返す。"""
+    missing: list[DateRange] = []
+    cursor = start
+    for c_start, c_end in merge_ranges(covered):
+        if c_end < cursor:
+            continue
+        if c_start > end:
+            break
+        if c_start > cursor:
+            missing.append((cursor, c_start - timedelta(days=1)))
+        cursor = max(cursor, c_end + timedelta(days=1))
+        if cursor > end:
+            return missing
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def last_bar_date(df: pd.DataFrame) -> date | None:
+    """日足の最後の日付を返す。日足がなければNone。"""
+    if df.empty or "Date" not in df.columns:
+        return None
+    last = pd.to_datetime(df["Date"]).max()
+    return None if pd.isna(last) else last.date()
+
+
+def cap_ranges(ranges: list[DateRange], last: date | None) -> list[DateRange]:
+    """各期間の終了日を、実際に返ってきた最後の日足の日付 last で打ち切る。
+
+    無料プランの遅延や公開直後の取得では、リクエストした期間の末尾の日足がまだ返らない。
+    末尾までカバー済みにすると後から公開された日足を取り直さなくなるので、last より後は未取得のまま残す。
+    """
+    if last is None:
+        return []
+    return [(start, min(end, last)) for start, end in ranges if start <= last]
+
+
+def ranges_to_json(ranges: list[DateRange]) -> list[list[str]]:
+    """カバレッジをJSONで保存できる形にする。"""
+    return [[start.isoformat(), end.isoformat()] for start, end in ranges]
+
+
+def ranges_from_json(value: list[list[str]]) -> list[DateRange]:
+    """ranges_to_json の逆変換。"""
+    return [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in value]
+
+
+def merge_bars(existing: pd.DataFrame | None, new: pd.DataFrame) -> pd.DataFrame:
+    """既存の日足に新しい日足をマージする。同じ日付は新しい方を採用し、日付順に並べる。"""
+    if existing is None or existing.empty:
+        combined = new
+    elif new.empty:
+        combined = existing
+    else:
+        combined = pd.concat([existing, new], ignore_index=True)
+    if "Date" not in combined.columns:
+        return combined.reset_index(drop=True)
+    combined = combined.drop_duplicates(subset="Date", keep="last")
+    return combined.sort_values("Date", kind="stable").reset_index(drop=True)
+
+
+def slice_bars(df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """日付順に並んだ日足から [start, end] の行を二分探索で切り出す。"""
+    if df.empty or "Date" not in df.columns:
+        return df
+    dates = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]")
+    lo = 0 if start == OPEN_START else int(np.searchsorted(dates, np.datetime64(start, "ns"), side="left"))
+    hi = int(np.searchsorted(dates, np.datetime64(end, "ns"), side="right"))
+    return df.iloc[lo:hi].reset_index(drop=True)
+
+
+def has_corporate_action(df: pd.DataFrame) -> bool:
+    """株式分割などで調整係数が1以外の行があるか。あれば過去の調整後価格が変わる。"""
+    if "AdjFactor" not in df.columns or df.empty:
+        return False
+    factors = pd.to_numeric(df["AdjFactor"], errors="coerce")
+    return bool((factors.notna() & (factors != 1.0)).any())
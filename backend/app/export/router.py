@@ -0,0 +1,41 @@
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.export.service import MEDIA_TYPES, ExportDataset, ExportFormat, export_stream
+from app.utils import parse_codes
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# 1リクエストでエクスポートできる銘柄数の上限
+MAX_CODES = 500
+
+_SUFFIXES = {"ndjson": "ndjson", "arrow": "arrows"}
+
+
+@router.get("/{dataset}")
+async def export(
+    dataset: ExportDataset,
+    codes: str = Query(..., description="カンマ区切りの銘柄コード"),
+    from_date: str = Query("", alias="from", description="開始日 (YYYYMMDD)"),
+    to_date: str = Query("", alias="to", description="終了日 (YYYYMMDD)"),
+    export_format: Annotated[
+        ExportFormat, Query(alias="format", description="ndjson / arrow（IPCストリーム）")
+    ] = "ndjson",
+) -> StreamingResponse:
+    """日足（daily）またはテクニカル指標（technical）を銘柄ごとにチャンクでストリーミングする。
+
+    失敗した銘柄はストリームの最後の errors レコードで返す（NDJSONは最後の行、Arrowは最後のバッチのメタデータ）。
+    """
+    code_list = parse_codes(codes)
+    if not code_list:
+        raise HTTPException(status_code=422, detail="銘柄コードを指定してください")
+    if len(code_list) > MAX_CODES:
+        raise HTTPException(status_code=422, detail=f"銘柄コードは{MAX_CODES}件までです")
+    filename = f"{dataset}.{_SUFFIXES[export_format]}"
+    return StreamingResponse(
+        export_stream(dataset, code_list, from_date, to_date, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
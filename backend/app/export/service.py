@@ -0,0 +1,171 @@
+"""日足とテクニカル指標のストリーミングエクスポート。
+
+銘柄ごとにチャンク（最大 CHUNK_ROWS 行）単位でNDJSONまたはArrow IPCストリームにエンコードして送る。
+日足はキャッシュファイルからレコードバッチ単位で直接読むので、期間の長さや銘柄数によらず
+レスポンス全体をメモリに組み立てない。
+
+送信を始めた後はステータスを変えられないので、失敗した銘柄はストリームの最後に
+エラーの記録（NDJSONは {"errors": {銘柄コード: 理由}} の行、Arrowは行のないレコードバッチの
+カスタムメタデータ "errors"）として知らせる。すべて成功したときは何も付けない。
+"""
+
+import asyncio
+import io
+import logging
+from collections.abc import AsyncIterator, Iterator
+from datetime import date
+from pathlib import Path
+from typing import Literal
+
+import orjson
+import pandas as pd
+import pyarrow as pa
+
+from app.analysis.service import TECHNICAL_COLUMNS, get_technical_frame
+from app.cache_format import format_for_path
+from app.columnar import format_dates
+from app.daily_store import slice_bars
+from app.jquants_client import get_daily_quotes_async, prepare_daily_store_async
+from app.stocks.service import DAILY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+ExportDataset = Literal["daily", "technical"]
+ExportFormat = Literal["ndjson", "arrow"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# 1チャンクの最大行数。メモリに載るのはおおむねこの行数分だけ
+CHUNK_ROWS = 5000
+
+# 失敗した銘柄を知らせる記録のキー
+ERRORS_KEY = "errors"
+
+
+def _export_schema(columns: list[str]) -> pa.Schema:
+    """エクスポートするArrowのスキーマ。銘柄が変わっても同じスキーマのバッチを書く。"""
+    fields = []
+    for name in columns:
+        if name == "date":
+            fields.append(pa.field(name, pa.date32()))
+        elif name == "code":
+            fields.append(pa.field(name, pa.string()))
+        else:
+            fields.append(pa.field(name, pa.float64()))
+    return pa.schema(fields)
+
+
+SCHEMAS: dict[str, pa.Schema] = {
+    "daily": _export_schema(list(DAILY_COLUMNS.values())),
+    "technical": _export_schema(["date", "code", *TECHNICAL_COLUMNS[1:]]),
+}
+
+
+def _daily_chunks(path: Path, start: date, end: date) -> Iterator[pd.DataFrame]:
+    """日足ストアのファイルから [start, end] の行をチャンクごとに読み、APIの列名にして返す。"""
+    for batch in format_for_path(path).iter_batches(path, "daily", CHUNK_ROWS):
+        df = slice_bars(batch.to_pandas(), start, end)
+        if df.empty:
+            continue
+        available = {k: v for k, v in DAILY_COLUMNS.items() if k in df.columns}
+        yield df[list(available.keys())].rename(columns=available)
+
+
+def _frame_chunks(df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    for offset in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[offset : offset + CHUNK_ROWS]
+
+
+async def _code_chunks(dataset: ExportDataset, code: str, from_date: str, to_date: str) -> Iterator[pd.DataFrame]:
+    """1銘柄分のチャンクを返す。テクニカル指標は銘柄の期間全体で計算してから分ける。"""
+    if dataset == "daily":
+        prepared = await prepare_daily_store_async(code, from_date, to_date)
+        return _daily_chunks(*prepared) if prepared is not None else iter(())
+    quotes = await get_daily_quotes_async(code, from_date, to_date)
+    df = await asyncio.to_thread(get_technical_frame, code, quotes)
+    if df.empty:
+        return iter(())
+    df.insert(1, "code", code)
+    return _frame_chunks(df)
+
+
+class NdjsonEncoder:
+    """チャンクを1行1レコードのJSONにする。NaNはnull、日付は "YYYY-MM-DD" になる。"""
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        if "date" in df.columns:
+            df = df.assign(date=pd.Series(format_dates(df["date"]), index=df.index, dtype=object))
+        return b"".join(
+            orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
+            for row in df.to_dict(orient="records")
+        )
+
+    def close(self, errors: dict[str, str]) -> bytes:
+        if not errors:
+            return b""
+        return orjson.dumps({ERRORS_KEY: errors}, option=orjson.OPT_APPEND_NEWLINE)
+
+
+class ArrowStreamEncoder:
+    """チャンクをArrow IPCストリームのレコードバッチにする。最初のチャンクの前にスキーマを書く。"""
+
+    def __init__(self, schema: pa.Schema) -> None:
+        self._schema = schema
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, schema)
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def _to_batch(self, df: pd.DataFrame) -> pa.RecordBatch:
+        arrays = []
+        for field in self._schema:
+            values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), dtype=object)
+            if field.type == pa.date32():
+                days = pd.to_datetime(values, errors="coerce", format="ISO8601").to_numpy(dtype="datetime64[D]")
+                arrays.append(pa.array(days, type=field.type, from_pandas=True))
+            elif field.type == pa.string():
+                arrays.append(pa.array(values.to_numpy(dtype=object), type=field.type, from_pandas=True))
+            else:
+                floats = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64")
+                arrays.append(pa.array(floats, type=field.type, from_pandas=True))
+        return pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        self._writer.write_batch(self._to_batch(df))
+        return self._drain()
+
+    def close(self, errors: dict[str, str]) -> bytes:
+        if errors:
+            batch = pa.RecordBatch.from_pylist([], schema=self._schema)
+            self._writer.write_batch(batch, custom_metadata={ERRORS_KEY: orjson.dumps(errors)})
+        self._writer.close()
+        return self._drain()
+
+
+async def export_stream(
+    dataset: ExportDataset, codes: list[str], from_date: str = "", to_date: str = "", fmt: ExportFormat = "ndjson"
+) -> AsyncIterator[bytes]:
+    """銘柄ごとのデータをチャンク単位でエンコードして順に返す。
+
+    失敗した銘柄はログに残して飛ばし、最後にまとめてエラーの記録を書く。途中まで送った銘柄も
+    エラーに含めるので、受け取った側はその銘柄の行が欠けていると分かる。
+    """
+    encoder = ArrowStreamEncoder(SCHEMAS[dataset]) if fmt == "arrow" else NdjsonEncoder()
+    errors: dict[str, str] = {}
+    for code in codes:
+        try:
+            chunks = await _code_chunks(dataset, code, from_date, to_date)
+            # ファイルの読み込みとデコードはスレッドで行い、イベントループを塞がない
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                yield encoder.encode(chunk)
+        except Exception as exc:
+            logger.exception("J-Quants API error for code=%s", code)
+            errors[code] = str(exc) or type(exc).__name__
+    yield encoder.close(errors)
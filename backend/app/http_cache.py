@@ -0,0 +1,172 @@
+"""市場データのレスポンスの条件付きGET（ETag / Last-Modified）。
+
+検証子はレスポンスの元になったデータの世代とリクエストから作る。日足から作るレスポンスは
+日足ストアの世代、銘柄マスタや決算のように公開済みの最新営業日ごとにキャッシュするものは
+その営業日を世代にする。検証子を付けるのはデータを返した200のレスポンスだけで、空の結果や
+エラーには付けない。
+
+日足ストアに期間が揃っていれば、ルートの依存関数がストアのファイル情報だけで世代を求め、
+If-None-Match / If-Modified-Since が一致すればエンドポイントを実行せず（指標も計算せず）に304を返す。
+"""
+
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import HTTPException, Query, Request, Response
+
+from app.compression import choose_encoding
+from app.jquants_client import daily_version_time, peek_daily_data_version, served_stale
+from app.market_calendar import latest_published_trading_day, publication_at
+from app.utils import STALE_HEADER, parse_codes
+
+
+@dataclass(frozen=True)
+class DataVersion:
+    """レスポンスの元になったデータの世代。tag が同じならデータも同じ。"""
+
+    tag: str
+    modified: datetime
+
+
+def daily_version(version: str | None) -> DataVersion | None:
+    """日足ストアの世代（daily_data_version）から DataVersion を作る。分からなければNone。"""
+    if not version:
+        return None
+    return DataVersion(tag=f"daily:{version}", modified=daily_version_time(version))
+
+
+def combined_version(versions: list[DataVersion | None]) -> DataVersion | None:
+    """複数のデータから作るレスポンスの世代。1つでも分からなければNone。"""
+    if not versions or any(v is None for v in versions):
+        return None
+    known = [v for v in versions if v is not None]
+    return DataVersion(tag="\n".join(v.tag for v in known), modified=max(v.modified for v in known))
+
+
+def generation_version() -> DataVersion:
+    """公開済みの最新営業日ごとにキャッシュするデータ（銘柄マスタ・決算）の世代。"""
+    generation = latest_published_trading_day()
+    return DataVersion(tag=f"generation:{generation.isoformat()}", modified=publication_at(generation))
+
+
+@dataclass(frozen=True)
+class Validators:
+    etag: str
+    last_modified: datetime
+
+    def headers(self) -> dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.last_modified.astimezone(UTC), usegmt=True),
+            # ブラウザにキャッシュさせたうえで、使う前に毎回検証させる
+            "Cache-Control": "no-cache",
+        }
+
+
+def _validators(request: Request, version: DataVersion) -> Validators:
+    """データの世代とリクエストから検証子を作る。"""
+    # 圧縮の有無で中身のバイト列が変わるので、選ばれるコーディングもETagに含める
+    encoding = choose_encoding(request.headers.get("accept-encoding", "")) or "identity"
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    key = "\n".join([request.app.version, version.tag, request.url.path, query, encoding])
+    return Validators(
+        etag=f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"',
+        last_modified=version.modified,
+    )
+
+
+def _etag_matches(if_none_match: str, etag: str, *, allow_any: bool) -> bool:
+    """If-None-Match が etag に一致するか（弱い比較）。allow_any なら * も一致とみなす。"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (allow_any and tag == "*") or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=UTC)
+    # HTTPの日付は秒単位
+    return last_modified.replace(microsecond=0) <= since
+
+
+def _raise_if_not_modified(request: Request, validators: Validators, *, allow_any: bool) -> None:
+    """クライアントのキャッシュがまだ有効なら304を返す。"""
+    if request.method not in ("GET", "HEAD"):
+        return
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, validators.etag, allow_any=allow_any)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(
+            if_modified_since, validators.last_modified
+        )
+    if not_modified:
+        # ETagは選ばれるコーディングごとに変わる
+        raise HTTPException(status_code=304, headers={**validators.headers(), "Vary": "Accept-Encoding"})
+
+
+def _check_version(request: Request, version: DataVersion | None) -> None:
+    # 事前の確認ではまだ結果が空かどうか分からないので、* には応じない
+    if version is not None:
+        _raise_if_not_modified(request, _validators(request, version), allow_any=False)
+
+
+async def check_not_modified(request: Request) -> None:
+    """ルーターの依存関数。営業日ごとにキャッシュするデータのレスポンスがまだ有効なら304を返す。"""
+    _check_version(request, generation_version())
+
+
+async def check_daily_not_modified(
+    request: Request,
+    code: str,
+    from_date: str = Query("", alias="from"),
+    to_date: str = Query("", alias="to"),
+) -> None:
+    """ルートの依存関数。日足ストアに期間が揃っていて、レスポンスがまだ有効なら304を返す。"""
+    version = await asyncio.to_thread(peek_daily_data_version, code, from_date, to_date)
+    _check_version(request, daily_version(version))
+
+
+async def peek_batch_version(codes: str, from_date: str, to_date: str) -> DataVersion | None:
+    """複数銘柄の日足ストアに期間が揃っていれば、上流を呼ばずにまとめた世代を返す。"""
+    versions = await asyncio.gather(
+        *(asyncio.to_thread(peek_daily_data_version, code, from_date, to_date) for code in parse_codes(codes))
+    )
+    return combined_version([daily_version(v) for v in versions])
+
+
+async def check_batch_not_modified(
+    request: Request,
+    codes: str = Query(""),
+    from_date: str = Query("", alias="from"),
+    to_date: str = Query("", alias="to"),
+) -> None:
+    """ルートの依存関数。全銘柄の日足ストアに期間が揃っていて、レスポンスがまだ有効なら304を返す。"""
+    _check_version(request, await peek_batch_version(codes, from_date, to_date))
+
+
+def set_cache_headers(request: Request, response: Response, version: DataVersion | None) -> None:
+    """データを返すレスポンスにヘッダーを付ける。クライアントのキャッシュがまだ有効なら304を返す。
+
+    データの世代が分からないときや、古いスナップショットを返したときは検証子を付けない。
+    古いときは X-Data-Stale で知らせる。再取得後の新しいデータを304で取り逃がさないため。
+    空の結果には呼ばないこと。
+    """
+    if served_stale():
+        response.headers[STALE_HEADER] = "true"
+        return
+    if version is None:
+        return
+    validators = _validators(request, version)
+    _raise_if_not_modified(request, validators, allow_any=True)
+    response.headers.update(validators.headers())
@@ -0,0 +1,115 @@
+"""J-Quants API v2 の非同期クライアント。
+
+httpx.AsyncClient のキープアライブ接続プールをアプリ全体で共有し、上流の応答待ちで
+スレッドプールのワーカーを塞がないようにする。レスポンスのDataFrame化は
+jquants-api-client（ClientV2）と同じ列・型・並び順に揃えている。
+"""
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+import pandas as pd
+from jquantsapi import constants
+
+JQUANTS_API_BASE = "https://api.jquants.com/v2"
+
+_FIN_SUMMARY_DATE_COLUMNS = ("DiscDate", "CurPerSt", "CurPerEn", "CurFYSt", "CurFYEn", "NxtFYSt", "NxtFYEn")
+
+
+class AsyncJQuantsClient:
+    """J-Quants API v2 の非同期クライアント。
+
+    before_request はHTTPリクエスト（ページングの各リクエストを含む）の直前に待機される。
+    レート制限のトークン取得に使う。
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        before_request: Callable[[], Awaitable[None]] | None = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        timeout: float = 30,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self._before_request = before_request
+        self._http = httpx.AsyncClient(
+            base_url=JQUANTS_API_BASE,
+            headers={"x-api-key": api_key},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            timeout=timeout,
+            transport=transport,
+        )
+
+    async def aclose(self) -> None:
+        """接続プールを閉じる。"""
+        await self._http.aclose()
+
+    async def _get_paginated(self, path: str, params: dict[str, str]) -> list[dict[str, Any]]:
+        """pagination_key を辿って全ページのデータ配列を連結して返す。"""
+        all_data: list[dict[str, Any]] = []
+        query = dict(params)
+        while True:
+            if self._before_request is not None:
+                await self._before_request()
+            resp = await self._http.get(path, params=query)
+            resp.raise_for_status()
+            payload = resp.json()
+            batch = payload.get("data", [])
+            if isinstance(batch, list):
+                all_data.extend(batch)
+            pagination_key = payload.get("pagination_key")
+            if not pagination_key:
+                return all_data
+            query["pagination_key"] = pagination_key
+
+    async def get_eq_master(self, code: str = "") -> pd.DataFrame:
+        """上場銘柄一覧 (/equities/master)。"""
+        params = {"code": code} if code else {}
+        data = await self._get_paginated("/equities/master", params)
+        cols = constants.EQ_MASTER_COLUMNS_V2
+        if not data:
+            return pd.DataFrame(columns=cols)
+        df = pd.DataFrame.from_records(data)
+        if "Date" in df.columns:
+            df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        if "Code" in df.columns:
+            df = df.sort_values("Code")
+        return df.reindex(columns=cols).reset_index(drop=True)
+
+    async def get_eq_bars_daily(self, code: str = "", from_yyyymmdd: str = "", to_yyyymmdd: str = "") -> pd.DataFrame:
+        """株価四本値 (/equities/bars/daily)。"""
+        params: dict[str, str] = {}
+        if code:
+            params["code"] = code
+        if from_yyyymmdd:
+            params["from"] = from_yyyymmdd
+        if to_yyyymmdd:
+            params["to"] = to_yyyymmdd
+        data = await self._get_paginated("/equities/bars/daily", params)
+        if not data:
+            return pd.DataFrame()
+        df = pd.DataFrame.from_records(data)
+        if "Date" in df.columns:
+            df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        sort_cols = [c for c in ["Code", "Date"] if c in df.columns]
+        if sort_cols:
+            df = df.sort_values(sort_cols)
+        return df.reset_index(drop=True)
+
+    async def get_fin_summary(self, code: str = "") -> pd.DataFrame:
+        """財務情報サマリ (/fins/summary)。"""
+        params = {"code": code} if code else {}
+        data = await self._get_paginated("/fins/summary", params)
+        cols = constants.FIN_SUMMARY_COLUMNS_V2
+        if not data:
+            return pd.DataFrame(columns=cols)
+        df = pd.DataFrame.from_records(data)
+        for col in _FIN_SUMMARY_DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+        sort_cols = [c for c in ["DiscDate", "DiscTime", "Code"] if c in df.columns]
+        if sort_cols:
+            df = df.sort_values(sort_cols)
+        return df.reindex(columns=cols).reset_index(drop=True)
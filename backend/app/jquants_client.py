@@ -1,24 +1,62 @@
+import asyncio
+import functools
 import hashlib
+import json
 import logging
-from datetime import datetime
+import threading
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import UTC, date, datetime
 from pathlib import Path
 from typing import Any
 
+import httpx
 import jquantsapi
 import pandas as pd
 from requests.exceptions import HTTPError
 from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
+from app.cache_format import CACHE_SUFFIXES, CsvFormat, apply_schema, atomic_write, format_for_path, get_format
+from app.circuit_breaker import CircuitBreaker
 from app.config import settings
+from app.daily_store import (
+    OPEN_START,
+    DateRange,
+    cap_ranges,
+    format_yyyymmdd,
+    has_corporate_action,
+    last_bar_date,
+    merge_bars,
+    merge_ranges,
+    missing_ranges,
+    parse_yyyymmdd,
+    ranges_from_json,
+    ranges_to_json,
+    slice_bars,
+)
+from app.jquants_async import AsyncJQuantsClient
+from app.market_calendar import has_trading_day, latest_published_trading_day, next_publication_at
+from app.memory_cache import MemoryCache
+from app.negative_cache import NegativeCache
+from app.rate_limiter import PLAN_RATES_PER_MINUTE, RateLimitTimeoutError, TokenBucket
+from app.singleflight import AsyncSingleFlight, SingleFlight
 
 logger = logging.getLogger(__name__)
 
 
+def _status_code(exc: BaseException) -> int | None:
+    """HTTPエラーならステータスコードを返す。"""
+    if isinstance(exc, HTTPError) and exc.response is not None:
+        return exc.response.status_code  # type: ignore[no-any-return]
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    return None
+
+
 def _is_rate_limit_error(exc: BaseException) -> bool:
     """429 Too Many Requests（レート制限）エラーかどうかを判定する。"""
-    if isinstance(exc, HTTPError) and exc.response is not None:
-        return exc.response.status_code == 429  # type: ignore[no-any-return]
-    return False
+    return _status_code(exc) == 429
 
 
 # レート制限（429）時のリトライデコレータ: 最大3回、指数バックオフ（2秒→4秒→8秒）
@@ -30,21 +68,115 @@ _retry_on_rate_limit = retry(
 )
 
 
+# 上流の障害が続いたら呼び出しを止めるサーキットブレーカー
+_breaker = CircuitBreaker(
+    failure_threshold=settings.circuit_breaker_failure_threshold,
+    reset_timeout=settings.circuit_breaker_reset_seconds,
+)
+
+
+def _record_upstream_error(exc: BaseException) -> None:
+    """上流呼び出しの例外をブレーカーに記録する。4xx（429以外）は上流が応答しているので成功扱い。"""
+    status = _status_code(exc)
+    if status is not None and status != 429 and status < 500:
+        _breaker.record_success()
+    elif isinstance(exc, Exception) and not isinstance(exc, RateLimitTimeoutError):
+        _breaker.record_failure()
+    else:
+        _breaker.record_ignored()
+
+
+def _guard_upstream[**P, R](fn: Callable[P, R]) -> Callable[P, R]:
+    """上流を呼ぶ関数をサーキットブレーカーで保護する。ブレーカーが開いていれば CircuitOpenError。"""
+
+    @functools.wraps(fn)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        _breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            _record_upstream_error(exc)
+            raise
+        _breaker.record_success()
+        return result
+
+    return wrapper
+
+
+def _guard_upstream_async[**P, R](fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """_guard_upstream の非同期版。"""
+
+    @functools.wraps(fn)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        _breaker.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as exc:
+            _record_upstream_error(exc)
+            raise
+        _breaker.record_success()
+        return result
+
+    return wrapper
+
+
+def get_circuit_breaker_stats() -> dict[str, Any]:
+    """上流のサーキットブレーカーの状態を返す。"""
+    return _breaker.stats()
+
+
+# パース済みDataFrameのメモリ層。キーはディスクキャッシュのパス
+_memory_cache = MemoryCache(
+    max_entries=settings.memory_cache_max_entries,
+    max_bytes=settings.memory_cache_max_bytes,
+    ttl_seconds=settings.memory_cache_ttl_seconds,
+)
+
+# キャッシュミス時の上流呼び出しをキー単位でまとめる
+_flight: SingleFlight[pd.DataFrame] = SingleFlight()
+
+# 空の結果（未知の銘柄コード・データのない期間）のキャッシュ。キーはディスクキャッシュのパスか日足のキー
+_negative_cache = NegativeCache(ttl_seconds=settings.negative_cache_ttl_seconds)
+
+# 全銘柄マスタから作った銘柄コードの索引（元にしたキャッシュファイル, コードの集合）
+_master_index: tuple[Path, frozenset[str]] | None = None
+
+
 def _cache_path(endpoint: str, params: str) -> Path:
-    """キャッシュファイルのパスを生成する。"""
+    """キャッシュファイルのパスを生成する。
+
+    ファイル名の日付は公開済みの最新営業日なので、休業日や公開時刻前は前営業日のキャッシュを使い続ける。
+    """
     cache_dir = Path(settings.cache_dir)
     cache_dir.mkdir(parents=True, exist_ok=True)
     params_hash = hashlib.md5(params.encode()).hexdigest()[:8]  # noqa: S324
-    today = datetime.now().strftime("%Y%m%d")
-    return cache_dir / f"{endpoint}_{params_hash}_{today}.csv"
+    version = latest_published_trading_day().strftime("%Y%m%d")
+    suffix = get_format(settings.cache_format).suffix
+    return cache_dir / f"{endpoint}_{params_hash}_{version}{suffix}"
+
+
+def master_cache_version() -> str:
+    """全銘柄マスタのキャッシュの世代（公開済みの最新営業日に対応するファイル名）を返す。"""
+    return _cache_path("master", "code=").name
+
+
+def _endpoint_of(path: Path) -> str:
+    """キャッシュファイル名の先頭（"daily_xxxx_YYYYMMDD.arrow" の "daily"）からエンドポイント名を得る。"""
+    return path.name.split("_", 1)[0]
 
 
 def _read_cache(path: Path) -> pd.DataFrame | None:
-    """キャッシュファイルが存在すれば読み込む。壊れたCSVはスキップして削除する。"""
+    """キャッシュファイルが存在すれば読み込む。壊れたファイルはスキップして削除する。
+
+    設定形式のファイルがなく同じキーの旧CSVキャッシュがあれば、読み込んだうえで設定形式に移行する。
+    """
     if not path.exists():
+        legacy = path.with_suffix(CsvFormat.suffix)
+        if path.suffix != CsvFormat.suffix and legacy.exists():
+            return _migrate_legacy_cache(legacy, path)
         return None
     try:
-        df = pd.read_csv(path)
+        df = format_for_path(path).read(path, _endpoint_of(path))
     except Exception:
         logger.warning("壊れたキャッシュファイルを検出・削除しました: %s", path)
         path.unlink(missing_ok=True)
@@ -58,72 +190,713 @@ def _read_cache(path: Path) -> pd.DataFrame | None:
 
 
 def _write_cache(path: Path, df: pd.DataFrame) -> None:
-    """DataFrameをCSVキャッシュとして保存する。空DataFrameは保存しない。"""
+    """DataFrameを拡張子に応じた形式でキャッシュとして保存する。空DataFrameは保存しない。"""
     if df.empty:
         logger.info("空のDataFrameはキャッシュに保存しません: %s", path)
         return
-    df.to_csv(path, index=False)
+    format_for_path(path).write(path, df, _endpoint_of(path))
+
+
+def _migrate_legacy_cache(legacy: Path, path: Path) -> pd.DataFrame | None:
+    """旧CSVキャッシュを読み込み、型付き形式で書き直してCSVを削除する。"""
+    df = _read_cache(legacy)
+    if df is None:
+        return None
+    _write_cache(path, df)
+    legacy.unlink(missing_ok=True)
+    logger.info("CSVキャッシュを移行しました: %s -> %s", legacy, path)
+    return df
+
+
+def _cache_expires_at() -> float:
+    """ディスクキャッシュのキー（公開済みの最新営業日）が切り替わる時刻をUNIX時間で返す。"""
+    return next_publication_at().timestamp()
+
+
+def _load_cached(path: Path) -> pd.DataFrame | None:
+    """メモリ層→ディスクの順にキャッシュを探す。ディスクヒット時はメモリ層へ昇格する。"""
+    key = str(path)
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        return cached
+    cached = _read_cache(path)
+    if cached is not None:
+        _memory_cache.put(key, cached, expires_at=_cache_expires_at())
+    return cached
+
+
+def _store_cached(path: Path, df: pd.DataFrame) -> None:
+    """ディスクとメモリ層の両方にキャッシュを保存する。空DataFrameはどちらにも保存しない。"""
+    _write_cache(path, df)
+    if not df.empty:
+        _memory_cache.put(str(path), df, expires_at=_cache_expires_at())
+
+
+def _known_codes() -> frozenset[str] | None:
+    """キャッシュ済みの全銘柄マスタから銘柄コードの索引を返す。マスタが手元になければNone。
+
+    索引のために上流は呼ばない。今の世代がなければ過去の世代のマスタを使う。
+    """
+    global _master_index
+    path = _cache_path("master", "code=")
+    if _master_index is not None and (_master_index[0] == path or not path.exists()):
+        return _master_index[1]
+    source = path if path.exists() else _find_stale_snapshot(path)
+    if source is None:
+        return None
+    df = _load_cached(source)
+    if df is None or "Code" not in df.columns:
+        return None
+    _master_index = (source, frozenset(df["Code"].astype(str)))
+    return _master_index[1]
+
+
+def _is_unknown_code(code: str) -> bool:
+    """銘柄マスタにないコードか。4桁コードは末尾0の5桁コードとしても照合する。索引がなければFalse。"""
+    if not code:
+        return False
+    codes = _known_codes()
+    if codes is None:
+        return False
+    return code not in codes and f"{code}0" not in codes
+
+
+def _fetch_or_empty(fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """取得する。404 Not Found は空の結果として扱う。"""
+    try:
+        return fetch()
+    except Exception as exc:
+        if _status_code(exc) == 404:
+            return pd.DataFrame()
+        raise
+
+
+def _coalesce(key: str, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """同じキーの同時取得を1回にまとめる。待っていた呼び出し側にはコピーを返す。"""
+    df, leader = _flight.do(key, fetch)
+    return df if leader else df.copy()
+
+
+def _cached_or_fetch(path: Path, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """キャッシュがあれば返し、なければ同時リクエストをまとめて1回だけ取得・保存する。
+
+    空の結果は負のキャッシュに記録し、TTLの間は上流を呼ばずに空を返す。
+    """
+    cached = _load_cached(path)
+    if cached is not None:
+        return cached
+    if str(path) in _negative_cache:
+        return pd.DataFrame()
+
+    def _load_or_fetch() -> pd.DataFrame:
+        # 直前に終わった別のフライトが保存していればそれを使う
+        cached = _load_cached(path)
+        if cached is not None:
+            return cached
+        df = _fetch_or_empty(fetch)
+        if df.empty:
+            _negative_cache.add(str(path))
+        _store_cached(path, df)
+        return df
+
+    return _coalesce(str(path), _load_or_fetch)
+
+
+# 設定（DBパス・レート・バースト）ごとのトークンバケット
+_rate_limiters: dict[tuple[Path, float, float], TokenBucket] = {}
+
+
+def _get_rate_limiter() -> TokenBucket:
+    """設定に応じたトークンバケットを返す。状態はキャッシュディレクトリのSQLiteでワーカー間共有する。"""
+    rate = settings.jquants_rate_limit_per_minute or PLAN_RATES_PER_MINUTE[settings.jquants_plan]
+    key = (Path(settings.cache_dir) / "ratelimit.sqlite3", rate, settings.jquants_rate_limit_burst)
+    if key not in _rate_limiters:
+        _rate_limiters[key] = TokenBucket(key[0], rate_per_minute=rate, capacity=settings.jquants_rate_limit_burst)
+    return _rate_limiters[key]
+
+
+class _RateLimitedClient(jquantsapi.ClientV2):  # type: ignore[misc]
+    """HTTPリクエストごとにトークンを取得してから送るクライアント。ページングの各リクエストも対象になる。"""
+
+    def _get(self, url: str, params: dict[str, Any] | None = None) -> Any:
+        _get_rate_limiter().acquire(max_wait=settings.jquants_rate_limit_max_wait_seconds)
+        return super()._get(url, params)
+
+
+# APIキーごとのクライアント。requests.Session を使い回してTLS接続を再利用する
+_clients: dict[str, jquantsapi.ClientV2] = {}
 
 
 def _get_client() -> jquantsapi.ClientV2:
-    """J-Quants API v2クライアントを生成する。"""
-    return jquantsapi.ClientV2(api_key=settings.quants_api_v2_api_key)
+    """J-Quants API v2クライアントを返す。"""
+    api_key = settings.quants_api_v2_api_key
+    if api_key not in _clients:
+        _clients[api_key] = _RateLimitedClient(api_key=api_key)
+    return _clients[api_key]
+
+
+def get_rate_limit_stats() -> dict[str, Any]:
+    """J-Quants APIのレート制限の状態（プラン、残りトークン、待ち時間の見込み）を返す。"""
+    return {"plan": settings.jquants_plan, **_get_rate_limiter().stats()}
 
 
 def get_cache_stats() -> dict[str, Any]:
-    """キャッシュディレクトリの統計情報を返す。"""
+    """キャッシュディレクトリとメモリ層の統計情報を返す。"""
     cache_dir = Path(settings.cache_dir)
+    memory_stats = _memory_cache.stats()
+    flight_stats = _flight.stats()
+    for key, value in _async_flight.stats().items():
+        flight_stats[key] += value
     if not cache_dir.exists():
-        return {"cache_dir": str(cache_dir), "file_count": 0, "total_size_bytes": 0}
-    csv_files = list(cache_dir.glob("*.csv"))
-    total_size = sum(f.stat().st_size for f in csv_files)
+        return {
+            "cache_dir": str(cache_dir),
+            "file_count": 0,
+            "total_size_bytes": 0,
+            "memory": memory_stats,
+            "singleflight": flight_stats,
+            "negative": _negative_cache.stats(),
+        }
+    cache_files = [f for f in cache_dir.iterdir() if f.is_file() and f.suffix in CACHE_SUFFIXES]
+    total_size = sum(f.stat().st_size for f in cache_files)
     return {
         "cache_dir": str(cache_dir),
-        "file_count": len(csv_files),
+        "format": settings.cache_format,
+        "file_count": len(cache_files),
         "total_size_bytes": total_size,
+        "memory": memory_stats,
+        "singleflight": flight_stats,
+        "negative": _negative_cache.stats(),
     }
 
 
+@_guard_upstream
 @_retry_on_rate_limit
+def _fetch_master(code: str) -> pd.DataFrame:
+    """J-Quantsから銘柄マスタを取得する。429エラー時はリトライする。"""
+    client = _get_client()
+    return apply_schema(client.get_eq_master(code=code), "master")
+
+
 def get_stock_master(code: str = "") -> pd.DataFrame:
-    """銘柄マスタを取得する。CSVキャッシュ対応。429エラー時はリトライする。"""
-    cache_key = f"code={code}"
-    path = _cache_path("master", cache_key)
-    cached = _read_cache(path)
-    if cached is not None:
-        return cached
+    """銘柄マスタを取得する。メモリ/ディスクキャッシュ対応。同時のキャッシュミスは1回の取得にまとめる。"""
+    if _is_unknown_code(code):
+        return pd.DataFrame()
+    path = _cache_path("master", f"code={code}")
+    return _cached_or_fetch(path, lambda: _fetch_master(code))
 
+
+@_guard_upstream
+@_retry_on_rate_limit
+def _fetch_daily_bars(code: str, from_date: str, to_date: str) -> pd.DataFrame:
+    """J-Quantsから日足を取得する。429エラー時はリトライする。"""
     client = _get_client()
-    df: pd.DataFrame = client.get_eq_master(code=code)
-    _write_cache(path, df)
-    return df
+    df: pd.DataFrame = client.get_eq_bars_daily(code=code, from_yyyymmdd=from_date, to_yyyymmdd=to_date)
+    return apply_schema(df, "daily")
 
 
-@_retry_on_rate_limit
-def get_daily_quotes(code: str, from_date: str = "", to_date: str = "") -> pd.DataFrame:
-    """株価日足データを取得する。CSVキャッシュ対応。429エラー時はリトライする。"""
-    cache_key = f"code={code}&from={from_date}&to={to_date}"
-    path = _cache_path("daily", cache_key)
-    cached = _read_cache(path)
+# 銘柄ごとの日足ストアの書き込みロック。読み込み→マージ→保存を銘柄ごとに1つずつにして、
+# 期間の違うフライトや全銘柄の先読みが互いの日足を上書きで失わないようにする（銘柄数だけ作られる）
+_store_locks: dict[str, threading.Lock] = {}
+_store_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _daily_store_lock(code: str) -> Iterator[None]:
+    with _store_locks_guard:
+        lock = _store_locks.setdefault(code, threading.Lock())
+    with lock:
+        yield
+
+
+def _daily_store_paths(code: str) -> tuple[Path, Path]:
+    """銘柄ごとの日足ストアのデータファイルとカバレッジファイルのパスを返す。"""
+    cache_dir = Path(settings.cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data_path = cache_dir / f"daily_{code}{get_format(settings.cache_format).suffix}"
+    return data_path, data_path.with_suffix(".ranges.json")
+
+
+def daily_store_path(code: str) -> Path:
+    """銘柄ごとの日足ストアのデータファイルのパス。日足から作るファイルはこの隣に置く。"""
+    return _daily_store_paths(code)[0]
+
+
+def _read_coverage(ranges_path: Path) -> list[DateRange] | None:
+    """カバレッジファイルを読み込む。ないか壊れていればNone（壊れたファイルは削除する）。"""
+    if not ranges_path.exists():
+        return None
+    try:
+        return ranges_from_json(json.loads(ranges_path.read_text()))
+    except (ValueError, TypeError):
+        logger.warning("壊れたカバレッジファイルを検出・削除しました: %s", ranges_path)
+        ranges_path.unlink(missing_ok=True)
+        return None
+
+
+def _store_version(data_path: Path) -> str | None:
+    """日足ストアの世代。ファイルの更新時刻とサイズなので、保存のたびに変わりワーカー間でも同じになる。"""
+    try:
+        stat = data_path.stat()
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def daily_version_time(version: str) -> datetime:
+    """日足ストアの世代から、ストアを保存した時刻を返す。"""
+    return datetime.fromtimestamp(int(version.split("-", 1)[0], 16) / 1e9, tz=UTC)
+
+
+def daily_data_version(df: pd.DataFrame) -> str | None:
+    """get_daily_quotes(_async) が返した日足の元になった日足ストアの世代。分からなければNone。
+
+    ストアが更新されると世代が変わるので、日足から計算した結果のキャッシュキーに使える。
+    """
+    version = df.attrs.get("version")
+    return str(version) if version else None
+
+
+def _load_daily_store(code: str, promote: bool = True) -> tuple[pd.DataFrame | None, list[DateRange]]:
+    """日足ストアと取得済み期間を読み込む。カバレッジと世代はDataFrameのattrsに載せてメモリ層に置く。
+
+    promote=False ならディスクから読んだ結果をメモリ層に載せない。
+    """
+    data_path, ranges_path = _daily_store_paths(code)
+    cached = _memory_cache.get(str(data_path))
     if cached is not None:
-        return cached
+        return cached, ranges_from_json(cached.attrs.get("covered", []))
+    covered = _read_coverage(ranges_path)
+    if covered is None:
+        return None, []
+    df = _read_cache(data_path)
+    if df is None:
+        return None, []
+    df.attrs["covered"] = ranges_to_json(covered)
+    df.attrs["version"] = _store_version(data_path)
+    if promote:
+        _memory_cache.put(str(data_path), df)
+    return df, covered
+
+
+def _save_daily_store(code: str, df: pd.DataFrame, covered: list[DateRange], promote: bool = True) -> None:
+    """日足ストアを保存する。データを先に書くので、途中で落ちてもカバレッジが実データを超えない。
+
+    promote=False ならメモリ層には載せず、古いエントリを捨てるだけにする。
+    既存のストアにマージして保存する場合は、読み込みから _daily_store_lock(code) の中で行うこと。
+    """
+    data_path, ranges_path = _daily_store_paths(code)
+    df.attrs["covered"] = ranges_to_json(covered)
+    _write_cache(data_path, df)
+    df.attrs["version"] = _store_version(data_path)
+    text = json.dumps(df.attrs["covered"])
+    atomic_write(ranges_path, lambda tmp: tmp.write_text(text))
+    if promote:
+        _memory_cache.put(str(data_path), df)
+    else:
+        _memory_cache.invalidate(str(data_path))
+
+
+def _daily_request_range(from_date: str, to_date: str) -> tuple[date, date]:
+    """リクエストの期間を日付にする。終了日はデータ公開済みの最新営業日より先にしない。"""
+    latest = latest_published_trading_day()
+    start = parse_yyyymmdd(from_date, OPEN_START)
+    end = min(parse_yyyymmdd(to_date, latest), latest)
+    return start, end
+
+
+def _missing_trading_ranges(covered: list[DateRange], start: date, end: date) -> list[DateRange]:
+    """[start, end] のうち未取得で、営業日を含む期間を返す。休業日だけの期間は取得しても空になる。"""
+    return [gap for gap in missing_ranges(covered, start, end) if has_trading_day(*gap)]
+
 
+def _concat_bars(fetched: list[pd.DataFrame]) -> pd.DataFrame:
+    """期間ごとに取得した日足を連結する。"""
+    new_bars = [df for df in fetched if not df.empty]
+    return pd.concat(new_bars, ignore_index=True) if new_bars else pd.DataFrame()
+
+
+def _save_daily_update(
+    code: str, start: date, end: date, gaps: list[DateRange], new: pd.DataFrame, rebuild: bool = False
+) -> pd.DataFrame:
+    """取得した日足をストアにマージして保存し、[start, end] を返す。
+
+    取得している間に別のフライトがストアを更新していることがあるので、マージ先のストアは銘柄のロックを
+    取ってから読み直す。rebuild なら既存のストアを捨てて new だけで作り直す。
+    カバレッジに加えるのは各期間のうち最後の日足の日付まで。上流がまだ返さない末尾は次回取り直す。
+    """
+    with _daily_store_lock(code):
+        store, covered = (None, []) if rebuild else _load_daily_store(code)
+        merged = merge_bars(store, new)
+        if not merged.empty:
+            _save_daily_store(code, merged, merge_ranges(covered + cap_ranges(gaps, last_bar_date(merged))))
+    return slice_bars(merged, start, end)
+
+
+@_guard_upstream
+@_retry_on_rate_limit
+def fetch_market_daily_bars(day: date) -> pd.DataFrame:
+    """指定日の全銘柄の日足を1回のリクエストで取得する。429エラー時はリトライする。"""
     client = _get_client()
-    df: pd.DataFrame = client.get_eq_bars_daily(code=code, from_yyyymmdd=from_date, to_yyyymmdd=to_date)
-    _write_cache(path, df)
-    return df
+    df: pd.DataFrame = client.get_eq_bars_daily(date_yyyymmdd=format_yyyymmdd(day))
+    return apply_schema(df, "daily")
+
+
+def store_market_bars(bars: pd.DataFrame, start: date, end: date) -> list[str]:
+    """[start, end] の全銘柄の日足を銘柄ごとの日足ストアに振り分け、更新した銘柄コードを返す。
+
+    各銘柄のカバレッジには bars の最後の日付までを加える。上流がまだ返さない末尾の日付は未取得のまま残す。
+    メモリ層は埋めず、古いエントリだけを捨てる（全銘柄分でリクエスト中の銘柄を追い出さないため）。
+    """
+    if bars.empty or "Code" not in bars.columns:
+        return []
+    covered_range = cap_ranges([(start, end)], last_bar_date(bars))
+    updated: list[str] = []
+    for code, new in bars.groupby("Code", sort=False):
+        code = str(code)
+        with _daily_store_lock(code):
+            store, covered = _load_daily_store(code, promote=False)
+            if store is not None and has_corporate_action(new):
+                logger.info("調整係数の変更を検出したため日足ストアを再構築します: code=%s", code)
+                store, covered = None, []
+            merged = merge_bars(store, new.reset_index(drop=True))
+            _save_daily_store(code, merged, merge_ranges(covered + covered_range), promote=False)
+        updated.append(code)
+    return updated
+
+
+def pending_daily_fetches(code: str, from_date: str = "", to_date: str = "") -> int:
+    """[from, to] の日足を返すために銘柄単位で上流へ送るリクエスト数（未取得の期間の数）を返す。"""
+    start, end = _daily_request_range(from_date, to_date)
+    if start > end or _is_unknown_code(code) or f"daily_{code}:{start}:{end}" in _negative_cache:
+        return 0
+    _, ranges_path = _daily_store_paths(code)
+    return len(_missing_trading_ranges(_read_coverage(ranges_path) or [], start, end))
 
 
+def peek_daily_data_version(code: str, from_date: str = "", to_date: str = "") -> str | None:
+    """[from, to] の日足がストアに揃っていれば、上流を呼ばずにストアの世代を返す。揃っていなければNone。
+
+    カバレッジファイルとストアのファイル情報だけを見るので、日足は読み込まない。
+    """
+    start, end = _daily_request_range(from_date, to_date)
+    if start > end:
+        return None
+    data_path, ranges_path = _daily_store_paths(code)
+    covered = _read_coverage(ranges_path)
+    if not covered or _missing_trading_ranges(covered, start, end):
+        return None
+    return _store_version(data_path)
+
+
+def get_daily_quotes(code: str, from_date: str = "", to_date: str = "") -> pd.DataFrame:
+    """株価日足データを取得する。
+
+    銘柄ごとの日足ストアに取得済み期間を記録し、リクエスト期間のうち未取得の端だけを
+    J-Quantsから取得してマージする。期間の切り出しはストアのスライスで行う。
+    """
+    start, end = _daily_request_range(from_date, to_date)
+    if start > end or _is_unknown_code(code):
+        return pd.DataFrame()
+
+    store, covered = _load_daily_store(code)
+    if store is not None and not _missing_trading_ranges(covered, start, end):
+        return slice_bars(store, start, end)
+    key = f"daily_{code}:{start}:{end}"
+    if store is None and key in _negative_cache:
+        return pd.DataFrame()
+    return _coalesce(key, lambda: _update_daily_store(code, start, end))
+
+
+def _update_daily_store(code: str, start: date, end: date) -> pd.DataFrame:
+    """未取得の期間をJ-Quantsから取得して日足ストアにマージし、[start, end] を返す。"""
+    # 直前に終わった別のフライトがストアを更新していれば取得する期間が減る
+    store, covered = _load_daily_store(code)
+    gaps = _missing_trading_ranges(covered, start, end)
+    if store is not None and not gaps:
+        return slice_bars(store, start, end)
+
+    new = _concat_bars(
+        [
+            _fetch_or_empty(
+                functools.partial(_fetch_daily_bars, code, format_yyyymmdd(g_start), format_yyyymmdd(g_end))
+            )
+            for g_start, g_end in gaps
+        ]
+    )
+    if store is None and new.empty:
+        _negative_cache.add(f"daily_{code}:{start}:{end}")
+        return new
+    if store is not None and has_corporate_action(new):
+        # 分割・併合があると過去の調整後価格も変わるため、ストアを捨ててリクエスト期間を取り直す
+        logger.info("調整係数の変更を検出したため日足ストアを再構築します: code=%s", code)
+        new = _fetch_daily_bars(code, format_yyyymmdd(start), format_yyyymmdd(end))
+        return _save_daily_update(code, start, end, [(start, end)], new, rebuild=True)
+    return _save_daily_update(code, start, end, gaps, new)
+
+
+@_guard_upstream
 @_retry_on_rate_limit
+def _fetch_financials(code: str) -> pd.DataFrame:
+    """J-Quantsから決算サマリーを取得する。429エラー時はリトライする。"""
+    client = _get_client()
+    return apply_schema(client.get_fin_summary(code=code), "financials")
+
+
 def get_financial_statements(code: str) -> pd.DataFrame:
-    """決算サマリーを取得する。CSVキャッシュ対応。429エラー時はリトライする。"""
-    cache_key = f"code={code}"
-    path = _cache_path("financials", cache_key)
-    cached = _read_cache(path)
+    """決算サマリーを取得する。メモリ/ディスクキャッシュ対応。同時のキャッシュミスは1回の取得にまとめる。"""
+    if _is_unknown_code(code):
+        return pd.DataFrame()
+    path = _cache_path("financials", f"code={code}")
+    return _cached_or_fetch(path, lambda: _fetch_financials(code))
+
+
+# ---------------------------------------------------------------------------
+# 非同期版: 共有の httpx.AsyncClient で上流を待つ間イベントループを塞がない。
+# キャッシュの読み書きはスレッドに逃がす。
+# ---------------------------------------------------------------------------
+
+_async_client: AsyncJQuantsClient | None = None
+_async_flight: AsyncSingleFlight[pd.DataFrame] = AsyncSingleFlight()
+
+# このリクエスト（コンテキスト）で古いスナップショットを返したか。ルーターがレスポンスヘッダーに使う
+_stale_served: ContextVar[bool] = ContextVar("stale_served", default=False)
+# バックグラウンドで再取得中のキー。タスクへの参照を持ってGCされないようにする
+_revalidations: dict[str, asyncio.Task[None]] = {}
+
+
+async def _acquire_token_async() -> None:
+    """トークンを予約し、送信してよくなるまでイベントループ上で待つ。"""
+    wait = await asyncio.to_thread(_get_rate_limiter().reserve, settings.jquants_rate_limit_max_wait_seconds)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def open_async_client() -> AsyncJQuantsClient:
+    """キープアライブ接続プールを持つ非同期クライアントを作る。アプリのlifespanで呼ぶ。"""
+    global _async_client
+    _async_client = AsyncJQuantsClient(
+        api_key=settings.quants_api_v2_api_key,
+        before_request=_acquire_token_async,
+        max_connections=settings.jquants_http_max_connections,
+    )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """非同期クライアントの接続プールを閉じる。"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _get_async_client() -> AsyncJQuantsClient:
+    """共有の非同期クライアントを返す。lifespan外（スクリプトなど）では初回に作る。"""
+    return _async_client if _async_client is not None else open_async_client()
+
+
+async def _fetch_or_empty_async(fetch: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+    """_fetch_or_empty の非同期版。"""
+    try:
+        return await fetch()
+    except Exception as exc:
+        if _status_code(exc) == 404:
+            return pd.DataFrame()
+        raise
+
+
+async def _coalesce_async(key: str, fetch: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+    """_coalesce の非同期版。"""
+    df, leader = await _async_flight.do(key, fetch)
+    return df if leader else df.copy()
+
+
+def served_stale() -> bool:
+    """現在のリクエストで、再取得待ちの古いスナップショットを返したかどうか。"""
+    return _stale_served.get()
+
+
+def mark_stale(df: pd.DataFrame) -> pd.DataFrame:
+    """古いスナップショットを返すことを現在のリクエストに記録する。
+
+    別のタスクで取得した結果は記録がリクエスト側に伝わらないので、受け取った側で改めて呼ぶ。
+    """
+    if df.attrs.get("stale"):
+        _stale_served.set(True)
+    return df
+
+
+def _revalidate_in_background(key: str, refresh: Callable[[], Awaitable[pd.DataFrame]]) -> None:
+    """キーの再取得をバックグラウンドで始める。同じキーが再取得中なら何もしない。"""
+    if key in _revalidations:
+        return
+
+    async def _run() -> None:
+        try:
+            await _coalesce_async(key, refresh)
+        except Exception as exc:
+            logger.warning("バックグラウンドの再取得に失敗しました: %s (%s)", key, exc)
+        finally:
+            _revalidations.pop(key, None)
+
+    _revalidations[key] = asyncio.create_task(_run())
+
+
+def _find_stale_snapshot(path: Path) -> Path | None:
+    """同じキーの過去の世代のキャッシュファイルのうち、最新のものを返す。"""
+    prefix = path.stem.rsplit("_", 1)[0]
+    older = sorted(p for p in path.parent.glob(f"{prefix}_*{path.suffix}") if p.name < path.name)
+    return older[-1] if older else None
+
+
+def _load_stale_snapshot(path: Path) -> pd.DataFrame | None:
+    """過去の世代のキャッシュを読み込み、古いことを示す印（attrs["stale"]）を付けて返す。"""
+    stale_path = _find_stale_snapshot(path)
+    if stale_path is None:
+        return None
+    df = _load_cached(stale_path)
+    if df is None:
+        return None
+    df.attrs["stale"] = True
+    return df
+
+
+async def _cached_or_fetch_async(path: Path, fetch: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+    """_cached_or_fetch の非同期版。
+
+    stale_while_revalidate が有効なら、今の世代のキャッシュがなくても過去の世代があればそれを
+    すぐに返し、再取得はバックグラウンドで行う。
+    """
+    cached = await asyncio.to_thread(_load_cached, path)
     if cached is not None:
         return cached
+    if str(path) in _negative_cache:
+        return pd.DataFrame()
 
-    client = _get_client()
-    df: pd.DataFrame = client.get_fin_summary(code=code)
-    _write_cache(path, df)
-    return df
+    async def _load_or_fetch() -> pd.DataFrame:
+        cached = await asyncio.to_thread(_load_cached, path)
+        if cached is not None:
+            return cached
+        df = await _fetch_or_empty_async(fetch)
+        if df.empty:
+            _negative_cache.add(str(path))
+        await asyncio.to_thread(_store_cached, path, df)
+        return df
+
+    if settings.stale_while_revalidate:
+        stale = await asyncio.to_thread(_load_stale_snapshot, path)
+        if stale is not None:
+            _revalidate_in_background(str(path), _load_or_fetch)
+            return stale
+    return await _coalesce_async(str(path), _load_or_fetch)
+
+
+@_guard_upstream_async
+@_retry_on_rate_limit
+async def _fetch_master_async(code: str) -> pd.DataFrame:
+    """J-Quantsから銘柄マスタを非同期に取得する。429エラー時はリトライする。"""
+    return apply_schema(await _get_async_client().get_eq_master(code=code), "master")
+
+
+@_guard_upstream_async
+@_retry_on_rate_limit
+async def _fetch_daily_bars_async(code: str, from_date: str, to_date: str) -> pd.DataFrame:
+    """J-Quantsから日足を非同期に取得する。429エラー時はリトライする。"""
+    df = await _get_async_client().get_eq_bars_daily(code=code, from_yyyymmdd=from_date, to_yyyymmdd=to_date)
+    return apply_schema(df, "daily")
+
+
+@_guard_upstream_async
+@_retry_on_rate_limit
+async def _fetch_financials_async(code: str) -> pd.DataFrame:
+    """J-Quantsから決算サマリーを非同期に取得する。429エラー時はリトライする。"""
+    return apply_schema(await _get_async_client().get_fin_summary(code=code), "financials")
+
+
+async def get_stock_master_async(code: str = "") -> pd.DataFrame:
+    """get_stock_master の非同期版。"""
+    if await asyncio.to_thread(_is_unknown_code, code):
+        return pd.DataFrame()
+    path = _cache_path("master", f"code={code}")
+    return mark_stale(await _cached_or_fetch_async(path, lambda: _fetch_master_async(code)))
+
+
+async def get_daily_quotes_async(code: str, from_date: str = "", to_date: str = "") -> pd.DataFrame:
+    """get_daily_quotes の非同期版。"""
+    start, end = _daily_request_range(from_date, to_date)
+    if start > end or await asyncio.to_thread(_is_unknown_code, code):
+        return pd.DataFrame()
+
+    store, covered = await asyncio.to_thread(_load_daily_store, code)
+    gaps = _missing_trading_ranges(covered, start, end)
+    if store is not None and not gaps:
+        return slice_bars(store, start, end)
+
+    key = f"daily_{code}:{start}:{end}"
+    if store is None and key in _negative_cache:
+        return pd.DataFrame()
+    if settings.stale_while_revalidate and store is not None and gaps[0][0] > start:
+        # 開始日側は取得済みで新しい日付だけが足りない: 手元の日足をすぐ返し、続きは裏で取る
+        stale = slice_bars(store, start, end).copy()
+        if not stale.empty:
+            stale.attrs["stale"] = True
+            _revalidate_in_background(key, lambda: _update_daily_store_async(code, start, end))
+            return mark_stale(stale)
+    return await _coalesce_async(key, lambda: _update_daily_store_async(code, start, end))
+
+
+async def prepare_daily_store_async(
+    code: str, from_date: str = "", to_date: str = ""
+) -> tuple[Path, date, date] | None:
+    """日足ストアが [from, to] を含むように未取得の期間を取得し、ストアのファイルと期間を返す。
+
+    エクスポートでファイルから直接読むために使う。取得済みならカバレッジファイルだけを確認し、
+    ストアをメモリに読み込まない。データがなければNone。
+    """
+    start, end = _daily_request_range(from_date, to_date)
+    if start > end or await asyncio.to_thread(_is_unknown_code, code):
+        return None
+    data_path, ranges_path = _daily_store_paths(code)
+    covered = await asyncio.to_thread(_read_coverage, ranges_path) or []
+    if _missing_trading_ranges(covered, start, end):
+        key = f"daily_{code}:{start}:{end}"
+        if not covered and key in _negative_cache:
+            return None
+        await _coalesce_async(key, lambda: _update_daily_store_async(code, start, end))
+    if not data_path.exists() and await asyncio.to_thread(_read_cache, data_path) is None:
+        return None
+    return data_path, start, end
+
+
+async def _update_daily_store_async(code: str, start: date, end: date) -> pd.DataFrame:
+    """_update_daily_store の非同期版。未取得の期間は並行して取得する。"""
+    store, covered = await asyncio.to_thread(_load_daily_store, code)
+    gaps = _missing_trading_ranges(covered, start, end)
+    if store is not None and not gaps:
+        return slice_bars(store, start, end)
+
+    fetched = await asyncio.gather(
+        *(
+            _fetch_or_empty_async(
+                functools.partial(_fetch_daily_bars_async, code, format_yyyymmdd(g_start), format_yyyymmdd(g_end))
+            )
+            for g_start, g_end in gaps
+        )
+    )
+    new = _concat_bars(list(fetched))
+    if store is None and new.empty:
+        _negative_cache.add(f"daily_{code}:{start}:{end}")
+        return new
+    if store is not None and has_corporate_action(new):
+        logger.info("調整係数の変更を検出したため日足ストアを再構築します: code=%s", code)
+        new = await _fetch_daily_bars_async(code, format_yyyymmdd(start), format_yyyymmdd(end))
+        return await asyncio.to_thread(_save_daily_update, code, start, end, [(start, end)], new, True)
+    return await asyncio.to_thread(_save_daily_update, code, start, end, gaps, new)
+
+
+async def get_financial_statements_async(code: str) -> pd.DataFrame:
+    """get_financial_statements の非同期版。"""
+    if await asyncio.to_thread(_is_unknown_code, code):
+        return pd.DataFrame()
+    path = _cache_path("financials", f"code={code}")
+    return mark_stale(await _cached_or_fetch_async(path, lambda: _fetch_financials_async(code)))
@@ -6,38 +6,63 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.analysis.router import router as analysis_router
+from app.analysis.service import get_indicator_cache_stats
+from app.compression import CompressionMiddleware
 from app.config import settings
-from app.jquants_client import get_cache_stats
+from app.export.router import router as export_router
+from app.jquants_client import (
+    close_async_client,
+    get_cache_stats,
+    get_circuit_breaker_stats,
+    get_rate_limit_stats,
+    open_async_client,
+)
+from app.prefetch.router import router as prefetch_router
+from app.prefetch.service import get_prefetch_status, resolve_range, start_prefetch_in_background
 from app.stocks.router import router as stocks_router
+from app.utils import STALE_HEADER, TOTAL_COUNT_HEADER
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # J-Quantsへの接続プールはプロセスで1つを共有する
+    open_async_client()
+    if settings.prefetch_on_startup_days > 0:
+        start_prefetch_in_background(*resolve_range(settings.prefetch_on_startup_days))
     print("stocks-study backend started")
     yield
+    await close_async_client()
 
 
 app = FastAPI(title="stocks-study API", version="0.1.0", lifespan=lifespan)
 
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[STALE_HEADER, TOTAL_COUNT_HEADER],
 )
 
 app.include_router(stocks_router, prefix="/api")
 app.include_router(analysis_router, prefix="/api")
+app.include_router(prefetch_router, prefix="/api")
+app.include_router(export_router, prefix="/api")
 
 
 @app.get("/api/health")
 def health_check() -> dict[str, Any]:
-    """ヘルスチェック。APIキー設定状況とキャッシュ状態を含む。"""
+    """ヘルスチェック。APIキー設定状況、キャッシュ状態、レート制限・サーキットブレーカーの状態を含む。"""
     api_key_configured = bool(settings.quants_api_v2_api_key)
-    cache_stats = get_cache_stats()
+    cache_stats = {**get_cache_stats(), "indicators": get_indicator_cache_stats()}
     return {
         "status": "ok",
         "api_key_configured": api_key_configured,
         "cache": cache_stats,
+        "rate_limit": get_rate_limit_stats(),
+        "circuit_breaker": get_circuit_breaker_stats(),
+        "prefetch": {key: value for key, value in get_prefetch_status().items() if key != "rate_limit"},
     }
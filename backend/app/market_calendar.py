@@ -0,0 +1,106 @@
+"""東証の営業日カレンダーとデータ公開時刻に基づくキャッシュの有効期限。
+
+J-Quantsの日足などは営業日の引け後（公開時刻、JST）にしか更新されない。キャッシュの世代を
+「公開済みの最新営業日」で決めると、土日・祝日や公開前の時間帯に同じデータを取り直さずに済む。
+休業日はリポジトリ同梱のCSV（date,name）から読み込むのでネットワークなしで使える。
+"""
+
+import csv
+import logging
+from datetime import date, datetime, time, timedelta
+from functools import cache
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+JST = ZoneInfo("Asia/Tokyo")
+
+_BUNDLED_CALENDAR = Path(__file__).parent / "data" / "tse_holidays.csv"
+
+
+@cache
+def _load_holidays(path: str) -> tuple[frozenset[date], int, int]:
+    """休業日CSVを読み込み、休業日の集合と収録年の範囲を返す。"""
+    with open(path, encoding="utf-8", newline="") as f:
+        holidays = frozenset(date.fromisoformat(row["date"]) for row in csv.DictReader(f))
+    years = [d.year for d in holidays]
+    return holidays, min(years), max(years)
+
+
+def _holidays() -> tuple[frozenset[date], int, int]:
+    return _load_holidays(settings.market_calendar_path or str(_BUNDLED_CALENDAR))
+
+
+def is_trading_day(day: date) -> bool:
+    """東証の営業日か。カレンダーの収録範囲外は土日と年末年始（12/31〜1/3）だけを休業日とみなす。"""
+    if day.weekday() >= 5:
+        return False
+    holidays, first_year, last_year = _holidays()
+    if first_year <= day.year <= last_year:
+        return day not in holidays
+    logger.debug("営業日カレンダーの収録範囲外です: %s", day)
+    return not ((day.month == 12 and day.day == 31) or (day.month == 1 and day.day <= 3))
+
+
+def trading_days(start: date, end: date) -> list[date]:
+    """[start, end] の営業日を返す。"""
+    days = (start + timedelta(days=i) for i in range((end - start).days + 1))
+    return [day for day in days if is_trading_day(day)]
+
+
+def has_trading_day(start: date, end: date) -> bool:
+    """[start, end] に営業日が1日でもあるか。"""
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            return True
+        day += timedelta(days=1)
+    return False
+
+
+def previous_trading_day(day: date) -> date:
+    """day より前の直近の営業日を返す。"""
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_trading_day(day: date) -> date:
+    """day より後の直近の営業日を返す。"""
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def _publish_time() -> time:
+    return time.fromisoformat(settings.market_data_publish_time)
+
+
+def _now_jst(now: datetime | None) -> datetime:
+    if now is None:
+        return datetime.now(JST)
+    return now.astimezone(JST) if now.tzinfo is not None else now.replace(tzinfo=JST)
+
+
+def latest_published_trading_day(now: datetime | None = None) -> date:
+    """データが公開済みの最新の営業日を返す。今日が営業日でも公開時刻前なら前営業日になる。"""
+    now = _now_jst(now)
+    today = now.date()
+    if is_trading_day(today) and now.time() >= _publish_time():
+        return today
+    return previous_trading_day(today)
+
+
+def publication_at(day: date) -> datetime:
+    """営業日 day のデータが公開される時刻（JST）を返す。"""
+    return datetime.combine(day, _publish_time(), tzinfo=JST)
+
+
+def next_publication_at(now: datetime | None = None) -> datetime:
+    """次に新しいデータが公開されうる時刻（JST）を返す。キャッシュはこの時刻まで有効。"""
+    return publication_at(next_trading_day(latest_published_trading_day(now)))
@@ -0,0 +1,110 @@
+"""パース済みDataFrameを保持するインメモリキャッシュ。
+
+ディスクキャッシュ（Arrow IPC / Parquet、app.cache_format）の手前に置き、ホットな銘柄や銘柄マスタを
+ディスクI/Oや読み込みなしで返すためのLRU/TTLキャッシュ。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import pandas as pd
+
+
+@dataclass
+class _Entry:
+    df: pd.DataFrame
+    size_bytes: int
+    expires_at: float
+
+
+class MemoryCache:
+    """エントリ数・合計バイト数の上限とTTLを持つスレッドセーフなLRUキャッシュ。
+
+    FastAPIの同期ハンドラはスレッドプールで実行されるため、操作はロックで保護する。
+    呼び出し側がDataFrameを書き換えてもキャッシュが汚れないよう、読み書きともにコピーを扱う。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """キーに対応するDataFrameを返す。未登録または期限切れならNone。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            df = entry.df
+        return df.copy()
+
+    def put(self, key: str, df: pd.DataFrame, expires_at: float | None = None) -> None:
+        """DataFrameを登録する。expires_atを渡すとTTLより早い時刻で失効させる。"""
+        size_bytes = int(df.memory_usage(index=True, deep=True).sum())
+        if size_bytes > self.max_bytes or self.max_entries <= 0:
+            return
+        deadline = time.time() + self.ttl_seconds
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        entry = _Entry(df=df.copy(), size_bytes=size_bytes, expires_at=deadline)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size_bytes += size_bytes
+            while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        """指定キーのエントリを削除する。"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """全エントリと統計カウンタをリセットする。"""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def stats(self) -> dict[str, Any]:
+        """ヒット率などの統計情報を返す。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size_bytes -= entry.size_bytes
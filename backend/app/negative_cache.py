@@ -0,0 +1,60 @@
+"""空の結果（存在しない銘柄コード、データのない期間）を短時間だけ覚えておくキャッシュ。
+
+ディスクキャッシュは空のDataFrameを保存しないので、何も返らないリクエストは毎回上流に届き
+レート制限の枠を消費する。キーだけを短いTTLで保持し、その間は上流を呼ばずに空を返す。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+
+class NegativeCache:
+    """キーごとの有効期限を持つスレッドセーフなLRUの集合。ttl_seconds が0以下なら何も覚えない。"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._expires: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def add(self, key: str) -> None:
+        """キーを空の結果として記録する。"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._expires[key] = self._clock() + self.ttl_seconds
+            self._expires.move_to_end(key)
+            while len(self._expires) > self.max_entries:
+                self._expires.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            expires_at = self._expires.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= self._clock():
+                del self._expires[key]
+                return False
+            self.hits += 1
+            return True
+
+    def clear(self) -> None:
+        """全エントリと統計をリセットする。"""
+        with self._lock:
+            self._expires.clear()
+            self.hits = 0
+
+    def stats(self) -> dict[str, Any]:
+        """エントリ数・ヒット数などの統計情報を返す。"""
+        with self._lock:
+            return {"entries": len(self._expires), "hits": self.hits, "ttl_seconds": self.ttl_seconds}
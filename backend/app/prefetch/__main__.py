@@ -0,0 +1,31 @@
+"""全銘柄の日足を先読みするウォームアップコマンド。
+
+python -m app.prefetch --days 30
+python -m app.prefetch --from 20240101 --to 20241231
+"""
+
+import argparse
+import json
+import logging
+
+from app.prefetch.service import prefetch_market, resolve_range
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="全銘柄の日足を日付単位で取得して日足ストアを温める")
+    parser.add_argument("--days", type=int, default=30, help="直近何日分を先読みするか")
+    parser.add_argument("--from", dest="from_date", default="", help="開始日 (YYYYMMDD)。指定時は--daysより優先")
+    parser.add_argument("--to", dest="to_date", default="", help="終了日 (YYYYMMDD)")
+    parser.add_argument("--chunk-days", type=int, default=20, help="何日分ごとに銘柄別ストアへ書き出すか")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    start, end = resolve_range(args.days, args.from_date, args.to_date)
+    status = prefetch_market(start, end, chunk_days=args.chunk_days)
+    print(json.dumps(status, ensure_ascii=False, indent=2))
+    if status["state"] == "failed":
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
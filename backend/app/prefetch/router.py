@@ -0,0 +1,25 @@
+from typing import Any
+
+from fastapi import APIRouter, Query
+
+from app.prefetch.service import get_prefetch_status, resolve_range, start_prefetch_in_background
+
+router = APIRouter(prefix="/prefetch", tags=["prefetch"])
+
+
+@router.get("")
+def prefetch_status() -> dict[str, Any]:
+    """全銘柄の日足の先読みの進捗と、残りの上流の予算を返す。"""
+    return get_prefetch_status()
+
+
+@router.post("", status_code=202)
+def start_prefetch(
+    days: int = Query(30, ge=1, description="直近何日分を先読みするか"),
+    from_date: str = Query("", alias="from", description="開始日 (YYYYMMDD)。指定時はdaysより優先"),
+    to_date: str = Query("", alias="to", description="終了日 (YYYYMMDD)"),
+) -> dict[str, Any]:
+    """全銘柄の日足の先読みをバックグラウンドで開始する。実行中なら新たには開始しない。"""
+    start, end = resolve_range(days, from_date, to_date)
+    started = start_prefetch_in_background(start, end)
+    return {"started": started, **get_prefetch_status()}
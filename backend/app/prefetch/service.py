@@ -0,0 +1,163 @@
+"""全銘柄の日足を日付単位で先読みし、銘柄ごとの日足ストアに振り分ける。
+
+J-Quantsは日付を指定すると全銘柄の日足を1回のリクエストで返すので、市場全体を埋めるのに
+必要なリクエストは銘柄数ではなく営業日数になる。取得済みの日付は市場全体のカバレッジとして
+記録し、次回は未取得の営業日だけを取得する。
+"""
+
+import json
+import logging
+import threading
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from app.config import settings
+from app.daily_store import (
+    DateRange,
+    cap_ranges,
+    last_bar_date,
+    merge_ranges,
+    missing_ranges,
+    parse_yyyymmdd,
+    ranges_from_json,
+    ranges_to_json,
+)
+from app.jquants_client import fetch_market_daily_bars, get_rate_limit_stats, store_market_bars
+from app.market_calendar import latest_published_trading_day, trading_days
+
+logger = logging.getLogger(__name__)
+
+# 何日分（暦日）を取得するごとに銘柄別ストアへ書き出すか
+DEFAULT_CHUNK_DAYS = 20
+
+_run_lock = threading.Lock()
+_status_lock = threading.Lock()
+_status: dict[str, Any] = {"state": "idle"}
+
+
+def _market_ranges_path() -> Path:
+    """全銘柄の取得済み期間を記録するファイルのパスを返す。"""
+    cache_dir = Path(settings.cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir / "market_daily.ranges.json"
+
+
+def load_market_coverage() -> list[DateRange]:
+    """全銘柄の日足を取得済みの期間を読み込む。"""
+    path = _market_ranges_path()
+    if not path.exists():
+        return []
+    try:
+        return ranges_from_json(json.loads(path.read_text()))
+    except (ValueError, TypeError):
+        logger.warning("壊れたカバレッジファイルを検出・削除しました: %s", path)
+        path.unlink(missing_ok=True)
+        return []
+
+
+def _save_market_coverage(covered: list[DateRange]) -> None:
+    path = _market_ranges_path()
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(ranges_to_json(covered)))
+    tmp_path.replace(path)
+
+
+def _chunks(gaps: list[DateRange], chunk_days: int) -> Iterator[DateRange]:
+    """未取得の期間を chunk_days 日ごとに区切る。"""
+    for g_start, g_end in gaps:
+        cursor = g_start
+        while cursor <= g_end:
+            c_end = min(g_end, cursor + timedelta(days=chunk_days - 1))
+            yield cursor, c_end
+            cursor = c_end + timedelta(days=1)
+
+
+def _update_status(**values: Any) -> None:
+    with _status_lock:
+        _status.update(values)
+
+
+def get_prefetch_status() -> dict[str, Any]:
+    """先読みの進捗と、残りの取得に必要な上流の予算（レート制限の状態・所要時間の見込み）を返す。"""
+    with _status_lock:
+        status = dict(_status)
+    rate_limit = get_rate_limit_stats()
+    remaining = status.get("total_dates", 0) - status.get("done_dates", 0) if status["state"] == "running" else 0
+    status["remaining_dates"] = remaining
+    rate = rate_limit["rate_per_minute"]
+    status["estimated_remaining_seconds"] = round(
+        rate_limit["expected_wait_seconds"] + max(0, remaining - 1) * 60 / rate if rate > 0 and remaining else 0.0, 1
+    )
+    status["rate_limit"] = rate_limit
+    return status
+
+
+def prefetch_market(start: date, end: date, chunk_days: int = DEFAULT_CHUNK_DAYS) -> dict[str, Any]:
+    """[start, end] のうち未取得の営業日について全銘柄の日足を取得し、銘柄別ストアに振り分ける。
+
+    他の先読みが実行中なら何もせずに現在の状態を返す。
+    """
+    if not _run_lock.acquire(blocking=False):
+        return get_prefetch_status()
+    try:
+        end = min(end, latest_published_trading_day())
+        gaps = missing_ranges(load_market_coverage(), start, end)
+        chunks = list(_chunks(gaps, chunk_days))
+        total = sum(len(trading_days(c_start, c_end)) for c_start, c_end in chunks)
+        _update_status(
+            state="running",
+            from_date=start.isoformat(),
+            to_date=end.isoformat(),
+            total_dates=total,
+            done_dates=0,
+            current_date=None,
+            codes_updated=0,
+            started_at=datetime.now().isoformat(timespec="seconds"),
+            finished_at=None,
+            error=None,
+        )
+        logger.info("全銘柄の日足の先読みを開始します: %s - %s（%d営業日）", start, end, total)
+        done = 0
+        updated_codes: set[str] = set()
+        for c_start, c_end in chunks:
+            fetched: list[pd.DataFrame] = []
+            for day in trading_days(c_start, c_end):
+                _update_status(current_date=day.isoformat())
+                fetched.append(fetch_market_daily_bars(day))
+                done += 1
+                _update_status(done_dates=done)
+            non_empty = [df for df in fetched if not df.empty]
+            bars = pd.concat(non_empty, ignore_index=True) if non_empty else pd.DataFrame()
+            if not bars.empty:
+                updated_codes.update(store_market_bars(bars, c_start, c_end))
+            # 銘柄別ストアを書き終えてから市場全体のカバレッジを進める。日足が返らなかった末尾の日付は含めない
+            covered = cap_ranges([(c_start, c_end)], last_bar_date(bars))
+            _save_market_coverage(merge_ranges(load_market_coverage() + covered))
+            _update_status(codes_updated=len(updated_codes))
+            logger.info("先読みの進捗: %d/%d営業日（%s まで）", done, total, c_end)
+        _update_status(state="done", current_date=None, finished_at=datetime.now().isoformat(timespec="seconds"))
+    except Exception as exc:
+        logger.exception("全銘柄の日足の先読みに失敗しました")
+        _update_status(state="failed", error=str(exc), finished_at=datetime.now().isoformat(timespec="seconds"))
+    finally:
+        _run_lock.release()
+    return get_prefetch_status()
+
+
+def start_prefetch_in_background(start: date, end: date) -> bool:
+    """先読みをバックグラウンドスレッドで開始する。既に実行中ならFalseを返す。"""
+    if _run_lock.locked():
+        return False
+    threading.Thread(target=prefetch_market, args=(start, end), name="market-prefetch", daemon=True).start()
+    return True
+
+
+def resolve_range(days: int = 0, from_date: str = "", to_date: str = "") -> tuple[date, date]:
+    """CLI・APIの引数から先読みの期間を決める。from があれば優先し、なければ直近 days 日。"""
+    end = parse_yyyymmdd(to_date, latest_published_trading_day())
+    start = parse_yyyymmdd(from_date, end - timedelta(days=max(days, 1) - 1))
+    return start, end
@@ -0,0 +1,137 @@
+"""J-Quants APIへのリクエストを事前に間引くトークンバケット。
+
+状態はSQLiteに保存し、同じキャッシュディレクトリを使うuvicornワーカー間で共有する。
+トークンが足りないときは予約（トークンを負にする）してから待つので、待ち行列の順に
+リクエストが送られ、予約済みトークン数から待ち時間の見込みを出せる。
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+# プランごとのリクエスト上限（回/分）
+PLAN_RATES_PER_MINUTE: dict[str, float] = {
+    "free": 5,
+    "light": 60,
+    "standard": 120,
+    "premium": 500,
+}
+
+
+class RateLimitTimeoutError(Exception):
+    """待ち時間が上限を超えるため、リクエストを送らずに諦めたことを表す。"""
+
+    def __init__(self, expected_wait: float) -> None:
+        super().__init__(f"レート制限の待ち時間が上限を超えます（見込み {expected_wait:.1f} 秒）")
+        self.expected_wait = expected_wait
+
+
+class TokenBucket:
+    """SQLiteで状態を共有するトークンバケット。"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        rate_per_minute: float,
+        capacity: float = 1,
+        name: str = "jquants",
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.db_path = db_path
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = capacity
+        self.name = name
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+
+    def acquire(self, max_wait: float | None = None) -> float:
+        """トークンを1つ取得する。必要なら待ってから戻り、待った秒数を返す。
+
+        見込みの待ち時間がmax_waitを超える場合は予約せずに RateLimitTimeoutError を送出する。
+        """
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def reserve(self, max_wait: float | None = None) -> float:
+        """トークンを1つ予約し、送信してよくなるまでの秒数を返す。待機は呼び出し側が行う。
+
+        asyncioでは await asyncio.sleep() で待つために使う。
+        """
+        with self._transaction() as conn:
+            now = self._clock()
+            tokens = self._refill(conn, now)
+            wait = self._wait_for(tokens)
+            if max_wait is not None and wait > max_wait:
+                with self._lock:
+                    self.timeouts += 1
+                raise RateLimitTimeoutError(wait)
+            conn.execute("UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens - 1, now, self.name))
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_seconds += wait
+        return wait
+
+    def expected_wait(self) -> float:
+        """今トークンを要求した場合の待ち時間の見込み（秒）を返す。"""
+        with self._transaction() as conn:
+            return self._wait_for(self._refill(conn, self._clock()))
+
+    def stats(self) -> dict[str, Any]:
+        """バケットの状態と、このプロセスでの取得回数・待ち時間を返す。"""
+        with self._transaction() as conn:
+            tokens = self._refill(conn, self._clock())
+        with self._lock:
+            return {
+                "rate_per_minute": self.rate_per_second * 60,
+                "capacity": self.capacity,
+                "tokens": round(tokens, 3),
+                "queued": max(0, math.ceil(-tokens)),
+                "expected_wait_seconds": round(self._wait_for(tokens), 3),
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "total_wait_seconds": round(self.total_wait_seconds, 3),
+            }
+
+    def _wait_for(self, tokens: float) -> float:
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.rate_per_second
+
+    def _refill(self, conn: sqlite3.Connection, now: float) -> float:
+        row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)", (self.name, self.capacity, now)
+            )
+            return float(self.capacity)
+        tokens, updated_at = float(row[0]), float(row[1])
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate_per_second)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE でプロセス間の書き込みロックを取ったトランザクションを開く。"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
@@ -0,0 +1,145 @@
+"""同一キーの同時実行をまとめるシングルフライト。
+
+キャッシュミスが同時に起きたとき、最初の呼び出しだけが上流へ問い合わせ、
+同じキーで待っている呼び出しはその結果（または例外）を受け取る。
+"""
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+class _Call[T]:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight[T]:
+    """キーごとに実行中の呼び出しを1つに制限するスレッドセーフな仕組み。"""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call[T]] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> tuple[T, bool]:
+        """fnを実行して結果を返す。同じキーが実行中ならその完了を待って結果を共有する。
+
+        戻り値の2番目は、この呼び出しがfnを実際に実行した（リーダーだった）かどうか。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False  # type: ignore[return-value]
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+    def stats(self) -> dict[str, Any]:
+        """実行数・合流数などの統計情報を返す。"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values()),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+            }
+
+    def reset_stats(self) -> None:
+        """統計カウンタをリセットする。"""
+        with self._lock:
+            self.executions = 0
+            self.coalesced = 0
+
+
+class _LeaderCancelledError(Exception):
+    """AsyncSingleFlight のリーダーだけがキャンセルされたことを待っている呼び出しに伝える。"""
+
+
+class AsyncSingleFlight[T]:
+    """asyncio版のシングルフライト。同じイベントループ内のコルーチン間で実行をまとめる。"""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future[T]] = {}
+        self._waiters: dict[str, int] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """fnを実行して結果を返す。同じキーが実行中ならその完了を待って結果を共有する。
+
+        戻り値の2番目は、この呼び出しがfnを実際に実行した（リーダーだった）かどうか。
+        リーダーがキャンセルされたときは、待っていた呼び出しのうち最初に再開したものが新しいリーダーになって
+        実行し直し、残りはその結果を待つ。
+        """
+        while (future := self._calls.get(key)) is not None:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            try:
+                # 待っている側がキャンセルされてもリーダーの処理は止めない
+                return await asyncio.shield(future), False
+            except _LeaderCancelledError:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self._waiters[key] = 0
+        self.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # future.cancel() だと、キャンセルされていない待ち側にも CancelledError が届く
+            future.set_exception(_LeaderCancelledError())
+            future.exception()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # 待っている呼び出しがなくても「例外が取り出されなかった」警告を出さない
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            del self._calls[key]
+            del self._waiters[key]
+
+    def stats(self) -> dict[str, Any]:
+        """実行数・合流数などの統計情報を返す。"""
+        return {
+            "in_flight": len(self._calls),
+            "waiting": sum(self._waiters.values()),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+    def reset_stats(self) -> None:
+        """統計カウンタをリセットする。"""
+        self.executions = 0
+        self.coalesced = 0
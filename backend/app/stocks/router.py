@@ -1,40 +1,102 @@
 import logging
 from typing import Any
 
-from fastapi import APIRouter, Query
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
-from app.stocks.service import get_stock_daily, get_stock_financials, search_stocks
+from app.columnar import FormatQuery, columnar_response
+from app.http_cache import (
+    check_daily_not_modified,
+    check_not_modified,
+    daily_version,
+    generation_version,
+    set_cache_headers,
+)
+from app.jquants_client import daily_data_version
+from app.stocks.service import (
+    get_stock_daily_frame,
+    get_stock_financials,
+    get_stock_info,
+    search_stocks,
+    stock_daily_records,
+)
+from app.utils import TOTAL_COUNT_HEADER
 
 logger = logging.getLogger(__name__)
 
+# データが前回から変わっていなければ、ルートの依存関数がエンドポイントを実行せずに304を返す。
+# データの世代の求め方がルートごとに違うので、依存関数もルートごとに付ける
 router = APIRouter(prefix="/stocks", tags=["stocks"])
 
 
-@router.get("/master")
-def list_stocks(q: str = Query("", description="銘柄コードまたは名称で検索")) -> list[dict[str, Any]]:
-    """銘柄マスタを検索する。"""
-    return search_stocks(q)
+@router.get("/master", dependencies=[Depends(check_not_modified)])
+async def list_stocks(
+    request: Request,
+    response: Response,
+    q: str = Query("", description="銘柄コードまたは名称で検索"),
+    limit: int = Query(50, ge=1, le=5000, description="返す件数の上限"),
+    offset: int = Query(0, ge=0, description="先頭から読み飛ばす件数"),
+) -> list[dict[str, Any]]:
+    """銘柄マスタを検索する。一致順に並べ、総件数は X-Total-Count ヘッダーで返す。"""
+    result, total = await search_stocks(q, limit=limit, offset=offset)
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
+    if result:
+        set_cache_headers(request, response, generation_version())
+    return result
+
+
+@router.get("/{code}", dependencies=[Depends(check_not_modified)])
+async def stock_info(code: str, request: Request, response: Response) -> dict[str, Any]:
+    """銘柄コードに一致する銘柄情報を返す。マスタにないコードは404、マスタを取得できなければ503。
+
+    手元に古いマスタのスナップショットがあれば、取得に失敗してもそれを使う（get_stock_master_async）。
+    """
+    try:
+        info = await get_stock_info(code)
+    except Exception:
+        logger.exception("J-Quants API error for stock master: code=%s", code)
+        raise HTTPException(status_code=503, detail="銘柄マスタを取得できません") from None
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"銘柄コード {code} は見つかりません")
+    set_cache_headers(request, response, generation_version())
+    return info
 
 
-@router.get("/{code}/daily")
-def daily_quotes(
+@router.get("/{code}/daily", response_model=None, dependencies=[Depends(check_daily_not_modified)])
+async def daily_quotes(
     code: str,
+    request: Request,
+    response: Response,
     from_date: str = Query("", alias="from", description="開始日 (YYYYMMDD)"),
     to_date: str = Query("", alias="to", description="終了日 (YYYYMMDD)"),
-) -> list[dict[str, Any]]:
-    """株価日足データを取得する。"""
+    response_format: FormatQuery = "records",
+) -> list[dict[str, Any]] | Response:
+    """株価日足データを取得する。format=columns なら {列名: 値の配列} で返す。"""
+    columnar = response_format == "columns"
     try:
-        return get_stock_daily(code, from_date, to_date)
+        df = await get_stock_daily_frame(code, from_date, to_date)
     except Exception:
         logger.exception("J-Quants API error for code=%s", code)
-        return []
+        return columnar_response(pd.DataFrame()) if columnar else []
+    if df.empty:
+        return columnar_response(df) if columnar else []
+    version = daily_version(daily_data_version(df))
+    if columnar:
+        result = columnar_response(df)
+        set_cache_headers(request, result, version)
+        return result
+    set_cache_headers(request, response, version)
+    return stock_daily_records(df)
 
 
-@router.get("/{code}/financials")
-def financials(code: str) -> list[dict[str, Any]]:
+@router.get("/{code}/financials", dependencies=[Depends(check_not_modified)])
+async def financials(code: str, request: Request, response: Response) -> list[dict[str, Any]]:
     """決算サマリーを取得する。"""
     try:
-        return get_stock_financials(code)
+        result = await get_stock_financials(code)
     except Exception:
         logger.exception("J-Quants API error for code=%s", code)
         return []
+    if result:
+        set_cache_headers(request, response, generation_version())
+    return result
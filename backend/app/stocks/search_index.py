@@ -0,0 +1,92 @@
+"""銘柄マスタの検索インデックス。
+
+マスタの更新ごとに1回だけ構築し、検索のたびにDataFrameを走査しない。
+銘柄コードはソート済み配列の二分探索で前方一致を引き、銘柄名（和名・英名）は
+1文字・2文字のn-gram転置インデックスで候補を絞ってから部分一致を確かめる。
+"""
+
+import unicodedata
+from bisect import bisect_left
+from typing import Any
+
+# カタカナ→ひらがなの変換表（ァ..ヶ → ぁ..ゖ）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+# 和名と英名をつなぐ区切り文字（正規化後のクエリには現れない）
+_SEPARATOR = "\x00"
+
+
+def normalize(text: str) -> str:
+    """検索用に正規化する。全角/半角（NFKC）、大文字/小文字、カタカナ/ひらがなの違いを吸収する。"""
+    return unicodedata.normalize("NFKC", text).casefold().translate(_KATAKANA_TO_HIRAGANA)
+
+
+def _ngrams(text: str) -> set[str]:
+    return {text[i : i + n] for n in (1, 2) for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """銘柄マスタのレコード（code / company_name / company_name_english を含む辞書）の検索インデックス。"""
+
+    def __init__(self, records: list[dict[str, Any]]) -> None:
+        self.records = sorted(records, key=lambda r: str(r.get("code", "")))
+        self._codes = [normalize(str(r.get("code", ""))) for r in self.records]
+        # 銘柄コード→レコード。5桁コード末尾の0を除いた4桁コードでも引ける
+        self._by_code: dict[str, dict[str, Any]] = {}
+        for r in self.records:
+            code = str(r.get("code", ""))
+            self._by_code[code] = r
+            if len(code) == 5 and code.endswith("0"):
+                self._by_code.setdefault(code[:4], r)
+        # 和名と英名を区切り文字でつないだ文字列。部分一致は1回の in で確かめる
+        self._haystacks: list[str] = []
+        self._postings: dict[str, set[int]] = {}
+        self._name_prefixes: dict[str, set[int]] = {}
+        for i, r in enumerate(self.records):
+            names = [normalize(str(r.get(key, ""))) for key in ("company_name", "company_name_english")]
+            self._haystacks.append(_SEPARATOR.join(names))
+            for gram in set().union(*(_ngrams(name) for name in names)):
+                self._postings.setdefault(gram, set()).add(i)
+            for prefix in {name[:n] for name in names for n in (1, 2) if len(name) >= n}:
+                self._name_prefixes.setdefault(prefix, set()).add(i)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, code: str) -> dict[str, Any] | None:
+        """銘柄コードに一致するレコードを返す。なければNone。"""
+        return self._by_code.get(code.strip().upper())
+
+    def _name_matches(self, query: str) -> tuple[set[int], set[int]]:
+        """銘柄名が query を含むレコード番号と、そのうち前方一致するものを返す。"""
+        grams = {query} if len(query) == 1 else {query[i : i + 2] for i in range(len(query) - 1)}
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return set(), set()
+        matches = postings[0].intersection(*postings[1:])
+        starts = matches & self._name_prefixes.get(query[:2], set())
+        if len(query) > 2:
+            # 3文字以上は2-gramがすべて含まれても連続しているとは限らないので確かめる
+            matches = {i for i in matches if query in self._haystacks[i]}
+            head = _SEPARATOR + query
+            starts = {i for i in starts & matches if self._haystacks[i].startswith(query) or head in self._haystacks[i]}
+        return matches, starts
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> tuple[list[dict[str, Any]], int]:
+        """一致順（コード完全一致→前方一致→銘柄名の部分一致、同順位はコード順）に並べた結果と総件数を返す。
+
+        4桁コードは末尾0の5桁コードとの完全一致として扱う。空のクエリは全件をコード順に返す。
+        """
+        q = normalize(query.strip())
+        if not q:
+            return self.records[offset : offset + limit], len(self.records)
+
+        lo = bisect_left(self._codes, q)
+        hi = bisect_left(self._codes, q + "\U0010ffff")
+        exact = [i for i in range(lo, hi) if self._codes[i] in (q, q + "0")]
+        code_matches = set(range(lo, hi))
+        name_matches, name_starts = self._name_matches(q)
+        prefix = sorted((code_matches | name_starts).difference(exact))
+        substring = sorted(name_matches - name_starts - code_matches)
+        hits = exact + prefix + substring
+        return [self.records[i] for i in hits[offset : offset + limit]], len(hits)
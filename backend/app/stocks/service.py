@@ -1,57 +1,100 @@
+import asyncio
 from typing import Any, cast
 
-from app.jquants_client import get_daily_quotes, get_financial_statements, get_stock_master
+import pandas as pd
+
+from app.jquants_client import (
+    get_daily_quotes_async,
+    get_financial_statements_async,
+    get_stock_master_async,
+    master_cache_version,
+)
+from app.stocks.search_index import SearchIndex
 from app.utils import nan_to_none, normalize_date
 
+# 銘柄マスタのv2 APIカラム名マッピング
+MASTER_COLUMNS = {
+    "Code": "code",
+    "CoName": "company_name",
+    "CoNameEn": "company_name_english",
+    "S17": "sector_17_code",
+    "S17Nm": "sector_17_code_name",
+    "S33": "sector_33_code",
+    "S33Nm": "sector_33_code_name",
+    "Mkt": "market_code",
+    "MktNm": "market_code_name",
+}
+
+# 株価日足のv2 APIカラム名マッピング
+DAILY_COLUMNS = {
+    "Date": "date",
+    "Code": "code",
+    "O": "open",
+    "H": "high",
+    "L": "low",
+    "C": "close",
+    "Vo": "volume",
+    "Va": "turnover_value",
+    "AdjFactor": "adjustment_factor",
+    "AdjO": "adjustment_open",
+    "AdjH": "adjustment_high",
+    "AdjL": "adjustment_low",
+    "AdjC": "adjustment_close",
+    "AdjVo": "adjustment_volume",
+}
+
+# 今の世代の銘柄マスタから構築した検索インデックス（マスタのキャッシュの世代, インデックス）
+_search_index: tuple[str, SearchIndex] | None = None
+
 
-def search_stocks(query: str = "") -> list[dict[str, Any]]:
-    """銘柄マスタを検索する。コードまたは名称で部分一致検索。"""
-    df = get_stock_master()
-    if query:
-        mask = df["Code"].astype(str).str.contains(query, case=False, na=False) | df["CoName"].str.contains(
-            query, case=False, na=False
-        )
-        df = df[mask]
-    # v2 APIカラム名マッピング
-    columns = {
-        "Code": "code",
-        "CoName": "company_name",
-        "CoNameEn": "company_name_english",
-        "S17": "sector_17_code",
-        "S17Nm": "sector_17_code_name",
-        "S33": "sector_33_code",
-        "S33Nm": "sector_33_code_name",
-        "Mkt": "market_code",
-        "MktNm": "market_code_name",
-    }
-    available_cols = {k: v for k, v in columns.items() if k in df.columns}
+def _master_records(df: pd.DataFrame) -> list[dict[str, Any]]:
+    """銘柄マスタをAPIレスポンスのレコードにする。"""
+    available_cols = {k: v for k, v in MASTER_COLUMNS.items() if k in df.columns}
     df = df[list(available_cols.keys())].rename(columns=available_cols)
     # 銘柄マスタは文字列フィールドのみなのでfillna("")で統一
     return cast(list[dict[str, Any]], df.fillna("").to_dict(orient="records"))
 
 
-def get_stock_daily(code: str, from_date: str = "", to_date: str = "") -> list[dict[str, Any]]:
+async def _get_search_index() -> SearchIndex:
+    """検索インデックスを返す。マスタの世代が変わったときだけ作り直す。"""
+    global _search_index
+    version = master_cache_version()
+    if _search_index is not None and _search_index[0] == version:
+        return _search_index[1]
+    df = await get_stock_master_async()
+    index = await asyncio.to_thread(lambda: SearchIndex(_master_records(df)))
+    # 古いスナップショットから作ったものは再取得後に作り直すため保持しない
+    if not df.attrs.get("stale") and len(index):
+        _search_index = (version, index)
+    return index
+
+
+async def search_stocks(query: str = "", limit: int = 50, offset: int = 0) -> tuple[list[dict[str, Any]], int]:
+    """銘柄マスタをコードまたは名称で検索し、一致順に limit 件と総件数を返す。"""
+    index = await _get_search_index()
+    return index.search(query, limit=limit, offset=offset)
+
+
+async def get_stock_info(code: str) -> dict[str, Any] | None:
+    """銘柄コードに一致する銘柄マスタのレコードを返す。なければNone。"""
+    index = await _get_search_index()
+    return index.get(code)
+
+
+async def get_stock_daily_frame(code: str, from_date: str = "", to_date: str = "") -> pd.DataFrame:
+    """株価日足データをAPIレスポンスの列名にしたDataFrameで返す。"""
+    df = await get_daily_quotes_async(code, from_date, to_date)
+    available_cols = {k: v for k, v in DAILY_COLUMNS.items() if k in df.columns}
+    return df[list(available_cols.keys())].rename(columns=available_cols)
+
+
+async def get_stock_daily(code: str, from_date: str = "", to_date: str = "") -> list[dict[str, Any]]:
     """株価日足データを取得する。"""
-    df = get_daily_quotes(code, from_date, to_date)
-    # v2 APIカラム名マッピング
-    columns = {
-        "Date": "date",
-        "Code": "code",
-        "O": "open",
-        "H": "high",
-        "L": "low",
-        "C": "close",
-        "Vo": "volume",
-        "Va": "turnover_value",
-        "AdjFactor": "adjustment_factor",
-        "AdjO": "adjustment_open",
-        "AdjH": "adjustment_high",
-        "AdjL": "adjustment_low",
-        "AdjC": "adjustment_close",
-        "AdjVo": "adjustment_volume",
-    }
-    available_cols = {k: v for k, v in columns.items() if k in df.columns}
-    df = df[list(available_cols.keys())].rename(columns=available_cols)
+    return stock_daily_records(await get_stock_daily_frame(code, from_date, to_date))
+
+
+def stock_daily_records(df: pd.DataFrame) -> list[dict[str, Any]]:
+    """get_stock_daily_frame の結果をAPIレスポンスのレコードにする。"""
     # 日付形式を "YYYY-MM-DD" に統一する
     if "date" in df.columns:
         df["date"] = df["date"].map(normalize_date)
@@ -60,9 +103,12 @@ def get_stock_daily(code: str, from_date: str = "", to_date: str = "") -> list[d
     return nan_to_none(records)
 
 
-def get_stock_financials(code: str) -> list[dict[str, Any]]:
+async def get_stock_financials(code: str) -> list[dict[str, Any]]:
     """決算サマリーを取得する。"""
-    df = get_financial_statements(code)
+    df = await get_financial_statements_async(code)
+    # 開示日などの日付列は "YYYY-MM-DD" 文字列で返す（欠損はNone）
+    for col in df.select_dtypes(include="datetime").columns:
+        df[col] = df[col].map(lambda v: None if pd.isna(v) else normalize_date(v))
     # NaN→None変換（JSONではnullとして返す）
     records = cast(list[dict[str, Any]], df.to_dict(orient="records"))
     return nan_to_none(records)
@@ -1,20 +1,34 @@
 """共通ユーティリティ関数。"""
 
 import math
+from datetime import date
 from typing import Any
 
+# 再取得待ちの古いスナップショットを返したときに付けるレスポンスヘッダー
+STALE_HEADER = "X-Data-Stale"
+# ページングしたときの総件数を返すレスポンスヘッダー
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
 
 def normalize_date(value: object) -> str:
     """日付文字列を "YYYY-MM-DD" 形式に統一する。
 
-    "2024-01-04T00:00:00" のようなISO形式や "2024-01-04" をすべて "YYYY-MM-DD" に変換する。
+    "2024-01-04T00:00:00" のようなISO形式や "2024-01-04"、型付きキャッシュから読んだ
+    Timestamp をすべて "YYYY-MM-DD" に変換する。
     """
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
     s = str(value)
     if "T" in s:
         return s.split("T")[0]
     return s
 
 
+def parse_codes(codes: str) -> list[str]:
+    """カンマ区切りの銘柄コードをリストにする。空の要素と重複は除き、順序は保つ。"""
+    return list(dict.fromkeys(code.strip() for code in codes.split(",") if code.strip()))
+
+
 def nan_to_none(records: list[dict[str, Any]]) -> list[dict[str, Any]]:
     """レコード内のNaN値をNoneに変換する。JSONレスポンスでnullとして返すため。"""
     for row in records:
@@ -0,0 +1,64 @@
+"""テクニカル指標の計算時間を ta ライブラリと比較するベンチマーク。
+
+cd backend && poetry run python -m benchmarks.technical
+
+手元の計測（Python 3.12、ベストオブ5）では、エンジンは ta に比べて 250行で約3倍、5000行で約2倍、
+20000行で約1.4倍速い。行数が増えると差が縮むのは、ta（pandas の rolling / ewm）の計算本体がCで
+書かれていて、固定の呼び出しコストの差が効かなくなるため。
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+import ta
+
+from app.analysis.technical import compute_technical_indicators
+
+
+def compute_with_ta(df: pd.DataFrame) -> pd.DataFrame:
+    """置き換える前の ta による実装。"""
+    close = df["close"].astype(float)
+    df["sma_5"] = ta.trend.sma_indicator(close, window=5)
+    df["sma_25"] = ta.trend.sma_indicator(close, window=25)
+    df["sma_75"] = ta.trend.sma_indicator(close, window=75)
+    df["rsi_14"] = ta.momentum.rsi(close, window=14)
+    macd = ta.trend.MACD(close, window_slow=26, window_fast=12, window_sign=9)
+    df["macd"] = macd.macd()
+    df["macd_signal"] = macd.macd_signal()
+    df["macd_histogram"] = macd.macd_diff()
+    bb = ta.volatility.BollingerBands(close, window=20, window_dev=2)
+    df["bb_upper"] = bb.bollinger_hband()
+    df["bb_middle"] = bb.bollinger_mavg()
+    df["bb_lower"] = bb.bollinger_lband()
+    return df
+
+
+def _prices(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({"close": 1000.0 * np.cumprod(1 + rng.normal(0.0005, 0.02, n))})
+
+
+def _best_ms(fn: object, df: pd.DataFrame, repeat: int) -> float:
+    timer = timeit.Timer(lambda: fn(df.copy()))  # type: ignore[operator]
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[250, 1250, 5000, 20000], help="系列の長さ（営業日数）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'ta (ms)':>10} {'numpy (ms)':>11} {'speedup':>8}")
+    for n in args.rows:
+        df = _prices(n)
+        before = _best_ms(compute_with_ta, df, args.repeat)
+        after = _best_ms(compute_technical_indicators, df, args.repeat)
+        print(f"{n:>8} {before:>10.3f} {after:>11.3f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
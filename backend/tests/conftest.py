@@ -10,3 +10,29 @@ def _temp_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setattr("app.config.settings.cache_dir", str(tmp_path / "data"))
     monkeypatch.setattr("app.config.settings.quants_api_v2_api_key", "test_token")
     os.makedirs(tmp_path / "data", exist_ok=True)
+
+
+@pytest.fixture(autouse=True)
+def _clear_memory_cache() -> None:
+    """テスト間でインメモリキャッシュの内容、負のキャッシュ、検索インデックス、シングルフライトの統計、ブレーカーの状態を共有しないようにする。"""
+    import app.analysis.service
+    import app.jquants_client
+    import app.stocks.service
+    from app.jquants_client import _async_flight, _breaker, _flight, _memory_cache, _negative_cache
+
+    _memory_cache.clear()
+    _negative_cache.clear()
+    app.analysis.service._indicator_cache.clear()
+    app.jquants_client._master_index = None
+    app.stocks.service._search_index = None
+    _flight.reset_stats()
+    _async_flight.reset_stats()
+    _breaker.reset()
+
+
+@pytest.fixture(autouse=True)
+def _reset_market_calendar() -> None:
+    """カレンダーファイルの設定を変えるテストのために読み込み結果のキャッシュを捨てる。"""
+    from app.market_calendar import _load_holidays
+
+    _load_holidays.cache_clear()
@@ -0,0 +1,138 @@
+"""テクニカル指標の取得計画と算出結果のキャッシュのテスト。"""
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pandas as pd
+
+from app.analysis import service
+from app.analysis.indicators import parse_indicators
+from app.analysis.service import _plan_market_fetch, get_technical_batch, get_technical_frame, technical_records
+
+
+def _quotes(version: str | None, n: int = 40) -> pd.DataFrame:
+    dates = pd.date_range("2024-01-01", periods=n, freq="B")
+    df = pd.DataFrame({"Date": dates.strftime("%Y-%m-%d"), "AdjC": [1000.0 + i for i in range(n)]})
+    if version is not None:
+        df.attrs["version"] = version
+    return df
+
+
+@contextmanager
+def _computations() -> Iterator[Callable[[], int]]:
+    """指標を計算した回数（既定の指標は履歴、それ以外は build_technical_frame の呼び出し）を数える。"""
+    with (
+        patch.object(service, "technical_history", wraps=service.technical_history) as history,
+        patch.object(service, "build_technical_frame", wraps=service.build_technical_frame) as build,
+    ):
+        yield lambda: history.call_count + build.call_count
+
+
+@patch("app.analysis.service.latest_published_trading_day", return_value=date(2024, 1, 12))
+@patch("app.analysis.service.load_market_coverage", return_value=[])
+@patch("app.analysis.service.pending_daily_fetches", return_value=1)
+class TestPlanMarketFetch:
+    def test_many_codes_over_few_days_use_market_fetch(self, *_: object) -> None:
+        codes = [f"{i:04d}0" for i in range(30)]
+        assert _plan_market_fetch(codes, "20240108", "20240112") == (date(2024, 1, 8), date(2024, 1, 12))
+
+    def test_few_codes_are_fetched_per_code(self, *_: object) -> None:
+        assert _plan_market_fetch(["72030", "67580"], "20240108", "20240112") is None
+
+    def test_open_start_is_fetched_per_code(self, *_: object) -> None:
+        codes = [f"{i:04d}0" for i in range(30)]
+        assert _plan_market_fetch(codes, "", "20240112") is None
+
+    def test_nothing_missing(self, mock_pending: object, *_: object) -> None:
+        with patch("app.analysis.service.pending_daily_fetches", return_value=0):
+            assert _plan_market_fetch(["72030"] * 30, "20240108", "20240112") is None
+
+    def test_long_range_is_fetched_per_code(self, *_: object) -> None:
+        """リクエストの中では上限を超える営業日数の全銘柄取得をしない。1/8は休日なので営業日は4日。"""
+        codes = [f"{i:04d}0" for i in range(3000)]
+        with patch("app.analysis.service.settings.market_fetch_max_days_per_request", 3):
+            assert _plan_market_fetch(codes, "20240108", "20240112") is None
+        with patch("app.analysis.service.settings.market_fetch_max_days_per_request", 4):
+            assert _plan_market_fetch(codes, "20240108", "20240112") == (date(2024, 1, 8), date(2024, 1, 12))
+
+    def test_long_rate_limit_wait_is_fetched_per_code(self, *_: object) -> None:
+        """全銘柄取得がレート制限の待ちの上限を超えそうなら、リクエストの中では行わない。"""
+        codes = [f"{i:04d}0" for i in range(30)]
+        stats = {"rate_per_minute": 5.0, "expected_wait_seconds": 0.0}
+        with patch("app.analysis.service.get_rate_limit_stats", return_value=stats):
+            assert _plan_market_fetch(codes, "20240108", "20240112") == (date(2024, 1, 8), date(2024, 1, 12))
+        with patch("app.analysis.service.get_rate_limit_stats", return_value={**stats, "expected_wait_seconds": 90.0}):
+            assert _plan_market_fetch(codes, "20240108", "20240112") is None
+
+    def test_covered_market_days_are_not_counted(self, _pending: object, mock_coverage: object, *_: object) -> None:
+        codes = [f"{i:04d}0" for i in range(3)]
+        with patch("app.analysis.service.load_market_coverage", return_value=[(date(2024, 1, 1), date(2024, 1, 10))]):
+            assert _plan_market_fetch(codes, "20240108", "20240112") == (date(2024, 1, 8), date(2024, 1, 12))
+
+
+class TestGetTechnicalBatch:
+    @patch("app.analysis.service.get_daily_quotes_async", new_callable=AsyncMock)
+    @patch("app.analysis.service.prefetch_market")
+    @patch("app.analysis.service._plan_market_fetch", return_value=(date(2024, 1, 8), date(2024, 1, 12)))
+    async def test_market_fetch_runs_before_per_code_reads(
+        self, _plan: object, mock_prefetch: AsyncMock, mock_daily: AsyncMock
+    ) -> None:
+        mock_daily.return_value = pd.DataFrame({"Date": ["2024-01-08"], "AdjC": [100.0]})
+
+        results, errors = await get_technical_batch(["72030", "67580"], "20240108", "20240112")
+        mock_prefetch.assert_called_once_with(date(2024, 1, 8), date(2024, 1, 12))
+        assert set(results) == {"72030", "67580"}
+        assert errors == {}
+
+
+class TestIndicatorCache:
+    def test_same_data_version_is_computed_once(self) -> None:
+        with _computations() as compute:
+            first = get_technical_frame("72030", _quotes("v1"))
+            second = get_technical_frame("72030", _quotes("v1"))
+        assert compute() == 1
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_key_includes_version_period_and_indicators(self) -> None:
+        with _computations() as compute:
+            get_technical_frame("72030", _quotes("v1"))
+            # ストアが更新された・期間が違う・指標が違う・銘柄が違う場合は計算し直す
+            get_technical_frame("72030", _quotes("v2"))
+            get_technical_frame("72030", _quotes("v2", n=30))
+            get_technical_frame("72030", _quotes("v2"), parse_indicators("sma:5"))
+            get_technical_frame("67580", _quotes("v2"))
+        assert compute() == 5
+
+    def test_unversioned_quotes_are_not_cached(self) -> None:
+        with _computations() as compute:
+            get_technical_frame("72030", _quotes(None))
+            get_technical_frame("72030", _quotes(None))
+        assert compute() == 2
+        assert service.get_indicator_cache_stats()["entries"] == 0
+
+    def test_cached_frame_is_not_shared(self) -> None:
+        """返したDataFrameを書き換えてもキャッシュは汚れない。"""
+        get_technical_frame("72030", _quotes("v1"))["close"] = 0.0
+        assert get_technical_frame("72030", _quotes("v1"))["close"].iloc[0] == 1000.0
+
+    @patch("app.analysis.service._plan_market_fetch", return_value=None)
+    @patch("app.analysis.service.get_daily_quotes_async", new_callable=AsyncMock)
+    async def test_batch_shares_the_cache(self, mock_daily: AsyncMock, _plan: object) -> None:
+        mock_daily.side_effect = lambda code, *_: _quotes("v1" if code == "72030" else "v9")
+        cached = get_technical_frame("72030", _quotes("v1"))
+
+        with patch.object(
+            service, "compute_technical_indicators_batch", wraps=service.compute_technical_indicators_batch
+        ) as compute:
+            results, _ = await get_technical_batch(["72030", "67580"])
+            assert compute.call_count == 1
+            # キャッシュ済みの銘柄は計算しない
+            assert set(compute.call_args.args[0]["code"]) == {"67580"}
+
+            again, _ = await get_technical_batch(["72030", "67580"])
+            assert compute.call_count == 1
+
+        assert results["72030"] == technical_records(cached)
+        assert again == results
@@ -4,9 +4,10 @@
 J-Quants APIへの実際のリクエストは行わず、すべてモックを使用する。
 """
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 import pandas as pd
+import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -25,6 +26,8 @@ class TestHealthEndpoint:
         assert data["status"] == "ok"
         assert "api_key_configured" in data
         assert "cache" in data
+        assert "memory" in data["cache"]
+        assert "expected_wait_seconds" in data["rate_limit"]
 
     def test_health_content_type_is_json(self) -> None:
         """ヘルスチェックのContent-TypeがJSONである。"""
@@ -35,8 +38,8 @@ class TestHealthEndpoint:
 class TestStocksMasterEndpoint:
     """GET /api/stocks/master のテスト。"""
 
-    @patch("app.stocks.service.get_stock_master")
-    def test_search_stocks_with_query(self, mock_get_master: MagicMock) -> None:
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_search_stocks_with_query(self, mock_get_master: AsyncMock) -> None:
         """クエリパラメータで銘柄検索ができる。"""
         mock_get_master.return_value = pd.DataFrame(
             {
@@ -62,8 +65,8 @@ class TestStocksMasterEndpoint:
         assert data[0]["code"] == "7203"
         assert data[0]["company_name"] == "トヨタ自動車"
 
-    @patch("app.stocks.service.get_stock_master")
-    def test_search_stocks_empty_query(self, mock_get_master: MagicMock) -> None:
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_search_stocks_empty_query(self, mock_get_master: AsyncMock) -> None:
         """空のクエリでも正常にレスポンスが返る。"""
         mock_get_master.return_value = pd.DataFrame(
             {
@@ -85,8 +88,8 @@ class TestStocksMasterEndpoint:
         assert isinstance(data, list)
         assert len(data) == 1
 
-    @patch("app.stocks.service.get_stock_master")
-    def test_search_stocks_no_results(self, mock_get_master: MagicMock) -> None:
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_search_stocks_no_results(self, mock_get_master: AsyncMock) -> None:
         """検索結果が0件の場合、空配列を返す。"""
         mock_get_master.return_value = pd.DataFrame(
             {
@@ -108,11 +111,158 @@ class TestStocksMasterEndpoint:
         assert data == []
 
 
+class TestStocksMasterPaging:
+    """GET /api/stocks/master の並び順・ページングのテスト。"""
+
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_ranked_and_paginated(self, mock_get_master: AsyncMock) -> None:
+        mock_get_master.return_value = pd.DataFrame(
+            {
+                "Code": ["99840", "94340", "67580"],
+                "CoName": ["ソフトバンクグループ", "ソフトバンク", "ソニーグループ"],
+                "CoNameEn": ["SoftBank Group Corp.", "SoftBank Corp.", "SONY GROUP CORPORATION"],
+            }
+        )
+
+        response = client.get("/api/stocks/master", params={"q": "ソ", "limit": 2, "offset": 1})
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "3"
+        assert [r["code"] for r in response.json()] == ["94340", "99840"]
+
+        # インデックスはマスタの世代ごとに1回だけ構築する
+        client.get("/api/stocks/master", params={"q": "ソニー"})
+        assert mock_get_master.await_count == 1
+
+
+class TestStockInfoEndpoint:
+    """GET /api/stocks/{code} のテスト。"""
+
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_returns_single_record(self, mock_get_master: AsyncMock) -> None:
+        mock_get_master.return_value = pd.DataFrame(
+            {"Code": ["72030", "72040"], "CoName": ["トヨタ自動車", "ダイハツ工業"], "CoNameEn": ["TOYOTA", "DAIHATSU"]}
+        )
+
+        response = client.get("/api/stocks/7203")
+        assert response.status_code == 200
+        assert response.json() == {
+            "code": "72030",
+            "company_name": "トヨタ自動車",
+            "company_name_english": "TOYOTA",
+        }
+
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_unknown_code_returns_404(self, mock_get_master: AsyncMock) -> None:
+        mock_get_master.return_value = pd.DataFrame({"Code": ["72030"], "CoName": ["トヨタ自動車"]})
+
+        response = client.get("/api/stocks/0000")
+        assert response.status_code == 404
+
+    @patch("app.stocks.service.get_stock_master_async", new_callable=AsyncMock)
+    def test_api_error_returns_503(self, mock_get_master: AsyncMock) -> None:
+        mock_get_master.side_effect = Exception("J-Quants API接続エラー")
+
+        response = client.get("/api/stocks/7203")
+        assert response.status_code == 503
+        assert response.json()["detail"]
+        assert "ETag" not in response.headers
+
+
+class TestDailyQuotesEndpoint:
+    """GET /api/stocks/{code}/daily のテスト"""
+
+    @patch("app.stocks.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_records_format_is_default(self, mock_get_daily: AsyncMock) -> None:
+        mock_get_daily.return_value = pd.DataFrame(
+            {"Date": pd.to_datetime(["2024-01-04", "2024-01-05"]), "Code": ["72030"] * 2, "C": [100.0, None]}
+        )
+
+        response = client.get("/api/stocks/72030/daily")
+        assert response.status_code == 200
+        assert response.json() == [
+            {"date": "2024-01-04", "code": "72030", "close": 100.0},
+            {"date": "2024-01-05", "code": "72030", "close": None},
+        ]
+
+    @patch("app.stocks.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_columns_format(self, mock_get_daily: AsyncMock) -> None:
+        """format=columns では列ごとの配列で返し、NaNはnullになる。"""
+        mock_get_daily.return_value = pd.DataFrame(
+            {"Date": pd.to_datetime(["2024-01-04", "2024-01-05"]), "Code": ["72030"] * 2, "C": [100.0, None]}
+        )
+
+        response = client.get("/api/stocks/72030/daily", params={"format": "columns"})
+        assert response.status_code == 200
+        assert response.json() == {
+            "date": ["2024-01-04", "2024-01-05"],
+            "code": ["72030", "72030"],
+            "close": [100.0, None],
+        }
+
+    def test_unknown_format_is_rejected(self) -> None:
+        response = client.get("/api/stocks/72030/daily", params={"format": "csv"})
+        assert response.status_code == 422
+
+
+class TestTechnicalBatchEndpoint:
+    """GET /api/analysis/technical のテスト"""
+
+    @staticmethod
+    def _quotes(n: int, base: float) -> pd.DataFrame:
+        dates = pd.date_range("2024-01-01", periods=n, freq="B")
+        return pd.DataFrame({"Date": dates.strftime("%Y-%m-%d"), "AdjC": [base + i for i in range(n)]})
+
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    @patch("app.analysis.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_results_match_single_endpoint(self, mock_batch_daily: AsyncMock, mock_daily: AsyncMock) -> None:
+        quotes = {"72030": self._quotes(30, 1000.0), "67580": self._quotes(10, 500.0)}
+        mock_batch_daily.side_effect = lambda code, *_: quotes[code]
+        mock_daily.side_effect = lambda code, *_: quotes[code]
+
+        response = client.get("/api/analysis/technical", params={"codes": "72030,67580"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["errors"] == {}
+        for code in quotes:
+            assert body["results"][code] == client.get(f"/api/analysis/{code}/technical").json()
+
+    @patch("app.analysis.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_failed_code_is_reported(self, mock_batch_daily: AsyncMock) -> None:
+        """一部の銘柄が失敗してもバッチ全体は成功し、失敗した銘柄を errors で返す。"""
+
+        async def quotes(code: str, *_: str) -> pd.DataFrame:
+            if code == "67580":
+                raise Exception("J-Quants API接続エラー")
+            return self._quotes(5, 100.0) if code == "72030" else pd.DataFrame()
+
+        mock_batch_daily.side_effect = quotes
+
+        response = client.get("/api/analysis/technical", params={"codes": "72030,67580,99990"})
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["results"]["72030"]) == 5
+        assert body["results"]["99990"] == []
+        assert body["errors"] == {"67580": "J-Quants API接続エラー"}
+        assert "ETag" not in response.headers
+
+    def test_codes_are_required(self) -> None:
+        assert client.get("/api/analysis/technical", params={"codes": ""}).status_code == 422
+
+    @patch("app.analysis.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_selected_indicators(self, mock_batch_daily: AsyncMock) -> None:
+        mock_batch_daily.return_value = self._quotes(30, 1000.0)
+
+        response = client.get("/api/analysis/technical", params={"codes": "72030", "indicators": "sma:10"})
+        assert response.status_code == 200
+        record = response.json()["results"]["72030"][-1]
+        assert set(record) == {"date", "close", "sma_10"}
+
+
 class TestTechnicalEndpoint:
     """GET /api/analysis/{code}/technical のテスト。"""
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_returns_empty_on_api_error(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_returns_empty_on_api_error(self, mock_get_daily: AsyncMock) -> None:
         """J-Quants APIがエラーの場合、空配列が返る。"""
         mock_get_daily.side_effect = Exception("J-Quants API接続エラー")
 
@@ -121,8 +271,8 @@ class TestTechnicalEndpoint:
         data = response.json()
         assert data == []
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_returns_empty_on_timeout(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_returns_empty_on_timeout(self, mock_get_daily: AsyncMock) -> None:
         """タイムアウトエラーでも空配列が返る。"""
         mock_get_daily.side_effect = TimeoutError("Request timed out")
 
@@ -131,8 +281,8 @@ class TestTechnicalEndpoint:
         data = response.json()
         assert data == []
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_with_valid_data(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_with_valid_data(self, mock_get_daily: AsyncMock) -> None:
         """正常系: テクニカル指標が正しく計算されて返る。"""
         import numpy as np
 
@@ -185,8 +335,95 @@ class TestTechnicalEndpoint:
         assert last_record["rsi_14"] is not None
         assert last_record["macd"] is not None
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_with_empty_dataframe(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_columns_format_matches_records(self, mock_get_daily: AsyncMock) -> None:
+        """format=columns は records と同じ値を列ごとの配列で返す。"""
+        dates = pd.date_range("2024-01-01", periods=30, freq="B")
+        mock_get_daily.return_value = pd.DataFrame(
+            {"Date": dates.strftime("%Y-%m-%d"), "AdjC": [1000.0 + i for i in range(30)]}
+        )
+
+        records = client.get("/api/analysis/7203/technical").json()
+        response = client.get("/api/analysis/7203/technical", params={"format": "columns"})
+        assert response.status_code == 200
+        columns = response.json()
+        assert set(columns) == set(records[0])
+        for key, values in columns.items():
+            assert values == [row[key] for row in records]
+
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_selected_indicators(self, mock_get_daily: AsyncMock) -> None:
+        """indicators= で指定した指標だけを、指定したパラメータで返す。"""
+        dates = pd.date_range("2024-01-01", periods=30, freq="B")
+        close = [1000.0 + i for i in range(30)]
+        mock_get_daily.return_value = pd.DataFrame(
+            {
+                "Date": dates.strftime("%Y-%m-%d"),
+                "AdjC": close,
+                "AdjH": [c + 5 for c in close],
+                "AdjL": [c - 5 for c in close],
+            }
+        )
+
+        response = client.get("/api/analysis/7203/technical", params={"indicators": "sma:3,atr:5,macd:fast=6"})
+        assert response.status_code == 200
+        last = response.json()[-1]
+        assert set(last) == {
+            "date",
+            "high",
+            "low",
+            "close",
+            "sma_3",
+            "atr_5",
+            "macd_6_26_9",
+            "macd_signal_6_26_9",
+            "macd_histogram_6_26_9",
+        }
+        assert last["sma_3"] == pytest.approx(sum(close[-3:]) / 3)
+
+    def test_technical_invalid_indicators(self) -> None:
+        response = client.get("/api/analysis/7203/technical", params={"indicators": "sma:0"})
+        assert response.status_code == 422
+        assert "window" in response.json()["detail"]
+
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_columns_format_marks_stale_snapshot(self, mock_get_daily: AsyncMock) -> None:
+        from app.jquants_client import _stale_served
+
+        async def stale_quotes(*_: str) -> pd.DataFrame:
+            _stale_served.set(True)
+            return pd.DataFrame({"Date": ["2024-01-04"], "AdjC": [100.0]})
+
+        mock_get_daily.side_effect = stale_quotes
+
+        response = client.get("/api/analysis/7203/technical", params={"format": "columns"})
+        assert response.headers["X-Data-Stale"] == "true"
+        assert response.json()["close"] == [100.0]
+
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_marks_stale_snapshot(self, mock_get_daily: AsyncMock) -> None:
+        """古いスナップショットを返したときはレスポンスヘッダーで知らせる。"""
+        from app.jquants_client import _stale_served
+
+        async def stale_quotes(*_: str) -> pd.DataFrame:
+            _stale_served.set(True)
+            return pd.DataFrame({"Date": ["2024-01-04"], "AdjC": [100.0]})
+
+        mock_get_daily.side_effect = stale_quotes
+
+        response = client.get("/api/analysis/7203/technical")
+        assert response.status_code == 200
+        assert response.headers["X-Data-Stale"] == "true"
+
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_fresh_data_has_no_stale_header(self, mock_get_daily: AsyncMock) -> None:
+        mock_get_daily.return_value = pd.DataFrame({"Date": ["2024-01-04"], "AdjC": [100.0]})
+
+        response = client.get("/api/analysis/7203/technical")
+        assert "X-Data-Stale" not in response.headers
+
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_with_empty_dataframe(self, mock_get_daily: AsyncMock) -> None:
         """空のDataFrameが返された場合、空配列を返す。"""
         mock_get_daily.return_value = pd.DataFrame()
 
@@ -195,8 +432,8 @@ class TestTechnicalEndpoint:
         data = response.json()
         assert data == []
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_with_no_close_column(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_with_no_close_column(self, mock_get_daily: AsyncMock) -> None:
         """closeカラムがないDataFrameの場合、空配列を返す。"""
         mock_get_daily.return_value = pd.DataFrame(
             {
@@ -211,8 +448,8 @@ class TestTechnicalEndpoint:
         data = response.json()
         assert data == []
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_nan_converted_to_none(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_nan_converted_to_none(self, mock_get_daily: AsyncMock) -> None:
         """NaN値がJSON上でnull (None)に変換される。"""
         # データが少ないとSMA_75はNaN
         dates = pd.date_range("2024-01-01", periods=10, freq="B")
@@ -235,8 +472,8 @@ class TestTechnicalEndpoint:
         for row in data:
             assert row["sma_75"] is None
 
-    @patch("app.analysis.router.get_daily_quotes")
-    def test_technical_fallback_to_c_column(self, mock_get_daily: MagicMock) -> None:
+    @patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_technical_fallback_to_c_column(self, mock_get_daily: AsyncMock) -> None:
         """AdjCカラムがなくCカラムがある場合にフォールバックする。"""
         dates = pd.date_range("2024-01-01", periods=30, freq="B")
         mock_get_daily.return_value = pd.DataFrame(
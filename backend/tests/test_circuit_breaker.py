@@ -0,0 +1,82 @@
+import pytest
+
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    """手動で進めるテスト用の時計。"""
+
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+
+
+class TestCircuitBreaker:
+    """サーキットブレーカーのテスト。"""
+
+    def test_opens_after_consecutive_failures(self) -> None:
+        breaker = _breaker(FakeClock())
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError) as exc_info:
+            breaker.before_call()
+        assert exc_info.value.retry_after == pytest.approx(30)
+        assert breaker.stats()["rejected"] == 1
+        assert breaker.stats()["opened"] == 1
+
+    def test_success_resets_failure_count(self) -> None:
+        breaker = _breaker(FakeClock())
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+
+    def test_half_open_allows_single_trial(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now += 30
+
+        assert breaker.state == "half_open"
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        breaker.before_call()
+
+    def test_failed_trial_reopens(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now += 30
+        breaker.before_call()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert breaker.stats()["opened"] == 2
+
+    def test_ignored_call_releases_trial(self) -> None:
+        clock = FakeClock()
+        breaker = _breaker(clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now += 30
+        breaker.before_call()
+        breaker.record_ignored()
+
+        assert breaker.state == "half_open"
+        breaker.before_call()
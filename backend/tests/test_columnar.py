@@ -0,0 +1,47 @@
+"""列指向レスポンスへの変換のテスト。"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from app.columnar import columnar_response, frame_to_columns
+
+
+class TestFrameToColumns:
+    def test_dates_are_formatted_and_missing_become_none(self) -> None:
+        df = pd.DataFrame({"date": ["2024-01-04T00:00:00", "2024-01-05", None]})
+        assert frame_to_columns(df)["date"] == ["2024-01-04", "2024-01-05", None]
+
+    def test_datetime_columns_are_formatted_by_dtype(self) -> None:
+        df = pd.DataFrame({"DiscDate": pd.to_datetime(["2024-05-10", None])})
+        assert frame_to_columns(df)["DiscDate"] == ["2024-05-10", None]
+
+    def test_numeric_columns_stay_numpy_arrays(self) -> None:
+        df = pd.DataFrame({"close": [1.5, np.nan], "volume": [100, 200]})
+        columns = frame_to_columns(df)
+        assert isinstance(columns["close"], np.ndarray)
+        assert columns["volume"].dtype == np.int64
+
+    def test_object_columns_replace_missing_with_none(self) -> None:
+        df = pd.DataFrame({"code": ["72030", None], "note": ["a", float("nan")]})
+        columns = frame_to_columns(df)
+        assert columns["code"] == ["72030", None]
+        assert columns["note"] == ["a", None]
+        # 元のDataFrameは書き換えない
+        assert pd.isna(df.loc[1, "note"]) and df.loc[1, "note"] is not None
+
+
+class TestColumnarResponse:
+    def test_nan_is_encoded_as_null(self) -> None:
+        df = pd.DataFrame({"date": ["2024-01-04", "2024-01-05"], "close": [np.nan, 101.0], "volume": [1, 2]})
+        response = columnar_response(df)
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == {
+            "date": ["2024-01-04", "2024-01-05"],
+            "close": [None, 101.0],
+            "volume": [1, 2],
+        }
+
+    def test_empty_frame_is_empty_object(self) -> None:
+        assert json.loads(columnar_response(pd.DataFrame()).body) == {}
@@ -0,0 +1,102 @@
+"""レスポンス圧縮ミドルウェアのテスト。"""
+
+import zlib
+from collections.abc import Iterator
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, choose_encoding
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@app.get("/large")
+def large() -> PlainTextResponse:
+    return PlainTextResponse("x" * 1000)
+
+
+@app.get("/small")
+def small() -> PlainTextResponse:
+    return PlainTextResponse("x")
+
+
+@app.get("/stream")
+def stream() -> StreamingResponse:
+    def chunks() -> Iterator[bytes]:
+        for i in range(3):
+            yield f"chunk{i}\n".encode() * 50
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+@app.get("/events")
+def events() -> StreamingResponse:
+    return StreamingResponse(iter([b"data: x\n\n" * 200]), media_type="text/event-stream")
+
+
+client = TestClient(app)
+
+
+class TestChooseEncoding:
+    def test_prefers_gzip_without_brotli(self) -> None:
+        with patch("app.compression.brotli", None):
+            assert choose_encoding("gzip, deflate, br") == "gzip"
+
+    def test_prefers_brotli_when_available(self) -> None:
+        with patch("app.compression.brotli", object()):
+            assert choose_encoding("gzip, deflate, br") == "br"
+            assert choose_encoding("gzip, br;q=0") == "gzip"
+
+    def test_q_zero_and_missing(self) -> None:
+        assert choose_encoding("gzip;q=0") is None
+        assert choose_encoding("") is None
+        assert choose_encoding("identity") is None
+
+    def test_wildcard_picks_best_available(self) -> None:
+        with patch("app.compression.brotli", None):
+            assert choose_encoding("*") == "gzip"
+        with patch("app.compression.brotli", object()):
+            assert choose_encoding("*") == "br"
+            assert choose_encoding("br;q=0, *") == "gzip"
+
+
+class TestCompressionMiddleware:
+    def test_large_response_is_gzipped(self) -> None:
+        with patch("app.compression.brotli", None):
+            response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.text == "x" * 1000
+
+    def test_small_response_is_not_compressed(self) -> None:
+        response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+    def test_identity_when_not_accepted(self) -> None:
+        response = client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert response.text == "x" * 1000
+
+    def test_content_length_matches_compressed_body(self) -> None:
+        gzip_only = patch("app.compression.brotli", None)
+        with gzip_only, client.stream("GET", "/large", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert int(response.headers["Content-Length"]) == len(raw) < 1000
+        assert zlib.decompress(raw, 31) == b"x" * 1000
+
+    def test_streaming_response_is_compressed_per_chunk(self) -> None:
+        gzip_only = patch("app.compression.brotli", None)
+        with gzip_only, client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in response.headers
+        expected = b"".join(f"chunk{i}\n".encode() * 50 for i in range(3))
+        assert zlib.decompress(raw, 31) == expected
+
+    def test_event_stream_is_not_compressed(self) -> None:
+        response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
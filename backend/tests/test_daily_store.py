@@ -0,0 +1,88 @@
+from datetime import date
+
+import pandas as pd
+
+from app.daily_store import (
+    OPEN_START,
+    cap_ranges,
+    has_corporate_action,
+    merge_bars,
+    merge_ranges,
+    missing_ranges,
+    parse_yyyymmdd,
+    slice_bars,
+)
+
+
+class TestRanges:
+    """取得済み期間の計算のテスト。"""
+
+    def test_parse_yyyymmdd(self) -> None:
+        assert parse_yyyymmdd("20240105", OPEN_START) == date(2024, 1, 5)
+        assert parse_yyyymmdd("2024-01-05", OPEN_START) == date(2024, 1, 5)
+        assert parse_yyyymmdd("", OPEN_START) == OPEN_START
+
+    def test_merge_overlapping_and_adjacent(self) -> None:
+        ranges = [
+            (date(2024, 3, 1), date(2024, 3, 31)),
+            (date(2024, 1, 1), date(2024, 1, 31)),
+            (date(2024, 2, 1), date(2024, 2, 10)),  # 1月と隣接
+            (date(2024, 3, 15), date(2024, 4, 10)),  # 3月と重なる
+        ]
+        assert merge_ranges(ranges) == [
+            (date(2024, 1, 1), date(2024, 2, 10)),
+            (date(2024, 3, 1), date(2024, 4, 10)),
+        ]
+
+    def test_missing_ranges_nothing_covered(self) -> None:
+        assert missing_ranges([], date(2024, 1, 1), date(2024, 1, 31)) == [(date(2024, 1, 1), date(2024, 1, 31))]
+
+    def test_missing_ranges_fully_covered(self) -> None:
+        covered = [(date(2024, 1, 1), date(2024, 12, 31))]
+        assert missing_ranges(covered, date(2024, 2, 1), date(2024, 2, 29)) == []
+
+    def test_missing_ranges_edges_and_holes(self) -> None:
+        covered = [(date(2024, 1, 10), date(2024, 1, 20)), (date(2024, 2, 1), date(2024, 2, 10))]
+        assert missing_ranges(covered, date(2024, 1, 1), date(2024, 2, 15)) == [
+            (date(2024, 1, 1), date(2024, 1, 9)),
+            (date(2024, 1, 21), date(2024, 1, 31)),
+            (date(2024, 2, 11), date(2024, 2, 15)),
+        ]
+
+    def test_missing_ranges_only_latest_day(self) -> None:
+        """カバー済みの翌日だけが未取得として返る。"""
+        covered = [(OPEN_START, date(2024, 10, 16))]
+        assert missing_ranges(covered, OPEN_START, date(2024, 10, 17)) == [(date(2024, 10, 17), date(2024, 10, 17))]
+
+    def test_cap_ranges_at_last_returned_bar(self) -> None:
+        """最後の日足より後の末尾は取得済みにしない。"""
+        ranges = [(date(2024, 1, 1), date(2024, 1, 31)), (date(2024, 2, 1), date(2024, 2, 29))]
+        assert cap_ranges(ranges, date(2024, 1, 19)) == [(date(2024, 1, 1), date(2024, 1, 19))]
+        assert cap_ranges(ranges, date(2024, 3, 1)) == ranges
+        assert cap_ranges(ranges, None) == []
+
+
+class TestBars:
+    """日足のマージと切り出しのテスト。"""
+
+    def _bars(self, dates: list[str], close: float) -> pd.DataFrame:
+        return pd.DataFrame({"Date": pd.to_datetime(dates), "Code": "72030", "AdjC": close, "AdjFactor": 1.0})
+
+    def test_merge_bars_sorts_and_prefers_new(self) -> None:
+        existing = self._bars(["2024-01-05", "2024-01-04"], 100.0)
+        new = self._bars(["2024-01-05", "2024-01-09"], 200.0)
+        merged = merge_bars(existing, new)
+        assert merged["Date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-04", "2024-01-05", "2024-01-09"]
+        assert merged["AdjC"].tolist() == [100.0, 200.0, 200.0]
+
+    def test_slice_bars(self) -> None:
+        df = self._bars(["2024-01-04", "2024-01-05", "2024-01-09", "2024-01-10"], 100.0)
+        result = slice_bars(df, date(2024, 1, 5), date(2024, 1, 9))
+        assert result["Date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-05", "2024-01-09"]
+        assert len(slice_bars(df, OPEN_START, date(2024, 1, 4))) == 1
+
+    def test_has_corporate_action(self) -> None:
+        df = self._bars(["2024-01-04"], 100.0)
+        assert not has_corporate_action(df)
+        df.loc[0, "AdjFactor"] = 0.5
+        assert has_corporate_action(df)
@@ -0,0 +1,141 @@
+"""ストリーミングエクスポートのテスト。"""
+
+import json
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+from app.jquants_client import _save_daily_store
+from app.main import app
+
+client = TestClient(app)
+
+
+def _bars(code: str, days: int) -> pd.DataFrame:
+    dates = pd.date_range("2024-01-01", periods=days, freq="B")
+    return pd.DataFrame(
+        {
+            "Date": dates,
+            "Code": [code] * days,
+            "C": [100.0 + i for i in range(days)],
+            "AdjC": [100.0 + i for i in range(days)],
+        }
+    )
+
+
+@pytest.fixture
+def stores(monkeypatch: pytest.MonkeyPatch) -> None:
+    """2銘柄分の日足ストアを用意し、チャンクを小さくして複数に分かれるようにする。"""
+    monkeypatch.setattr("app.export.service.CHUNK_ROWS", 4)
+    for code in ("72030", "67580"):
+        bars = _bars(code, 10)
+        _save_daily_store(code, bars, [(date(2024, 1, 1), date(2024, 1, 12))])
+
+
+@pytest.mark.usefixtures("stores")
+class TestDailyExport:
+    @patch("app.jquants_client.latest_published_trading_day", return_value=date(2024, 1, 12))
+    def test_ndjson_streams_rows_of_each_code(self, _: object) -> None:
+        response = client.get("/api/export/daily", params={"codes": "72030,67580", "from": "20240103"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 16
+        assert rows[0] == {"date": "2024-01-03", "code": "72030", "close": 102.0, "adjustment_close": 102.0}
+        assert [row["code"] for row in rows] == ["72030"] * 8 + ["67580"] * 8
+
+    @patch("app.jquants_client.latest_published_trading_day", return_value=date(2024, 1, 12))
+    def test_arrow_stream_has_one_schema_and_several_batches(self, _: object) -> None:
+        response = client.get(
+            "/api/export/daily", params={"codes": "72030,67580", "from": "20240101", "format": "arrow"}
+        )
+        assert response.status_code == 200
+        reader = pa.ipc.open_stream(response.content)
+        batches = list(reader)
+        assert len(batches) >= 4
+        table = pa.Table.from_batches(batches)
+        assert table.num_rows == 20
+        assert table.schema.field("date").type == pa.date32()
+        assert table.column("code").to_pylist()[-1] == "67580"
+
+    @patch("app.jquants_client.latest_published_trading_day", return_value=date(2024, 1, 12))
+    def test_missing_range_is_fetched_before_streaming(self, _: object) -> None:
+        with patch("app.jquants_client._fetch_daily_bars_async", new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = _bars("99840", 5)
+            response = client.get("/api/export/daily", params={"codes": "99840"})
+        assert len(response.text.splitlines()) == 5
+        mock_fetch.assert_awaited_once()
+
+
+class TestTechnicalExport:
+    @patch("app.export.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_ndjson_includes_code_and_indicators(self, mock_get_daily: AsyncMock) -> None:
+        mock_get_daily.return_value = _bars("72030", 30)
+
+        response = client.get("/api/export/technical", params={"codes": "72030"})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 30
+        assert rows[-1]["code"] == "72030"
+        assert rows[-1]["sma_25"] is not None
+        assert rows[0]["sma_25"] is None
+
+    @patch("app.export.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_failed_code_is_skipped(self, mock_get_daily: AsyncMock) -> None:
+        mock_get_daily.side_effect = [Exception("J-Quants API接続エラー"), _bars("67580", 3)]
+
+        response = client.get("/api/export/technical", params={"codes": "72030,67580"})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        # 失敗した銘柄は最後の行で知らせる
+        assert rows[-1] == {"errors": {"72030": "J-Quants API接続エラー"}}
+        assert {row["code"] for row in rows[:-1]} == {"67580"}
+
+    @patch("app.export.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_arrow_stream_reports_failed_code_in_last_batch(self, mock_get_daily: AsyncMock) -> None:
+        mock_get_daily.side_effect = [_bars("72030", 3), Exception("J-Quants API接続エラー")]
+
+        response = client.get("/api/export/technical", params={"codes": "72030,67580", "format": "arrow"})
+        reader = pa.ipc.open_stream(response.content)
+        batches = []
+        while True:
+            try:
+                batches.append(reader.read_next_batch_with_custom_metadata())
+            except StopIteration:
+                break
+        assert sum(b.batch.num_rows for b in batches) == 3
+        assert batches[-1].batch.num_rows == 0
+        assert json.loads(batches[-1].custom_metadata[b"errors"]) == {"67580": "J-Quants API接続エラー"}
+
+    @patch("app.export.service.get_daily_quotes_async", new_callable=AsyncMock)
+    def test_no_error_record_when_every_code_succeeds(self, mock_get_daily: AsyncMock) -> None:
+        mock_get_daily.return_value = _bars("72030", 3)
+
+        response = client.get("/api/export/technical", params={"codes": "72030"})
+        assert all("errors" not in json.loads(line) for line in response.text.splitlines())
+
+
+class TestExportValidation:
+    def test_codes_are_required(self) -> None:
+        assert client.get("/api/export/daily", params={"codes": " , "}).status_code == 422
+
+    def test_unknown_dataset(self) -> None:
+        assert client.get("/api/export/financials", params={"codes": "72030"}).status_code == 422
+
+
+@pytest.mark.parametrize("cache_format", ["arrow", "parquet", "csv"])
+def test_daily_chunks_read_every_cache_format(cache_format: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """どのキャッシュ形式でもファイルからチャンク単位で読める。"""
+    from app.export.service import _daily_chunks
+    from app.jquants_client import _daily_store_paths
+
+    monkeypatch.setattr("app.config.settings.cache_format", cache_format)
+    monkeypatch.setattr("app.export.service.CHUNK_ROWS", 3)
+    _save_daily_store("72030", _bars("72030", 10), [(date(2024, 1, 1), date(2024, 1, 12))])
+    path, _ = _daily_store_paths("72030")
+
+    chunks = list(_daily_chunks(path, date(2024, 1, 2), date(2024, 1, 11)))
+    assert [len(chunk) for chunk in chunks] == [2, 3, 3]
+    assert pd.concat(chunks)["close"].tolist() == [101.0 + i for i in range(8)]
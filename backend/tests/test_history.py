@@ -0,0 +1,109 @@
+"""保存した指標の履歴を新しい日足の分だけ伸ばすテスト。"""
+
+import os
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from app.analysis import history
+from app.analysis.history import MAX_STARTS_PER_CODE, _history_paths, technical_history
+from app.analysis.technical import compute_technical_indicators
+
+
+def _prices(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(5)
+    close = 1000 * np.cumprod(1 + rng.normal(0, 0.02, 300))[:n]
+    return pd.DataFrame({"date": pd.date_range("2024-01-01", periods=n, freq="B"), "close": close})
+
+
+def _expected(prices: pd.DataFrame) -> pd.DataFrame:
+    return compute_technical_indicators(prices)
+
+
+def _rebuilds() -> Any:
+    return patch.object(history, "compute_indicators_with_state", wraps=history.compute_indicators_with_state)
+
+
+def test_new_bars_advance_the_saved_state() -> None:
+    technical_history("72030", _prices(120))
+
+    with _rebuilds() as rebuild:
+        result = technical_history("72030", _prices(130))
+        assert rebuild.call_count == 0
+    pd.testing.assert_frame_equal(result, _expected(_prices(130)), rtol=1e-9)
+
+    # 伸ばした履歴は保存されているので、次はさらに伸びた分だけ進める
+    with _rebuilds() as rebuild:
+        result = technical_history("72030", _prices(131))
+        assert rebuild.call_count == 0
+    pd.testing.assert_frame_equal(result, _expected(_prices(131)), rtol=1e-9)
+
+
+def test_shorter_period_returns_the_prefix() -> None:
+    technical_history("72030", _prices(130))
+
+    with _rebuilds() as rebuild:
+        result = technical_history("72030", _prices(100))
+        assert rebuild.call_count == 0
+    pd.testing.assert_frame_equal(result, _expected(_prices(100)), rtol=1e-9)
+
+
+def test_rewritten_prices_are_recomputed() -> None:
+    """株式分割などで過去の調整後株価が変わったら、全期間を計算し直す。"""
+    technical_history("72030", _prices(120))
+    adjusted = _prices(125).assign(close=lambda df: df["close"] / 2)
+
+    with _rebuilds() as rebuild:
+        result = technical_history("72030", adjusted)
+        assert rebuild.call_count == 1
+    pd.testing.assert_frame_equal(result, _expected(adjusted), rtol=1e-9)
+
+
+def test_different_start_is_recomputed() -> None:
+    technical_history("72030", _prices(120))
+    later = _prices(130).iloc[10:].reset_index(drop=True)
+
+    with _rebuilds() as rebuild:
+        result = technical_history("72030", later)
+        assert rebuild.call_count == 1
+    pd.testing.assert_frame_equal(result, _expected(later), rtol=1e-9)
+
+
+def test_alternating_starts_keep_their_own_history() -> None:
+    """開始日の違うリクエストが交互に来ても、それぞれの履歴を伸ばすだけで計算し直さない。"""
+    later = _prices(130).iloc[10:].reset_index(drop=True)
+    technical_history("72030", _prices(120))
+    technical_history("72030", later.iloc[:100])
+
+    with _rebuilds() as rebuild:
+        first = technical_history("72030", _prices(125))
+        second = technical_history("72030", later)
+        assert rebuild.call_count == 0
+    pd.testing.assert_frame_equal(first, _expected(_prices(125)), rtol=1e-9)
+    pd.testing.assert_frame_equal(second, _expected(later), rtol=1e-9)
+
+
+def test_only_recent_starts_are_kept() -> None:
+    for offset in range(MAX_STARTS_PER_CODE + 1):
+        prices = _prices(120).iloc[offset:].reset_index(drop=True)
+        technical_history("72030", prices)
+        # 保存した順に更新時刻を進める（同じ時刻の刻みに収まると順序が決まらない）
+        _, state_path = _history_paths("72030", f"{prices['date'].iloc[0]:%Y%m%d}")
+        os.utime(state_path, (offset, offset))
+
+    _, oldest = _history_paths("72030", "20240101")
+    assert not oldest.exists()
+    assert len(list(oldest.parent.glob("daily_72030.technical.*.json"))) == MAX_STARTS_PER_CODE
+
+
+def test_broken_state_is_recomputed() -> None:
+    technical_history("72030", _prices(120))
+    _, state_path = _history_paths("72030", "20240101")
+    state_path.write_text("{")
+
+    with _rebuilds() as rebuild:
+        result = technical_history("72030", _prices(121))
+        assert rebuild.call_count == 1
+    pd.testing.assert_frame_equal(result, _expected(_prices(121)), rtol=1e-9)
@@ -0,0 +1,135 @@
+"""条件付きGET（ETag / Last-Modified）のテスト。"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+QUOTES = pd.DataFrame(
+    {"Date": pd.to_datetime(["2024-01-04", "2024-01-05"]), "Code": "72030", "AdjC": [100.0, 101.0], "AdjFactor": 1.0}
+)
+
+TECHNICAL = "/api/analysis/7203/technical"
+RANGE = {"from": "20240104", "to": "20240105"}
+
+
+def _upstream(bars: pd.DataFrame = QUOTES) -> MagicMock:
+    """日足を返す非同期クライアントのモック。取得した日足は日足ストアに入る。"""
+    mock_client = MagicMock()
+    mock_client.get_eq_bars_daily = AsyncMock(return_value=bars)
+    return mock_client
+
+
+@patch("app.jquants_client._get_async_client")
+class TestConditionalGet:
+    def test_response_has_validators(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream()
+
+        response = client.get(TECHNICAL, params=RANGE)
+        assert response.status_code == 200
+        assert response.headers["ETag"].startswith('"')
+        assert "Last-Modified" in response.headers
+        assert response.headers["Cache-Control"] == "no-cache"
+
+    def test_matching_etag_returns_304_without_fetching(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream()
+        etag = client.get(TECHNICAL, params=RANGE).headers["ETag"]
+
+        with patch("app.analysis.router.get_daily_quotes_async", new_callable=AsyncMock) as mock_get_daily:
+            response = client.get(TECHNICAL, params=RANGE, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        mock_get_daily.assert_not_called()
+
+    def test_etag_depends_on_query(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream()
+        etag = client.get(TECHNICAL, params=RANGE).headers["ETag"]
+
+        response = client.get(TECHNICAL, params={**RANGE, "format": "columns"}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_store_update_invalidates_etag(self, mock_get_client: MagicMock, monkeypatch: pytest.MonkeyPatch) -> None:
+        """日足ストアが更新されるとETagが変わる。"""
+        # 手元の日足を先に返して裏で取得すると、ストアの更新を待たずに次のリクエストが来る
+        monkeypatch.setattr("app.config.settings.stale_while_revalidate", False)
+        mock_get_client.return_value = _upstream()
+        etag = client.get(TECHNICAL, params=RANGE).headers["ETag"]
+
+        later = QUOTES.assign(Date=pd.to_datetime(["2024-01-09", "2024-01-10"]))
+        mock_get_client.return_value = _upstream(later)
+        client.get(TECHNICAL, params={"from": "20240104", "to": "20240110"})
+
+        response = client.get(TECHNICAL, params=RANGE, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_if_modified_since(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream()
+        last_modified = client.get(TECHNICAL, params=RANGE).headers["Last-Modified"]
+
+        response = client.get(TECHNICAL, params=RANGE, headers={"If-Modified-Since": last_modified})
+        assert response.status_code == 304
+        response = client.get(TECHNICAL, params=RANGE, headers={"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        assert response.status_code == 200
+
+    def test_empty_result_has_no_validators(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream(pd.DataFrame())
+
+        response = client.get(TECHNICAL, params=RANGE)
+        assert response.json() == []
+        assert "ETag" not in response.headers
+
+    def test_wildcard_does_not_match_unknown_resource(self, mock_get_client: MagicMock) -> None:
+        """データのない銘柄に If-None-Match: * で304を返さない。"""
+        mock_get_client.return_value = _upstream(pd.DataFrame())
+
+        response = client.get(TECHNICAL, params=RANGE, headers={"If-None-Match": "*"})
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_stale_snapshot_has_no_validators(self, mock_get_client: MagicMock) -> None:
+        """古いスナップショットにETagを付けると、再取得後のデータを304で取り逃がす。"""
+        from app.jquants_client import _stale_served
+
+        async def stale_quotes(*_: str) -> pd.DataFrame:
+            _stale_served.set(True)
+            return QUOTES
+
+        with patch("app.analysis.router.get_daily_quotes_async", side_effect=stale_quotes):
+            response = client.get(TECHNICAL)
+        assert response.headers["X-Data-Stale"] == "true"
+        assert "ETag" not in response.headers
+
+    def test_api_error_has_no_validators(self, mock_get_client: MagicMock) -> None:
+        with patch("app.analysis.router.get_daily_quotes_async", side_effect=Exception("J-Quants API接続エラー")):
+            response = client.get(TECHNICAL)
+        assert response.json() == []
+        assert "ETag" not in response.headers
+
+
+@patch("app.jquants_client._get_async_client")
+class TestDailyValidators:
+    def test_columnar_response_has_validators(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream()
+        params = {**RANGE, "format": "columns"}
+
+        etag = client.get("/api/stocks/72030/daily", params=params).headers["ETag"]
+        response = client.get("/api/stocks/72030/daily", params=params, headers={"If-None-Match": f"W/{etag}"})
+        assert response.status_code == 304
+
+    def test_batch_returns_304_when_stores_are_unchanged(self, mock_get_client: MagicMock) -> None:
+        mock_get_client.return_value = _upstream()
+        params = {**RANGE, "codes": "7203"}
+
+        etag = client.get("/api/analysis/technical", params=params).headers["ETag"]
+        mock_get_client.return_value.get_eq_bars_daily.reset_mock()
+        response = client.get("/api/analysis/technical", params=params, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        mock_get_client.return_value.get_eq_bars_daily.assert_not_called()
@@ -0,0 +1,243 @@
+import json
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.analysis import indicators
+from app.analysis.indicators import (
+    DEFAULT_INDICATORS,
+    IndicatorSpec,
+    IndicatorState,
+    compute_indicators,
+    compute_indicators_with_state,
+    compute_indicators_with_states,
+    output_columns,
+    parse_indicators,
+    required_sources,
+)
+
+
+def _prices(n: int = 120) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(3)
+    close = 1000 * np.cumprod(1 + rng.normal(0, 0.02, n))
+    return {
+        "close": close,
+        "high": close * (1 + rng.uniform(0, 0.02, n)),
+        "low": close * (1 - rng.uniform(0, 0.02, n)),
+        "volume": rng.integers(1000, 5000, n).astype(float),
+    }
+
+
+class TestParseIndicators:
+    def test_positional_and_named_params(self) -> None:
+        specs = parse_indicators("sma:5, macd:fast=8:slow=17, bb:20:2.5")
+        assert specs == (
+            IndicatorSpec("sma", (("window", 5),)),
+            IndicatorSpec("macd", (("fast", 8), ("slow", 17), ("signal", 9))),
+            IndicatorSpec("bb", (("window", 20), ("k", 2.5))),
+        )
+
+    def test_defaults_fill_omitted_params(self) -> None:
+        assert parse_indicators("rsi") == (IndicatorSpec("rsi", (("window", 14),)),)
+
+    @pytest.mark.parametrize(
+        "text",
+        ["unknown", "sma:5:6", "sma:period=5", "sma:five", "sma:2.5", "sma:0", "bb:20:-1", "ema:1001", "bb:20:nan"],
+    )
+    def test_invalid_spec(self, text: str) -> None:
+        with pytest.raises(ValueError):
+            parse_indicators(text)
+
+    def test_str_round_trips(self) -> None:
+        spec = parse_indicators("bb:10:2.5")[0]
+        assert str(spec) == "bb:10:2.5"
+        assert parse_indicators(str(spec)) == (spec,)
+
+
+class TestOutputColumns:
+    def test_default_columns(self) -> None:
+        assert list(output_columns(DEFAULT_INDICATORS)) == [
+            "sma_5",
+            "sma_25",
+            "sma_75",
+            "rsi_14",
+            "macd",
+            "macd_signal",
+            "macd_histogram",
+            "bb_upper",
+            "bb_middle",
+            "bb_lower",
+        ]
+
+    def test_overridden_params_are_appended(self) -> None:
+        """列名に含まれないパラメータを変えると、既定の列と区別できる名前になる。"""
+        columns = output_columns(parse_indicators("macd,macd:8,rsi:9"))
+        assert list(columns) == [
+            "macd",
+            "macd_signal",
+            "macd_histogram",
+            "macd_8_26_9",
+            "macd_signal_8_26_9",
+            "macd_histogram_8_26_9",
+            "rsi_9",
+        ]
+
+    def test_required_sources(self) -> None:
+        assert required_sources(DEFAULT_INDICATORS) == ["close"]
+        assert sorted(required_sources(parse_indicators("atr,obv"))) == ["close", "high", "low", "volume"]
+
+
+class TestComputeIndicators:
+    def test_only_requested_columns(self) -> None:
+        result = compute_indicators(_prices(), parse_indicators("sma:5"))
+        assert list(result) == ["sma_5"]
+
+    def test_shared_intermediates_are_computed_once(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        calls: list[tuple[Any, ...]] = []
+
+        def counting(kind: str) -> Callable[..., Any]:
+            kernel = indicators._KERNELS[kind]
+
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                calls.append((kind, *(arg for arg in args if not isinstance(arg, np.ndarray))))
+                return kernel(*args, **kwargs)
+
+            return wrapper
+
+        for kind in ("ema", "sums"):
+            monkeypatch.setitem(indicators._KERNELS, kind, counting(kind))
+
+        compute_indicators(_prices(), parse_indicators("macd,ema:12,ema:26,sma:20,bb,sma:5"))
+        # EMA12/26（MACDと共有）とシグナルの3回、累積和は終値で1回だけ
+        assert sorted(kind for kind, *_ in calls) == ["ema", "ema", "ema", "sums"]
+
+    def test_missing_source(self) -> None:
+        with pytest.raises(ValueError, match="high"):
+            compute_indicators({"close": np.arange(10.0)}, parse_indicators("atr"))
+
+    def test_atr(self) -> None:
+        prices = _prices()
+        high, low, close = (pd.Series(prices[name]) for name in ("high", "low", "close"))
+        previous = close.shift(1)
+        true_range = pd.concat([high - low, (high - previous).abs(), (low - previous).abs()], axis=1).max(axis=1)
+        expected = true_range.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+
+        result = compute_indicators(prices, parse_indicators("atr"))
+        np.testing.assert_allclose(result["atr_14"], expected, rtol=1e-10)
+
+    def test_stochastic(self) -> None:
+        prices = _prices()
+        highest = pd.Series(prices["high"]).rolling(14).max()
+        lowest = pd.Series(prices["low"]).rolling(14).min()
+        k = 100 * (prices["close"] - lowest) / (highest - lowest)
+
+        result = compute_indicators(prices, parse_indicators("stoch"))
+        np.testing.assert_allclose(result["stoch_k"], k, rtol=1e-10)
+        np.testing.assert_allclose(result["stoch_d"], k.rolling(3).mean(), rtol=1e-10)
+
+    def test_obv(self) -> None:
+        prices = {"close": np.array([10.0, 11.0, 11.0, 9.0, 12.0]), "volume": np.array([5.0, 4.0, 3.0, 2.0, 1.0])}
+        result = compute_indicators(prices, parse_indicators("obv"))
+        np.testing.assert_array_equal(result["obv"], [0.0, 4.0, 4.0, 2.0, 3.0])
+
+    def test_long_span_ema_keeps_powers_within_series_length(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """期間が長くても、EMAの減衰率のべき乗は系列の長さ程度しか作らない。"""
+        original = indicators._decay_powers
+        sizes: list[int] = []
+
+        def decay_powers(alpha: float, size: int) -> np.ndarray:
+            powers = original(alpha, size)
+            sizes.append(len(powers))
+            return powers
+
+        monkeypatch.setattr(indicators, "_decay_powers", decay_powers)
+        prices = _prices(800)
+        values = compute_indicators(prices, parse_indicators("ema:300"))
+
+        expected = pd.Series(prices["close"]).ewm(span=300, min_periods=300, adjust=False).mean()
+        np.testing.assert_allclose(values["ema_300"], expected.to_numpy(), rtol=1e-10, equal_nan=True)
+        assert sizes and max(sizes) <= 1024
+
+    def test_empty_input(self) -> None:
+        empty = {name: np.empty(0) for name in ("close", "high", "low", "volume")}
+        result = compute_indicators(empty, parse_indicators("sma:5,rsi,macd,bb,atr,stoch,obv"))
+        assert all(len(values) == 0 for values in result.values())
+
+
+class TestSegments:
+    SPECS = parse_indicators("sma:5,sma:25,ema:10,rsi,macd,bb,atr,stoch,obv")
+
+    def test_matches_per_segment_computation(self) -> None:
+        """連結した系列を1回で計算した結果が、系列ごとに計算した結果と一致する。"""
+        lengths = [1, 2, 30, 90, 14, 60]
+        prices = _prices(sum(lengths))
+        starts = np.cumsum([0, *lengths[:-1]])
+        # 先頭が欠損の系列と、途中に欠損がある系列
+        prices["close"][starts[3] : starts[3] + 3] = np.nan
+        prices["close"][starts[5] + 40] = np.nan
+
+        result = compute_indicators(prices, self.SPECS, starts)
+        for start, length in zip(starts, lengths, strict=True):
+            segment = {name: values[start : start + length] for name, values in prices.items()}
+            for column, values in compute_indicators(segment, self.SPECS).items():
+                np.testing.assert_allclose(
+                    result[column][start : start + length], values, rtol=1e-10, atol=1e-10, err_msg=column
+                )
+
+    @pytest.mark.parametrize("starts", [[1], [0, 0], [0, 120], [0, 50, 20], []])
+    def test_invalid_starts(self, starts: list[int]) -> None:
+        with pytest.raises(ValueError):
+            compute_indicators(_prices(), parse_indicators("sma:5"), starts)
+
+
+class TestIndicatorState:
+    SPECS = parse_indicators("sma:5,sma:25,ema:10,rsi,macd,bb,atr,stoch,obv")
+
+    @pytest.mark.parametrize("split", [0, 1, 30, 119])
+    def test_advance_matches_batch(self, split: int) -> None:
+        """途中まで一括計算して残りを1本ずつ進めても、全体を一括計算した結果と一致する。"""
+        prices = _prices(160)
+        prices["close"][[40, 41, 90]] = np.nan
+        expected = compute_indicators(prices, self.SPECS)
+
+        _, state = compute_indicators_with_state({k: v[:split] for k, v in prices.items()}, self.SPECS)
+        # 状態はJSONを経由しても同じように進む
+        state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+        rows = [state.advance({k: v[i] for k, v in prices.items()}) for i in range(split, 160)]
+
+        assert state.bars == 160
+        for column, values in expected.items():
+            streamed = [row[column] for row in rows]
+            np.testing.assert_allclose(streamed, values[split:], rtol=1e-9, atol=1e-9, err_msg=column)
+
+    def test_segment_states_advance_like_each_series(self) -> None:
+        """系列ごとの状態を進めた結果が、系列ごとに状態を作って進めた結果と一致する。"""
+        prices = _prices(160)
+        prices["close"][[5, 70, 71]] = np.nan  # 2つ目の系列は先頭が欠損、3つ目は途中に欠損がある
+        starts = [0, 5, 60]
+        bounds = [*zip(starts, [*starts[1:], 150], strict=True)]
+        batch = {k: v[:150] for k, v in prices.items()}
+        _, states = compute_indicators_with_states(batch, self.SPECS, starts)
+
+        assert [state.bars for state in states] == [5, 55, 90]
+        for state, (start, end) in zip(states, bounds, strict=True):
+            _, expected = compute_indicators_with_state({k: v[start:end] for k, v in batch.items()}, self.SPECS)
+            for i in range(end, end + 10):
+                bar = {k: v[i] for k, v in prices.items()}
+                np.testing.assert_allclose(
+                    list(state.advance(bar).values()), list(expected.advance(bar).values()), rtol=1e-9, atol=1e-9
+                )
+
+    def test_missing_source(self) -> None:
+        _, state = compute_indicators_with_state(_prices(), parse_indicators("atr"))
+        with pytest.raises(ValueError, match="high"):
+            state.advance({"close": 1000.0})
+
+    def test_mismatched_state(self) -> None:
+        _, state = compute_indicators_with_state(_prices(), parse_indicators("sma:5"))
+        data = {**state.to_dict(), "specs": "bb"}
+        with pytest.raises(ValueError):
+            IndicatorState.from_dict(data)
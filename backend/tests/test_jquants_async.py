@@ -0,0 +1,86 @@
+import json
+
+import httpx
+import pandas as pd
+
+from app.jquants_async import AsyncJQuantsClient
+
+
+def _client(pages: list[dict[str, object]], requests: list[httpx.Request]) -> AsyncJQuantsClient:
+    """pagesを順に返すモックトランスポートのクライアントを作る。"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=json.dumps(pages[len(requests) - 1]))
+
+    return AsyncJQuantsClient(api_key="test_token", transport=httpx.MockTransport(handler))
+
+
+class TestAsyncJQuantsClient:
+    """非同期J-Quantsクライアントのテスト。"""
+
+    async def test_pagination_is_followed(self) -> None:
+        """pagination_key を辿って全ページを連結し、日付順に並べる。"""
+        requests: list[httpx.Request] = []
+        client = _client(
+            [
+                {"data": [{"Date": "2024-01-05", "Code": "72030", "C": 101.0}], "pagination_key": "p1"},
+                {"data": [{"Date": "2024-01-04", "Code": "72030", "C": 100.0}]},
+            ],
+            requests,
+        )
+        df = await client.get_eq_bars_daily(code="7203", from_yyyymmdd="20240101", to_yyyymmdd="20240131")
+        await client.aclose()
+
+        assert len(requests) == 2
+        assert requests[0].url.path == "/v2/equities/bars/daily"
+        assert requests[0].headers["x-api-key"] == "test_token"
+        assert requests[0].url.params["from"] == "20240101"
+        assert requests[1].url.params["pagination_key"] == "p1"
+        assert pd.api.types.is_datetime64_any_dtype(df["Date"])
+        assert df["C"].tolist() == [100.0, 101.0]
+
+    async def test_before_request_runs_for_every_page(self) -> None:
+        requests: list[httpx.Request] = []
+        calls = 0
+
+        async def before() -> None:
+            nonlocal calls
+            calls += 1
+
+        pages = [{"data": [{"Code": "72030"}], "pagination_key": "p1"}, {"data": [{"Code": "99840"}]}]
+        client = AsyncJQuantsClient(
+            api_key="test_token",
+            before_request=before,
+            transport=httpx.MockTransport(
+                lambda request: (
+                    requests.append(request) or httpx.Response(200, content=json.dumps(pages[len(requests) - 1]))
+                )
+            ),
+        )
+        df = await client.get_eq_master()
+        await client.aclose()
+
+        assert calls == 2
+        assert df["Code"].tolist() == ["72030", "99840"]
+
+    async def test_empty_response_keeps_columns(self) -> None:
+        client = _client([{"data": []}], [])
+        df = await client.get_fin_summary(code="7203")
+        await client.aclose()
+
+        assert df.empty
+        assert "DiscDate" in df.columns
+
+    async def test_http_error_is_raised(self) -> None:
+        client = AsyncJQuantsClient(
+            api_key="test_token", transport=httpx.MockTransport(lambda request: httpx.Response(429))
+        )
+        try:
+            await client.get_eq_master(code="7203")
+        except httpx.HTTPStatusError as exc:
+            assert exc.response.status_code == 429
+        else:
+            raise AssertionError("HTTPStatusError が送出されませんでした")
+        finally:
+            await client.aclose()
@@ -12,6 +12,7 @@ from app.jquants_client import (
     _write_cache,
     get_cache_stats,
     get_daily_quotes,
+    get_financial_statements,
     get_stock_master,
 )
 
@@ -24,17 +25,36 @@ class TestCacheOperations:
         path2 = _cache_path("master", "code=9984")
         assert path1 != path2
         assert path1.name.startswith("master_")
-        assert path1.suffix == ".csv"
+        assert path1.suffix == ".arrow"
 
     def test_cache_path_same_params_same_path(self) -> None:
         path1 = _cache_path("daily", "code=7203&from=20240101")
         path2 = _cache_path("daily", "code=7203&from=20240101")
         assert path1 == path2
 
+    def test_cache_path_is_keyed_by_published_trading_day(self) -> None:
+        """休業日や公開時刻前はファイル名の日付が前営業日のままで、同じキャッシュを使う。"""
+        from datetime import datetime
+
+        from app.market_calendar import JST
+
+        paths = set()
+        for now in [datetime(2024, 1, 6, 12, tzinfo=JST), datetime(2024, 1, 9, 9, tzinfo=JST)]:
+            with patch("app.market_calendar.datetime") as mock_datetime:
+                mock_datetime.now.return_value = now
+                mock_datetime.combine = datetime.combine
+                paths.add(_cache_path("master", "code=7203"))
+        assert len(paths) == 1
+        assert paths.pop().stem.endswith("_20240105")
+
     def test_read_cache_returns_none_when_no_file(self, tmp_path: Path) -> None:
         result = _read_cache(tmp_path / "nonexistent.csv")
         assert result is None
 
+    def test_cache_path_follows_configured_format(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("app.config.settings.cache_format", "parquet")
+        assert _cache_path("master", "code=7203").suffix == ".parquet"
+
     def test_write_and_read_cache(self, tmp_path: Path) -> None:
         path = tmp_path / "test_cache.csv"
         df = pd.DataFrame({"Code": ["7203", "9984"], "Name": ["Toyota", "SoftBank"]})
@@ -65,7 +85,7 @@ class TestCacheOperations:
     def test_get_daily_quotes_caches_result(self, mock_get_client: MagicMock) -> None:
         mock_client = MagicMock()
         mock_client.get_eq_bars_daily.return_value = pd.DataFrame(
-            {"Date": ["2024-01-01"], "Code": ["7203"], "Close": [3000.0]}
+            {"Date": ["2024-01-31"], "Code": ["7203"], "Close": [3000.0]}
         )
         mock_get_client.return_value = mock_client
 
@@ -109,8 +129,11 @@ class TestCacheRobustness:
         assert result is None or isinstance(result, pd.DataFrame)
 
     @patch("app.jquants_client._get_client")
-    def test_empty_api_response_not_cached(self, mock_get_client: MagicMock) -> None:
-        """APIが空のDataFrameを返した場合、キャッシュに保存されず再問い合わせされる。"""
+    def test_empty_api_response_not_cached(self, mock_get_client: MagicMock, monkeypatch: pytest.MonkeyPatch) -> None:
+        """APIが空のDataFrameを返した場合、キャッシュに保存されず再問い合わせされる（負のキャッシュ無効時）。"""
+        from app.jquants_client import _negative_cache
+
+        monkeypatch.setattr(_negative_cache, "ttl_seconds", 0)
         mock_client = MagicMock()
         mock_client.get_eq_master.return_value = pd.DataFrame({"Code": pd.Series([], dtype="str")})
         mock_get_client.return_value = mock_client
@@ -209,3 +232,546 @@ class TestCacheStats:
             stats = get_cache_stats()
             assert stats["file_count"] == 1
             assert stats["total_size_bytes"] > 0
+
+
+class TestMemoryTier:
+    """ディスクキャッシュ手前のメモリ層のテスト。"""
+
+    @patch("app.jquants_client._get_client")
+    def test_memory_tier_serves_without_disk(self, mock_get_client: MagicMock) -> None:
+        """メモリ層にあればディスクのキャッシュファイルを読まずに返す。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_master.return_value = pd.DataFrame({"Code": ["7203"], "CoName": ["トヨタ自動車"]})
+        mock_get_client.return_value = mock_client
+
+        get_stock_master()
+        with patch("app.jquants_client._read_cache") as mock_read_cache:
+            result = get_stock_master()
+            mock_read_cache.assert_not_called()
+        assert len(result) == 1
+        assert mock_client.get_eq_master.call_count == 1
+
+    @patch("app.jquants_client._get_client")
+    def test_disk_hit_is_promoted_to_memory(self, mock_get_client: MagicMock) -> None:
+        """ディスクから読んだキャッシュはメモリ層に昇格される。"""
+        from app.jquants_client import _memory_cache
+
+        mock_client = MagicMock()
+        mock_client.get_eq_master.return_value = pd.DataFrame({"Code": ["7203"], "CoName": ["トヨタ自動車"]})
+        mock_get_client.return_value = mock_client
+
+        get_stock_master()
+        _memory_cache.clear()
+        get_stock_master()  # ディスクから読み、メモリ層へ昇格
+        get_stock_master()  # メモリ層から返る
+        stats = get_cache_stats()["memory"]
+        assert stats["hits"] == 1
+        assert stats["entries"] == 1
+        assert mock_client.get_eq_master.call_count == 1
+
+    def test_cache_stats_include_memory_counters(self) -> None:
+        stats = get_cache_stats()["memory"]
+        for key in ("entries", "size_bytes", "hits", "misses", "evictions"):
+            assert key in stats
+
+
+class TestTypedCacheFormat:
+    """型付き列指向キャッシュ形式のテスト。"""
+
+    def _daily_df(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "Date": pd.to_datetime(["2024-01-04", "2024-01-05"]),
+                "Code": ["01300", "130A0"],
+                "AdjC": [3000.0, 3010.5],
+            }
+        )
+
+    @pytest.mark.parametrize("suffix", [".arrow", ".parquet"])
+    def test_round_trip_keeps_types(self, tmp_path: Path, suffix: str) -> None:
+        """先頭ゼロ・英字を含む銘柄コードと日付型が保持される。"""
+        path = tmp_path / f"daily_abcd1234_20240105{suffix}"
+        _write_cache(path, self._daily_df())
+
+        result = _read_cache(path)
+        assert result is not None
+        assert result["Code"].tolist() == ["01300", "130A0"]
+        assert pd.api.types.is_datetime64_any_dtype(result["Date"])
+        assert result["AdjC"].dtype == "float64"
+
+    def test_legacy_csv_is_migrated_on_first_read(self, tmp_path: Path) -> None:
+        """同じキーの旧CSVキャッシュは初回読み込み時に設定形式へ移行される。"""
+        path = tmp_path / "daily_abcd1234_20240105.arrow"
+        legacy = path.with_suffix(".csv")
+        self._daily_df().to_csv(legacy, index=False)
+
+        result = _read_cache(path)
+        assert result is not None
+        assert result["Code"].tolist() == ["01300", "130A0"]
+        assert pd.api.types.is_datetime64_any_dtype(result["Date"])
+        assert path.exists()
+        assert not legacy.exists()
+
+    def test_corrupted_arrow_file_is_removed(self, tmp_path: Path) -> None:
+        path = tmp_path / "daily_abcd1234_20240105.arrow"
+        path.write_bytes(b"\x00\x01\x02\x03")
+        assert _read_cache(path) is None
+        assert not path.exists()
+
+    def test_arrow_cache_is_written_in_uncompressed_batches(self, tmp_path: Path) -> None:
+        """圧縮せずに batch_rows 行ごとのレコードバッチで書き、バッチ単位で読み進められる。"""
+        import pyarrow as pa
+
+        from app.cache_format import ArrowIpcFormat
+
+        n = ArrowIpcFormat.batch_rows * 2 + 10
+        df = pd.DataFrame(
+            {
+                "Date": pd.date_range("2000-01-03", periods=n, freq="B"),
+                "Code": ["72030"] * n,
+                "AdjC": [3000.0 + (i % 100) for i in range(n)],
+            }
+        )
+        path = tmp_path / "daily_abcd1234_20240105.arrow"
+        _write_cache(path, df)
+
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            assert [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)] == [
+                ArrowIpcFormat.batch_rows,
+                ArrowIpcFormat.batch_rows,
+                10,
+            ]
+            # 圧縮していないので、バッチを読んでもマップしたファイルを指すだけでメモリを確保しない
+            allocated = pa.total_allocated_bytes()
+            assert reader.get_batch(1).column(2).to_pylist()[0] == 3000.0 + ArrowIpcFormat.batch_rows % 100
+            assert pa.total_allocated_bytes() == allocated
+        batches = ArrowIpcFormat().iter_batches(path, "daily", 4000)
+        assert next(batches).num_rows == 4000
+
+
+class TestDailyStore:
+    """期間を意識した日足ストアのテスト。"""
+
+    def _bars(self, dates: list[str], factor: float = 1.0) -> pd.DataFrame:
+        return pd.DataFrame({"Date": dates, "Code": "72030", "AdjC": 3000.0, "AdjFactor": factor})
+
+    @patch("app.jquants_client._get_client")
+    def test_sub_range_is_served_from_store(self, mock_get_client: MagicMock) -> None:
+        """取得済み期間に含まれる部分期間はAPIを呼ばずスライスで返す。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.return_value = self._bars(["2024-01-04", "2024-01-05", "2024-02-29"])
+        mock_get_client.return_value = mock_client
+
+        get_daily_quotes("72030", "20240101", "20240229")
+        result = get_daily_quotes("72030", "20240201", "20240229")
+
+        assert mock_client.get_eq_bars_daily.call_count == 1
+        assert len(result) == 1
+
+    @patch("app.jquants_client._get_client")
+    def test_only_missing_edge_is_fetched(self, mock_get_client: MagicMock) -> None:
+        """期間を延ばしたときは未取得の端だけをAPIから取得してマージする。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = [
+            self._bars(["2024-01-04", "2024-01-31"]),
+            self._bars(["2024-02-01"]),
+        ]
+        mock_get_client.return_value = mock_client
+
+        get_daily_quotes("72030", "20240101", "20240131")
+        result = get_daily_quotes("72030", "20240101", "20240229")
+
+        second_call = mock_client.get_eq_bars_daily.call_args_list[1]
+        assert second_call.kwargs["from_yyyymmdd"] == "20240201"
+        assert second_call.kwargs["to_yyyymmdd"] == "20240229"
+        assert len(result) == 3
+
+    @patch("app.jquants_client._get_client")
+    def test_store_survives_memory_clear(self, mock_get_client: MagicMock) -> None:
+        """ストアとカバレッジはディスクからも復元される。"""
+        from app.jquants_client import _memory_cache
+
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.return_value = self._bars(["2024-01-05", "2024-01-31"])
+        mock_get_client.return_value = mock_client
+
+        get_daily_quotes("72030", "20240101", "20240131")
+        _memory_cache.clear()
+        result = get_daily_quotes("72030", "20240105", "20240110")
+
+        assert mock_client.get_eq_bars_daily.call_count == 1
+        assert len(result) == 1
+
+    @patch("app.jquants_client._get_client")
+    def test_data_version_changes_when_store_is_updated(self, mock_get_client: MagicMock) -> None:
+        """日足の世代はストアの保存ごとに変わり、ディスクから読み直しても同じ値になる。"""
+        from app.jquants_client import _memory_cache, daily_data_version
+
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = [
+            self._bars(["2024-01-04", "2024-01-31"]),
+            self._bars(["2024-02-01"]),
+        ]
+        mock_get_client.return_value = mock_client
+
+        first = daily_data_version(get_daily_quotes("72030", "20240101", "20240131"))
+        assert first is not None
+        assert daily_data_version(get_daily_quotes("72030", "20240104", "20240105")) == first
+        _memory_cache.clear()
+        assert daily_data_version(get_daily_quotes("72030", "20240101", "20240131")) == first
+
+        updated = daily_data_version(get_daily_quotes("72030", "20240101", "20240229"))
+        assert updated not in (None, first)
+
+    @patch("app.jquants_client._get_client")
+    def test_corporate_action_rebuilds_store(self, mock_get_client: MagicMock) -> None:
+        """新しい日足に調整係数の変更があればリクエスト期間を取り直す。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = [
+            self._bars(["2024-01-04", "2024-01-05"]),
+            self._bars(["2024-02-01"], factor=0.5),
+            self._bars(["2024-01-04", "2024-01-05", "2024-02-01"]),
+        ]
+        mock_get_client.return_value = mock_client
+
+        get_daily_quotes("72030", "20240101", "20240131")
+        result = get_daily_quotes("72030", "20240101", "20240229")
+
+        assert mock_client.get_eq_bars_daily.call_count == 3
+        third_call = mock_client.get_eq_bars_daily.call_args_list[2]
+        assert third_call.kwargs["from_yyyymmdd"] == "20240101"
+        assert len(result) == 3
+
+    @patch("app.jquants_client._get_client")
+    def test_unreturned_tail_is_fetched_again(self, mock_get_client: MagicMock) -> None:
+        """上流が期間の末尾の日足をまだ返さなければ、末尾は取得済みにせず次回取り直す。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = [
+            self._bars(["2024-01-04", "2024-01-05"]),
+            self._bars(["2024-01-09", "2024-01-31"]),
+        ]
+        mock_get_client.return_value = mock_client
+
+        assert len(get_daily_quotes("72030", "20240101", "20240131")) == 2
+        result = get_daily_quotes("72030", "20240101", "20240131")
+
+        second_call = mock_client.get_eq_bars_daily.call_args_list[1]
+        assert second_call.kwargs["from_yyyymmdd"] == "20240106"
+        assert second_call.kwargs["to_yyyymmdd"] == "20240131"
+        assert len(result) == 4
+        assert len(get_daily_quotes("72030", "20240101", "20240131")) == 4
+        assert mock_client.get_eq_bars_daily.call_count == 2
+
+    @patch("app.jquants_client._get_client")
+    def test_store_written_during_fetch_is_not_lost(self, mock_get_client: MagicMock) -> None:
+        """取得中に別の書き込み（全銘柄の先読み）がストアを更新しても、その日足とカバレッジを失わない。"""
+        from datetime import date
+
+        from app.jquants_client import store_market_bars
+
+        def fetch(**_: str) -> pd.DataFrame:
+            store_market_bars(self._bars(["2024-02-01"]), date(2024, 2, 1), date(2024, 2, 1))
+            return self._bars(["2024-01-04", "2024-01-31"])
+
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = fetch
+        mock_get_client.return_value = mock_client
+
+        assert len(get_daily_quotes("72030", "20240101", "20240131")) == 2
+        result = get_daily_quotes("72030", "20240201", "20240201")
+
+        assert mock_client.get_eq_bars_daily.call_count == 1
+        assert len(result) == 1
+
+
+class TestRequestCoalescing:
+    """同時のキャッシュミスをまとめるテスト。"""
+
+    @patch("app.jquants_client._get_client")
+    def test_concurrent_misses_call_upstream_once(self, mock_get_client: MagicMock) -> None:
+        """同じ銘柄マスタへの同時リクエストはAPIを1回だけ呼ぶ。"""
+        import threading
+        import time
+
+        release = threading.Event()
+
+        def slow_master(code: str = "") -> pd.DataFrame:
+            release.wait(5)
+            return pd.DataFrame({"Code": ["72030"], "CoName": ["トヨタ自動車"]})
+
+        mock_client = MagicMock()
+        mock_client.get_eq_master.side_effect = slow_master
+        mock_get_client.return_value = mock_client
+
+        results: list[pd.DataFrame] = []
+        threads = [threading.Thread(target=lambda: results.append(get_stock_master())) for _ in range(4)]
+        for t in threads:
+            t.start()
+        deadline = time.time() + 5
+        while get_cache_stats()["singleflight"]["coalesced"] < 3 and time.time() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert mock_client.get_eq_master.call_count == 1
+        assert len(results) == 4
+        assert all(df["Code"].iloc[0] == "72030" for df in results)
+        assert get_cache_stats()["singleflight"]["coalesced"] == 3
+
+
+class TestRateLimitedClient:
+    """J-Quantsクライアントのレート制限のテスト。"""
+
+    def test_each_http_request_acquires_a_token(self) -> None:
+        """ページングを含むHTTPリクエストごとにトークンを取得する。"""
+        import jquantsapi
+
+        from app.jquants_client import _get_client
+
+        client = _get_client()
+        with (
+            patch("app.jquants_client._get_rate_limiter") as mock_get_limiter,
+            patch.object(jquantsapi.ClientV2, "_get", return_value="response") as mock_get,
+        ):
+            assert client._get("https://example.com", {"code": "7203"}) == "response"
+            mock_get_limiter.return_value.acquire.assert_called_once()
+            mock_get.assert_called_once()
+
+    def test_plan_sets_rate(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        from app.jquants_client import get_rate_limit_stats
+
+        monkeypatch.setattr("app.config.settings.jquants_plan", "light")
+        stats = get_rate_limit_stats()
+        assert stats["plan"] == "light"
+        assert stats["rate_per_minute"] == 60
+        assert stats["expected_wait_seconds"] == 0
+
+
+class TestAsyncGetters:
+    """非同期版の取得関数のテスト。"""
+
+    @patch("app.jquants_client._get_async_client")
+    async def test_master_is_cached(self, mock_get_client: MagicMock) -> None:
+        from unittest.mock import AsyncMock
+
+        from app.jquants_client import get_stock_master_async
+
+        mock_client = MagicMock()
+        mock_client.get_eq_master = AsyncMock(return_value=pd.DataFrame({"Code": ["72030"], "CoName": ["トヨタ"]}))
+        mock_get_client.return_value = mock_client
+
+        first = await get_stock_master_async("7203")
+        second = await get_stock_master_async("7203")
+
+        assert mock_client.get_eq_master.await_count == 1
+        assert first["Code"].tolist() == second["Code"].tolist() == ["72030"]
+
+    @patch("app.jquants_client._get_async_client")
+    async def test_daily_store_is_shared_with_sync_path(self, mock_get_client: MagicMock) -> None:
+        """非同期版で貯めた日足ストアを同期版も使う。"""
+        from unittest.mock import AsyncMock
+
+        from app.jquants_client import get_daily_quotes_async
+
+        bars = pd.DataFrame(
+            {"Date": pd.to_datetime(["2024-01-04", "2024-01-05"]), "Code": ["72030", "72030"], "C": [1.0, 2.0]}
+        )
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily = AsyncMock(return_value=bars)
+        mock_get_client.return_value = mock_client
+
+        df = await get_daily_quotes_async("7203", "20240101", "20240131")
+        assert df["C"].tolist() == [1.0, 2.0]
+
+        with patch("app.jquants_client._get_client") as mock_sync:
+            sliced = get_daily_quotes("7203", "20240105", "20240105")
+            mock_sync.assert_not_called()
+        assert sliced["C"].tolist() == [2.0]
+
+    @patch("app.jquants_client._get_async_client")
+    async def test_concurrent_misses_call_upstream_once(self, mock_get_client: MagicMock) -> None:
+        import asyncio
+
+        from app.jquants_client import get_financial_statements_async
+
+        release = asyncio.Event()
+
+        async def slow_summary(code: str = "") -> pd.DataFrame:
+            await release.wait()
+            return pd.DataFrame({"Code": ["72030"], "DiscNo": ["1"]})
+
+        mock_client = MagicMock()
+        mock_client.get_fin_summary = MagicMock(side_effect=slow_summary)
+        mock_get_client.return_value = mock_client
+
+        tasks = [asyncio.create_task(get_financial_statements_async("7203")) for _ in range(3)]
+        while get_cache_stats()["singleflight"]["coalesced"] < 2:
+            await asyncio.sleep(0.001)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert mock_client.get_fin_summary.call_count == 1
+        assert all(df["Code"].iloc[0] == "72030" for df in results)
+
+
+class TestStaleWhileRevalidate:
+    """古いスナップショットの即時返却とバックグラウンド再取得のテスト。"""
+
+    @patch("app.jquants_client._get_async_client")
+    async def test_previous_generation_is_served_and_refreshed(self, mock_get_client: MagicMock) -> None:
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from app.jquants_client import _revalidations, get_stock_master_async, served_stale
+
+        path = _cache_path("master", "code=7203")
+        old_path = path.with_name(path.name.replace(path.stem.rsplit("_", 1)[1], "20000104"))
+        _write_cache(old_path, pd.DataFrame({"Code": ["72030"], "CoName": ["旧名称"]}))
+        mock_client = MagicMock()
+        mock_client.get_eq_master = AsyncMock(return_value=pd.DataFrame({"Code": ["72030"], "CoName": ["新名称"]}))
+        mock_get_client.return_value = mock_client
+
+        df = await get_stock_master_async("7203")
+
+        assert df["CoName"].tolist() == ["旧名称"]
+        assert served_stale()
+        await asyncio.gather(*_revalidations.values())
+        assert mock_client.get_eq_master.await_count == 1
+        assert _read_cache(path) is not None
+        fresh = await get_stock_master_async("7203")
+        assert fresh["CoName"].tolist() == ["新名称"]
+        assert not fresh.attrs.get("stale")
+
+    @patch("app.jquants_client._get_async_client")
+    async def test_stale_served_while_upstream_fails(self, mock_get_client: MagicMock) -> None:
+        """上流が落ちていても手元の日足を返し、再取得の失敗はリクエストに影響しない。"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from app.jquants_client import _revalidations, _save_daily_store, get_daily_quotes_async
+        from app.market_calendar import latest_published_trading_day
+
+        latest = latest_published_trading_day()
+        bars = pd.DataFrame({"Date": pd.to_datetime(["2024-01-04", "2024-01-05"]), "C": [1.0, 2.0]})
+        _save_daily_store("72030", bars, [(pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-01-05").date())])
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily = AsyncMock(side_effect=ConnectionError("down"))
+        mock_get_client.return_value = mock_client
+
+        df = await get_daily_quotes_async("72030", "20240101", latest.strftime("%Y%m%d"))
+
+        assert df["C"].tolist() == [1.0, 2.0]
+        assert df.attrs["stale"]
+        await asyncio.gather(*_revalidations.values())
+        assert mock_client.get_eq_bars_daily.await_count == 1
+
+    @patch("app.jquants_client._get_client")
+    def test_breaker_stops_calling_upstream(self, mock_get_client: MagicMock) -> None:
+        from app.circuit_breaker import CircuitOpenError
+        from app.jquants_client import get_circuit_breaker_stats
+
+        mock_client = MagicMock()
+        mock_client.get_eq_master.side_effect = ConnectionError("down")
+        mock_get_client.return_value = mock_client
+
+        for i in range(5):
+            with pytest.raises(ConnectionError):
+                get_stock_master(f"{i}")
+        with pytest.raises(CircuitOpenError):
+            get_stock_master("9999")
+
+        assert mock_client.get_eq_master.call_count == 5
+        assert get_circuit_breaker_stats()["state"] == "open"
+
+    @patch("app.jquants_client._get_client")
+    def test_client_errors_do_not_trip_breaker(self, mock_get_client: MagicMock) -> None:
+        from app.jquants_client import get_circuit_breaker_stats
+
+        response = Response()
+        response.status_code = 400
+        mock_client = MagicMock()
+        mock_client.get_eq_master.side_effect = HTTPError(response=response)
+        mock_get_client.return_value = mock_client
+
+        for i in range(6):
+            with pytest.raises(HTTPError):
+                get_stock_master(f"{i}")
+
+        assert get_circuit_breaker_stats()["state"] == "closed"
+
+
+class TestNegativeResults:
+    """空の結果と未知の銘柄コードのテスト。"""
+
+    @patch("app.jquants_client._get_client")
+    def test_empty_result_is_remembered(self, mock_get_client: MagicMock) -> None:
+        """空の結果はディスクに保存しないが、TTLの間は上流を呼ばない。"""
+        mock_client = MagicMock()
+        mock_client.get_fin_summary.return_value = pd.DataFrame()
+        mock_get_client.return_value = mock_client
+
+        assert get_financial_statements("9999").empty
+        assert get_financial_statements("9999").empty
+
+        assert mock_client.get_fin_summary.call_count == 1
+        assert _read_cache(_cache_path("financials", "code=9999")) is None
+        assert get_cache_stats()["negative"]["hits"] == 1
+
+    @patch("app.jquants_client._get_client")
+    def test_not_found_is_treated_as_empty(self, mock_get_client: MagicMock) -> None:
+        response = Response()
+        response.status_code = 404
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = HTTPError(response=response)
+        mock_get_client.return_value = mock_client
+
+        assert get_daily_quotes("9999", "20240101", "20240131").empty
+        assert get_daily_quotes("9999", "20240101", "20240131").empty
+
+        assert mock_client.get_eq_bars_daily.call_count == 1
+
+    @patch("app.jquants_client._get_client")
+    def test_negative_entry_expires(self, mock_get_client: MagicMock) -> None:
+        from app.jquants_client import _negative_cache
+
+        mock_client = MagicMock()
+        mock_client.get_fin_summary.return_value = pd.DataFrame()
+        mock_get_client.return_value = mock_client
+        now = [0.0]
+
+        with patch.object(_negative_cache, "_clock", lambda: now[0]):
+            get_financial_statements("9999")
+            now[0] += _negative_cache.ttl_seconds + 1
+            get_financial_statements("9999")
+
+        assert mock_client.get_fin_summary.call_count == 2
+
+    @patch("app.jquants_client._get_client")
+    def test_unknown_code_is_rejected_before_upstream(self, mock_get_client: MagicMock) -> None:
+        """全銘柄マスタが手元にあれば、載っていないコードは上流を呼ばずに空を返す。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_master.return_value = pd.DataFrame({"Code": ["72030"], "CoName": ["トヨタ自動車"]})
+        mock_client.get_eq_bars_daily.return_value = pd.DataFrame(
+            {"Date": pd.to_datetime(["2024-01-04"]), "Code": ["72030"], "C": [1.0]}
+        )
+        mock_get_client.return_value = mock_client
+        get_stock_master()
+
+        assert get_daily_quotes("0000", "20240101", "20240131").empty
+        assert get_financial_statements("0000").empty
+        mock_client.get_eq_bars_daily.assert_not_called()
+        mock_client.get_fin_summary.assert_not_called()
+
+        # 4桁コードは末尾0の5桁コードとして照合する
+        assert not get_daily_quotes("7203", "20240101", "20240131").empty
+
+    @patch("app.jquants_client._get_client")
+    def test_codes_are_not_checked_without_master(self, mock_get_client: MagicMock) -> None:
+        mock_client = MagicMock()
+        mock_client.get_fin_summary.return_value = pd.DataFrame({"Code": ["00000"], "DiscNo": ["1"]})
+        mock_get_client.return_value = mock_client
+
+        assert not get_financial_statements("0000").empty
+        mock_client.get_eq_master.assert_not_called()
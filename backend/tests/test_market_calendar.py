@@ -0,0 +1,68 @@
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+from app.market_calendar import (
+    JST,
+    _load_holidays,
+    is_trading_day,
+    latest_published_trading_day,
+    next_publication_at,
+    trading_days,
+)
+
+
+class TestTradingDays:
+    """営業日判定のテスト。"""
+
+    def test_weekend_and_holidays_are_closed(self) -> None:
+        assert is_trading_day(date(2024, 1, 9))
+        assert not is_trading_day(date(2024, 1, 6))  # 土曜
+        assert not is_trading_day(date(2024, 1, 8))  # 成人の日
+        assert not is_trading_day(date(2024, 1, 3))  # 年始休業日
+        assert not is_trading_day(date(2026, 9, 22))  # 国民の休日
+
+    def test_outside_calendar_falls_back_to_weekends_and_year_end(self) -> None:
+        assert is_trading_day(date(2035, 1, 9))
+        assert not is_trading_day(date(2035, 1, 2))
+        assert not is_trading_day(date(2035, 1, 6))  # 土曜
+
+    def test_trading_days_in_range(self) -> None:
+        assert trading_days(date(2024, 5, 2), date(2024, 5, 7)) == [date(2024, 5, 2), date(2024, 5, 7)]
+
+    def test_custom_calendar_file(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        path = tmp_path / "holidays.csv"
+        path.write_text("date,name\n2024-01-09,臨時休業\n", encoding="utf-8")
+        monkeypatch.setattr("app.config.settings.market_calendar_path", str(path))
+        _load_holidays.cache_clear()
+
+        assert not is_trading_day(date(2024, 1, 9))
+        assert is_trading_day(date(2024, 1, 8))
+
+
+class TestPublication:
+    """データ公開時刻に基づく最新営業日のテスト。"""
+
+    def test_before_cutoff_uses_previous_trading_day(self) -> None:
+        assert latest_published_trading_day(datetime(2024, 1, 10, 9, 0, tzinfo=JST)) == date(2024, 1, 9)
+        assert latest_published_trading_day(datetime(2024, 1, 10, 17, 0, tzinfo=JST)) == date(2024, 1, 10)
+
+    def test_weekend_and_holiday_keep_last_trading_day(self) -> None:
+        """金曜の公開後から連休明けの公開時刻までは同じ営業日のデータが最新。"""
+        for now in [
+            datetime(2024, 1, 6, 12, 0, tzinfo=JST),
+            datetime(2024, 1, 8, 20, 0, tzinfo=JST),
+            datetime(2024, 1, 9, 16, 0, tzinfo=JST),
+        ]:
+            assert latest_published_trading_day(now) == date(2024, 1, 5)
+        assert next_publication_at(datetime(2024, 1, 6, 12, 0, tzinfo=JST)) == datetime(2024, 1, 9, 16, 30, tzinfo=JST)
+
+    def test_naive_time_is_treated_as_jst(self) -> None:
+        assert latest_published_trading_day(datetime(2024, 1, 10, 17, 0)) == date(2024, 1, 10)
+
+    def test_aware_time_is_converted_to_jst(self) -> None:
+        from datetime import UTC
+
+        # 2024-01-10 08:00 UTC = 17:00 JST
+        assert latest_published_trading_day(datetime(2024, 1, 10, 8, 0, tzinfo=UTC)) == date(2024, 1, 10)
@@ -0,0 +1,74 @@
+import time
+
+import pandas as pd
+
+from app.memory_cache import MemoryCache
+
+
+def _df(n: int = 3) -> pd.DataFrame:
+    return pd.DataFrame({"Code": [str(7203 + i) for i in range(n)], "C": [float(i) for i in range(n)]})
+
+
+class TestMemoryCache:
+    """LRU/TTLメモリキャッシュのテスト。"""
+
+    def test_get_returns_none_when_missing(self) -> None:
+        cache = MemoryCache(max_entries=4, max_bytes=1024 * 1024, ttl_seconds=60)
+        assert cache.get("missing") is None
+        assert cache.stats()["misses"] == 1
+
+    def test_put_and_get(self) -> None:
+        cache = MemoryCache(max_entries=4, max_bytes=1024 * 1024, ttl_seconds=60)
+        cache.put("a", _df())
+        result = cache.get("a")
+        assert result is not None
+        assert len(result) == 3
+        assert cache.stats()["hits"] == 1
+
+    def test_returned_dataframe_is_a_copy(self) -> None:
+        """取得したDataFrameを書き換えてもキャッシュは汚れない。"""
+        cache = MemoryCache(max_entries=4, max_bytes=1024 * 1024, ttl_seconds=60)
+        cache.put("a", _df())
+        first = cache.get("a")
+        assert first is not None
+        first["C"] = -1.0
+        second = cache.get("a")
+        assert second is not None
+        assert (second["C"] >= 0).all()
+
+    def test_lru_eviction_by_entry_count(self) -> None:
+        """エントリ数の上限を超えると最も古く使われたものから追い出す。"""
+        cache = MemoryCache(max_entries=2, max_bytes=1024 * 1024, ttl_seconds=60)
+        cache.put("a", _df())
+        cache.put("b", _df())
+        cache.get("a")  # aを最近使用済みにする
+        cache.put("c", _df())
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_eviction_by_size(self) -> None:
+        """合計バイト数の上限を超えると追い出す。"""
+        one_size = int(_df(100).memory_usage(index=True, deep=True).sum())
+        cache = MemoryCache(max_entries=10, max_bytes=one_size * 2, ttl_seconds=60)
+        cache.put("a", _df(100))
+        cache.put("b", _df(100))
+        cache.put("c", _df(100))
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["size_bytes"] <= one_size * 2
+        assert cache.get("a") is None
+
+    def test_oversized_entry_is_not_stored(self) -> None:
+        cache = MemoryCache(max_entries=10, max_bytes=10, ttl_seconds=60)
+        cache.put("a", _df(100))
+        assert cache.stats()["entries"] == 0
+
+    def test_expires_at_shortens_ttl(self) -> None:
+        """expires_atを過ぎたエントリは返さない。"""
+        cache = MemoryCache(max_entries=4, max_bytes=1024 * 1024, ttl_seconds=60)
+        cache.put("a", _df(), expires_at=time.time() - 1)
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["entries"] == 0
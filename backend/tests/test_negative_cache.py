@@ -0,0 +1,37 @@
+from app.negative_cache import NegativeCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestNegativeCache:
+    """負のキャッシュのテスト。"""
+
+    def test_entry_expires_after_ttl(self) -> None:
+        clock = FakeClock()
+        cache = NegativeCache(ttl_seconds=60, clock=clock)
+        cache.add("k")
+        assert "k" in cache
+        clock.now += 61
+        assert "k" not in cache
+        assert cache.stats()["entries"] == 0
+
+    def test_zero_ttl_disables(self) -> None:
+        cache = NegativeCache(ttl_seconds=0)
+        cache.add("k")
+        assert "k" not in cache
+
+    def test_oldest_entry_is_evicted(self) -> None:
+        cache = NegativeCache(ttl_seconds=60, max_entries=2)
+        cache.add("a")
+        cache.add("b")
+        cache.add("c")
+        assert "a" not in cache
+        assert "b" in cache
+        assert "c" in cache
+        assert cache.stats()["hits"] == 2
@@ -0,0 +1,146 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.jquants_client import get_daily_quotes
+from app.main import app
+from app.prefetch.service import get_prefetch_status, load_market_coverage, prefetch_market, resolve_range
+
+
+def _market_bars(date_yyyymmdd: str = "", **_: str) -> pd.DataFrame:
+    """指定日の全銘柄（2銘柄）の日足を返すモック。"""
+    day = pd.Timestamp(date_yyyymmdd)
+    return pd.DataFrame(
+        {
+            "Date": [day, day],
+            "Code": ["72030", "99840"],
+            "C": [float(day.day), float(day.day) * 10],
+            "AdjFactor": [1.0, 1.0],
+        }
+    )
+
+
+class TestPrefetchMarket:
+    """全銘柄の日足の先読みのテスト。"""
+
+    @patch("app.jquants_client._get_client")
+    def test_one_request_per_weekday(self, mock_get_client: MagicMock) -> None:
+        """土日・祝日を除く営業日ごとに1回だけ取得する。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = _market_bars
+        mock_get_client.return_value = mock_client
+
+        # 2024-01-06(土) - 2024-01-09(火): 1/8は成人の日なので営業日は1/9だけ
+        status = prefetch_market(date(2024, 1, 6), date(2024, 1, 9))
+
+        assert mock_client.get_eq_bars_daily.call_count == 1
+        assert status["done_dates"] == 1
+        mock_client.reset_mock()
+
+        # 2024-01-12(金) - 2024-01-16(火): 営業日は3日
+        status = prefetch_market(date(2024, 1, 12), date(2024, 1, 16))
+
+        assert mock_client.get_eq_bars_daily.call_count == 3
+        assert status["state"] == "done"
+        assert status["done_dates"] == 3
+        assert status["codes_updated"] == 2
+        assert load_market_coverage() == [(date(2024, 1, 6), date(2024, 1, 9)), (date(2024, 1, 12), date(2024, 1, 16))]
+
+    @patch("app.jquants_client._get_client")
+    def test_bars_are_sharded_into_per_code_store(self, mock_get_client: MagicMock) -> None:
+        """振り分けた日足は銘柄別の取得で上流を呼ばずに使える。"""
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = _market_bars
+        mock_get_client.return_value = mock_client
+        prefetch_market(date(2024, 1, 12), date(2024, 1, 16))
+        mock_client.reset_mock()
+
+        df = get_daily_quotes("99840", "20240112", "20240116")
+
+        mock_client.get_eq_bars_daily.assert_not_called()
+        assert df["C"].tolist() == [120.0, 150.0, 160.0]
+
+    @patch("app.jquants_client._get_client")
+    def test_only_missing_dates_are_fetched(self, mock_get_client: MagicMock) -> None:
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = _market_bars
+        mock_get_client.return_value = mock_client
+        prefetch_market(date(2024, 1, 15), date(2024, 1, 16))
+        mock_client.reset_mock()
+
+        prefetch_market(date(2024, 1, 15), date(2024, 1, 17))
+
+        assert [c.kwargs["date_yyyymmdd"] for c in mock_client.get_eq_bars_daily.call_args_list] == ["20240117"]
+        assert load_market_coverage() == [(date(2024, 1, 15), date(2024, 1, 17))]
+
+    @patch("app.jquants_client._get_client")
+    def test_failure_keeps_completed_chunks(self, mock_get_client: MagicMock) -> None:
+        """途中で失敗しても書き出し済みのチャンクは取得済みとして残る。"""
+
+        def flaky(date_yyyymmdd: str = "", **_: str) -> pd.DataFrame:
+            if date_yyyymmdd == "20240117":
+                raise RuntimeError("upstream down")
+            return _market_bars(date_yyyymmdd)
+
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = flaky
+        mock_get_client.return_value = mock_client
+
+        status = prefetch_market(date(2024, 1, 15), date(2024, 1, 17), chunk_days=1)
+
+        assert status["state"] == "failed"
+        assert "upstream down" in status["error"]
+        assert load_market_coverage() == [(date(2024, 1, 15), date(2024, 1, 16))]
+
+    @patch("app.jquants_client._get_client")
+    def test_unpublished_dates_stay_missing(self, mock_get_client: MagicMock) -> None:
+        """日足が返らなかった末尾の日付は取得済みにせず、次回取り直す。"""
+
+        def delayed(date_yyyymmdd: str = "", **_: str) -> pd.DataFrame:
+            if date_yyyymmdd >= "20240117":
+                return pd.DataFrame()
+            return _market_bars(date_yyyymmdd)
+
+        mock_client = MagicMock()
+        mock_client.get_eq_bars_daily.side_effect = delayed
+        mock_get_client.return_value = mock_client
+
+        prefetch_market(date(2024, 1, 15), date(2024, 1, 18))
+
+        assert load_market_coverage() == [(date(2024, 1, 15), date(2024, 1, 16))]
+        mock_client.reset_mock()
+        mock_client.get_eq_bars_daily.side_effect = _market_bars
+        prefetch_market(date(2024, 1, 15), date(2024, 1, 18))
+        assert [c.kwargs["date_yyyymmdd"] for c in mock_client.get_eq_bars_daily.call_args_list] == [
+            "20240117",
+            "20240118",
+        ]
+
+    def test_status_reports_upstream_budget(self) -> None:
+        status = get_prefetch_status()
+        assert "remaining_dates" in status
+        assert "estimated_remaining_seconds" in status
+        assert "expected_wait_seconds" in status["rate_limit"]
+
+    def test_resolve_range(self) -> None:
+        assert resolve_range(0, "20240101", "20240131") == (date(2024, 1, 1), date(2024, 1, 31))
+        start, end = resolve_range(10)
+        assert (end - start).days == 9
+
+
+class TestPrefetchEndpoint:
+    """/api/prefetch のテスト。"""
+
+    @patch("app.prefetch.router.start_prefetch_in_background", return_value=True)
+    def test_post_starts_background_prefetch(self, mock_start: MagicMock) -> None:
+        response = TestClient(app).post("/api/prefetch", params={"from": "20240101", "to": "20240131"})
+        assert response.status_code == 202
+        assert response.json()["started"] is True
+        mock_start.assert_called_once_with(date(2024, 1, 1), date(2024, 1, 31))
+
+    def test_get_returns_status(self) -> None:
+        response = TestClient(app).get("/api/prefetch")
+        assert response.status_code == 200
+        assert "state" in response.json()
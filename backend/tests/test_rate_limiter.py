@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+
+from app.rate_limiter import RateLimitTimeoutError, TokenBucket
+
+
+class FakeClock:
+    """sleepすると時刻が進むテスト用の時計。"""
+
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+        self.sleeps: list[float] = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _bucket(tmp_path: Path, clock: FakeClock, rate: float = 5, capacity: float = 1) -> TokenBucket:
+    return TokenBucket(
+        tmp_path / "rl.sqlite3", rate_per_minute=rate, capacity=capacity, clock=clock.time, sleep=clock.sleep
+    )
+
+
+class TestTokenBucket:
+    """SQLite共有トークンバケットのテスト。"""
+
+    def test_first_request_does_not_wait(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        bucket = _bucket(tmp_path, clock)
+        assert bucket.acquire() == 0
+        assert clock.sleeps == []
+
+    def test_requests_are_spaced_by_rate(self, tmp_path: Path) -> None:
+        """5回/分なら2回目以降は12秒間隔になる。"""
+        clock = FakeClock()
+        bucket = _bucket(tmp_path, clock)
+        waits = [bucket.acquire() for _ in range(3)]
+        assert waits[0] == 0
+        assert waits[1] == pytest.approx(12)
+        assert waits[2] == pytest.approx(12)
+
+    def test_tokens_refill_over_time(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        bucket = _bucket(tmp_path, clock)
+        bucket.acquire()
+        clock.now += 12
+        assert bucket.expected_wait() == 0
+        assert bucket.acquire() == 0
+
+    def test_burst_capacity(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        bucket = _bucket(tmp_path, clock, rate=60, capacity=3)
+        assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+        assert bucket.acquire() == pytest.approx(1)
+
+    def test_state_is_shared_between_instances(self, tmp_path: Path) -> None:
+        """同じDBを使う別インスタンス（別ワーカー）とトークンを共有する。"""
+        clock = FakeClock()
+        worker_a = _bucket(tmp_path, clock)
+        worker_b = _bucket(tmp_path, clock)
+        worker_a.acquire()
+        assert worker_b.expected_wait() == pytest.approx(12)
+
+    def test_max_wait_raises_without_reserving(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        bucket = _bucket(tmp_path, clock)
+        bucket.acquire()
+        with pytest.raises(RateLimitTimeoutError) as exc_info:
+            bucket.acquire(max_wait=5)
+        assert exc_info.value.expected_wait == pytest.approx(12)
+        # 予約していないので待ち時間の見込みは変わらない
+        assert bucket.expected_wait() == pytest.approx(12)
+        assert bucket.stats()["timeouts"] == 1
+
+    def test_stats(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        bucket = _bucket(tmp_path, clock)
+        bucket.acquire()
+        bucket.acquire()
+        stats = bucket.stats()
+        assert stats["rate_per_minute"] == 5
+        assert stats["acquired"] == 2
+        assert stats["total_wait_seconds"] == pytest.approx(12)
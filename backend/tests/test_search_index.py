@@ -0,0 +1,74 @@
+from app.stocks.search_index import SearchIndex, normalize
+
+
+def _records() -> list[dict[str, str]]:
+    return [
+        {"code": "72030", "company_name": "トヨタ自動車", "company_name_english": "TOYOTA MOTOR CORPORATION"},
+        {"code": "72040", "company_name": "ダイハツ工業", "company_name_english": "DAIHATSU MOTOR"},
+        {"code": "99840", "company_name": "ソフトバンクグループ", "company_name_english": "SoftBank Group Corp."},
+        {"code": "94340", "company_name": "ソフトバンク", "company_name_english": "SoftBank Corp."},
+        {"code": "67580", "company_name": "ソニーグループ", "company_name_english": "SONY GROUP CORPORATION"},
+    ]
+
+
+class TestNormalize:
+    """検索用の正規化のテスト。"""
+
+    def test_width_case_and_kana_are_unified(self) -> None:
+        assert normalize("ＴＯＹＯＴＡ") == normalize("toyota")
+        assert normalize("ﾄﾖﾀ") == normalize("トヨタ") == normalize("とよた")
+        assert normalize("７２０３") == "7203"
+
+
+class TestSearchIndex:
+    """銘柄マスタの検索インデックスのテスト。"""
+
+    def test_exact_code_ranks_first(self) -> None:
+        index = SearchIndex(_records())
+        results, total = index.search("7203")
+        assert [r["code"] for r in results] == ["72030"]
+        assert total == 1
+
+    def test_code_prefix(self) -> None:
+        results, _ = SearchIndex(_records()).search("720")
+        assert [r["code"] for r in results] == ["72030", "72040"]
+
+    def test_prefix_ranks_before_substring(self) -> None:
+        """「ソフトバンク」は前方一致の2件、「グループ」は部分一致のみ。"""
+        index = SearchIndex(_records())
+        results, _ = index.search("ソフトバンク")
+        assert [r["code"] for r in results] == ["94340", "99840"]
+        results, _ = index.search("グループ")
+        assert [r["code"] for r in results] == ["67580", "99840"]
+
+    def test_matches_english_name_and_normalized_query(self) -> None:
+        index = SearchIndex(_records())
+        assert [r["code"] for r in index.search("motor")[0]] == ["72030", "72040"]
+        assert [r["code"] for r in index.search("ﾄﾖﾀ")[0]] == ["72030"]
+        assert [r["code"] for r in index.search("とよた")[0]] == ["72030"]
+
+    def test_single_character_query(self) -> None:
+        results, total = SearchIndex(_records()).search("ソ")
+        assert total == 3
+        assert [r["code"] for r in results] == ["67580", "94340", "99840"]
+
+    def test_limit_and_offset(self) -> None:
+        index = SearchIndex(_records())
+        results, total = index.search("", limit=2, offset=1)
+        assert total == 5
+        assert [r["code"] for r in results] == ["72030", "72040"]
+
+    def test_no_match(self) -> None:
+        assert SearchIndex(_records()).search("存在しない") == ([], 0)
+
+
+class TestCodeLookup:
+    """銘柄コードでの1件引きのテスト。"""
+
+    def test_get_by_five_and_four_digit_code(self) -> None:
+        index = SearchIndex(_records())
+        toyota = index.get("72030")
+        assert toyota is not None
+        assert toyota["company_name"] == "トヨタ自動車"
+        assert index.get("7203") is toyota
+        assert index.get("0000") is None
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections.abc import Callable
+
+import pytest
+
+from app.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _wait_until(predicate: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise TimeoutError("条件が満たされませんでした")
+        time.sleep(0.001)
+
+
+class TestSingleFlight:
+    """シングルフライトのテスト。"""
+
+    def test_sequential_calls_each_execute(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        assert flight.do("k", lambda: 1) == (1, True)
+        assert flight.do("k", lambda: 2) == (2, True)
+        assert flight.stats()["executions"] == 2
+        assert flight.stats()["coalesced"] == 0
+
+    def test_concurrent_calls_share_one_execution(self) -> None:
+        """実行中の同じキーへの呼び出しは完了を待って結果を共有する。"""
+        flight: SingleFlight[int] = SingleFlight()
+        release = threading.Event()
+        calls = 0
+
+        def fetch() -> int:
+            nonlocal calls
+            calls += 1
+            release.wait(5)
+            return 42
+
+        results: list[tuple[int, bool]] = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", fetch))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        _wait_until(lambda: flight.stats()["coalesced"] == 4)
+        assert flight.stats()["waiting"] == 4
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert calls == 1
+        assert sorted(results) == [(42, False)] * 4 + [(42, True)]
+        assert flight.stats()["in_flight"] == 0
+
+    def test_exception_is_shared_with_waiters(self) -> None:
+        """リーダーの例外は待っていた呼び出しにも送出される。"""
+        flight: SingleFlight[int] = SingleFlight()
+        release = threading.Event()
+
+        def fetch() -> int:
+            release.wait(5)
+            raise RuntimeError("upstream down")
+
+        errors: list[BaseException] = []
+
+        def call() -> None:
+            try:
+                flight.do("k", fetch)
+            except RuntimeError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        _wait_until(lambda: flight.stats()["coalesced"] == 2)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert len(errors) == 3
+        with pytest.raises(ValueError):
+            flight.do("k", lambda: (_ for _ in ()).throw(ValueError("next call runs again")))
+
+    def test_different_keys_do_not_coalesce(self) -> None:
+        flight: SingleFlight[str] = SingleFlight()
+        assert flight.do("a", lambda: "a")[0] == "a"
+        assert flight.do("b", lambda: "b")[0] == "b"
+        assert flight.stats()["coalesced"] == 0
+
+
+class TestAsyncSingleFlight:
+    """asyncio版シングルフライトのテスト。"""
+
+    async def test_concurrent_calls_share_one_execution(self) -> None:
+        import asyncio
+
+        flight: AsyncSingleFlight[int] = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def slow() -> int:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 42
+
+        tasks = [asyncio.create_task(flight.do("k", slow)) for _ in range(3)]
+        while flight.stats()["coalesced"] < 2:
+            await asyncio.sleep(0)
+        assert flight.stats()["waiting"] == 2
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert sorted(leader for _, leader in results) == [False, False, True]
+        assert all(value == 42 for value, _ in results)
+        assert flight.stats()["in_flight"] == 0
+
+    async def test_error_is_shared_with_waiters(self) -> None:
+        import asyncio
+
+        flight: AsyncSingleFlight[int] = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def failing() -> int:
+            await release.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.create_task(flight.do("k", failing)) for _ in range(2)]
+        while flight.stats()["coalesced"] < 1:
+            await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flight.stats()["in_flight"] == 0
+
+    async def test_leader_cancellation_hands_over_to_a_waiter(self) -> None:
+        """リーダーだけがキャンセルされたら、待っていた呼び出しの1つが実行し直し、残りはその結果を受け取る。"""
+        import asyncio
+
+        flight: AsyncSingleFlight[int] = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def slow() -> int:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        leader = asyncio.create_task(flight.do("k", slow))
+        waiters = [asyncio.create_task(flight.do("k", slow)) for _ in range(2)]
+        while flight.stats()["coalesced"] < 2:
+            await asyncio.sleep(0)
+        leader.cancel()
+        while calls < 2:
+            await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert leader.cancelled()
+        assert calls == 2
+        assert sorted(results) == [(2, False), (2, True)]
+        assert flight.stats()["in_flight"] == 0
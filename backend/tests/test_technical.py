@@ -1,7 +1,13 @@
 import numpy as np
 import pandas as pd
+import pytest
+import ta
 
-from app.analysis.technical import compute_technical_indicators
+from app.analysis.technical import (
+    INDICATOR_COLUMNS,
+    compute_technical_indicators,
+    compute_technical_indicators_batch,
+)
 
 
 def _make_price_data(n: int = 100) -> pd.DataFrame:
@@ -78,6 +84,57 @@ class TestTechnicalIndicators:
         assert len(result) == 0
 
 
+def _ta_reference(close: pd.Series) -> pd.DataFrame:
+    """ta ライブラリで計算した指標（エンジンを置き換える前の実装）。"""
+    macd = ta.trend.MACD(close, window_slow=26, window_fast=12, window_sign=9)
+    bb = ta.volatility.BollingerBands(close, window=20, window_dev=2)
+    return pd.DataFrame(
+        {
+            "sma_5": ta.trend.sma_indicator(close, window=5),
+            "sma_25": ta.trend.sma_indicator(close, window=25),
+            "sma_75": ta.trend.sma_indicator(close, window=75),
+            "rsi_14": ta.momentum.rsi(close, window=14),
+            "macd": macd.macd(),
+            "macd_signal": macd.macd_signal(),
+            "macd_histogram": macd.macd_diff(),
+            "bb_upper": bb.bollinger_hband(),
+            "bb_middle": bb.bollinger_mavg(),
+            "bb_lower": bb.bollinger_lband(),
+        }
+    )
+
+
+class TestEquivalenceWithTa:
+    """NumPyエンジンの結果が ta ライブラリと数値的に一致することのテスト。"""
+
+    @pytest.mark.parametrize("n", [1, 13, 14, 26, 34, 75, 250, 5000])
+    def test_random_walk(self, n: int) -> None:
+        close = _make_price_data(n)["close"]
+        actual = compute_technical_indicators(pd.DataFrame({"close": close}))
+        pd.testing.assert_frame_equal(
+            actual[INDICATOR_COLUMNS], _ta_reference(close), check_dtype=False, check_names=False, rtol=1e-9
+        )
+
+    def test_missing_values(self) -> None:
+        """先頭や途中の欠損（売買のない日など）も ta と同じ扱いになる。"""
+        close = _make_price_data(300)["close"]
+        close.iloc[:3] = np.nan
+        close.iloc[[50, 51, 120, 200]] = np.nan
+        actual = compute_technical_indicators(pd.DataFrame({"close": close}))
+        pd.testing.assert_frame_equal(
+            actual[INDICATOR_COLUMNS], _ta_reference(close), check_dtype=False, check_names=False, rtol=1e-9
+        )
+
+    def test_large_price_moves(self) -> None:
+        """値動きが大きく長い系列でも累積和の誤差が許容範囲に収まる。"""
+        np.random.seed(0)
+        close = pd.Series(100.0 * np.cumprod(1 + np.random.normal(0.002, 0.05, 5000)))
+        actual = compute_technical_indicators(pd.DataFrame({"close": close}))
+        pd.testing.assert_frame_equal(
+            actual[INDICATOR_COLUMNS], _ta_reference(close), check_dtype=False, check_names=False, rtol=1e-7
+        )
+
+
 class TestTechnicalIndicatorsEdgeCases:
     """テクニカル指標のエッジケーステスト。"""
 
@@ -205,3 +262,55 @@ class TestTechnicalIndicatorsEdgeCases:
 
         # SMA_25はまだ計算不能
         assert result["sma_25"].isna().all()
+
+
+class TestTechnicalIndicatorsBatch:
+    """複数銘柄をまとめて計算した結果が、銘柄ごとの計算と一致することのテスト。"""
+
+    INDICATORS = [
+        "sma_5",
+        "sma_25",
+        "sma_75",
+        "rsi_14",
+        "macd",
+        "macd_signal",
+        "macd_histogram",
+        "bb_upper",
+        "bb_middle",
+        "bb_lower",
+    ]
+
+    def test_matches_per_code_computation(self) -> None:
+        frames = []
+        for i, n in enumerate([100, 30, 3, 80]):
+            df = _make_price_data(n)
+            df["close"] = df["close"] * (i + 1)
+            frames.append(df.assign(code=f"{i}0000"))
+        # 途中に欠損がある銘柄も同じ扱いになる
+        frames[3].loc[40, "close"] = np.nan
+
+        batch = compute_technical_indicators_batch(pd.concat(frames, ignore_index=True))
+        for frame in frames:
+            expected = compute_technical_indicators(frame.copy())
+            actual = batch[batch["code"] == frame["code"].iloc[0]].reset_index(drop=True)
+            pd.testing.assert_frame_equal(
+                actual[self.INDICATORS], expected[self.INDICATORS], check_dtype=False, check_names=False
+            )
+
+    def test_interleaved_codes_are_grouped(self) -> None:
+        """銘柄の行が交互に並んでいても、銘柄ごとにまとめて計算する。"""
+        first = _make_price_data(40).assign(code="10000")
+        second = _make_price_data(40).assign(code="20000", close=lambda df: df["close"] * 3)
+        df = pd.concat([first, second]).sort_index(kind="stable").reset_index(drop=True)
+
+        batch = compute_technical_indicators_batch(df)
+        for frame in (first, second):
+            expected = compute_technical_indicators(frame.copy())
+            actual = batch[batch["code"] == frame["code"].iloc[0]].reset_index(drop=True)
+            pd.testing.assert_frame_equal(actual[self.INDICATORS], expected[self.INDICATORS], check_dtype=False)
+
+    def test_constant_prices(self) -> None:
+        df = pd.DataFrame({"close": [100.0] * 30, "code": ["72030"] * 30})
+        expected = compute_technical_indicators(df.copy())
+        batch = compute_technical_indicators_batch(df)
+        pd.testing.assert_frame_equal(batch[self.INDICATORS], expected[self.INDICATORS], check_dtype=False)
@@ -4,83 +4,216 @@ processed/daily/ の Parquet データを読み込み、銘柄ごとに
 テクニカル指標（SMA, RSI, MACD, ボリンジャーバンド）を算出し
 analytics/technical/ へ Parquet 形式で出力する。
 
-パーティション: year=YYYY/month=MM/day=DD/
+銘柄ごとの指標の状態（移動平均の窓、EMAの値など）を analytics/state/ のチェックポイントに保存し、
+次の実行ではチェックポイントより後のパーティションの日足だけを読んで状態を進める。長い窓の指標も
+毎回全期間を読み直さずに、全期間を計算し直したときと同じ値になる。チェックポイントがないとき
+（初回）や --FULL_RECOMPUTE true のときは全パーティションを読んで計算し直す。株式分割などで
+過去の調整後株価が変わったときも、全期間を計算し直す必要がある。
 
-テクニカル指標の算出ロジックは backend/app/analysis/technical.py と同一。
+状態のない銘柄は全銘柄の日足を (Code, Date) 順に1度だけ並べ替え、銘柄の境目で窓と再帰の計算を
+やり直す区切り付きの計算で、全銘柄の指標を1回でまとめて求める。
+
+パーティション: year=YYYY/month=MM/day=DD/（読み込んだ日足のパーティションと同じ）
+
+テクニカル指標の算出には backend/app/analysis/indicators.py（指標のレジストリと
+計算エンジン）をそのまま使う。Glue には --extra-py-files で indicators.py として配布する。
+日足のParquetは s3_reader で並列に読み込む（並列数は --READ_PARALLELISM）。
 """
 
+import json
 import logging
 import sys
-from datetime import datetime, timezone, timedelta
 from io import BytesIO
 
 import boto3
+import numpy as np
 import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
-import ta
-
 from awsglue.utils import getResolvedOptions
+from indicators import (
+    DEFAULT_INDICATORS,
+    IndicatorState,
+    compute_indicators,
+    compute_indicators_with_states,
+    output_columns,
+)
+from s3_reader import DEFAULT_READ_PARALLELISM, read_objects, s3_client_config
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-JST = timezone(timedelta(hours=9))
+DAILY_PREFIX = "processed/daily/"
+OUTPUT_PREFIX = "analytics/technical/"
+STATE_KEY = "analytics/state/indicator_state.parquet"
 
+# 読み込んだ行のパーティション。出力先の決定に使い、出力には含めない
+PARTITION_COLUMN = "_partition"
 
-def compute_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    """株価DataFrameにテクニカル指標を追加する。
+# 指標の入力系列と日足のカラムの対応
+SOURCE_COLUMNS = {
+    "open": "AdjO",
+    "high": "AdjH",
+    "low": "AdjL",
+    "close": "AdjC",
+    "volume": "AdjVo",
+}
 
-    backend/app/analysis/technical.py の compute_technical_indicators と同一ロジック。
-    """
-    close = df["AdjC"].astype(float)
 
-    # 移動平均線 (SMA)
-    df["sma_5"] = ta.trend.sma_indicator(close, window=5)
-    df["sma_25"] = ta.trend.sma_indicator(close, window=25)
-    df["sma_75"] = ta.trend.sma_indicator(close, window=75)
+def _sources(df: pd.DataFrame) -> dict:
+    """日足のカラムから指標の入力系列を作る。"""
+    return {
+        name: pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+        for name, column in SOURCE_COLUMNS.items()
+        if column in df.columns
+    }
 
-    # RSI (14日)
-    df["rsi_14"] = ta.momentum.rsi(close, window=14)
 
-    # MACD (12/26/9)
-    macd_indicator = ta.trend.MACD(close, window_slow=26, window_fast=12, window_sign=9)
-    df["macd"] = macd_indicator.macd()
-    df["macd_signal"] = macd_indicator.macd_signal()
-    df["macd_histogram"] = macd_indicator.macd_diff()
+def compute_technical_indicators(df: pd.DataFrame, indicators=DEFAULT_INDICATORS, starts=None) -> pd.DataFrame:
+    """株価DataFrameにテクニカル指標を追加する。
 
-    # ボリンジャーバンド (20日, ±2σ)
-    bb = ta.volatility.BollingerBands(close, window=20, window_dev=2)
-    df["bb_upper"] = bb.bollinger_hband()
-    df["bb_middle"] = bb.bollinger_mavg()
-    df["bb_lower"] = bb.bollinger_lband()
+    backend の compute_technical_indicators と同じエンジン・同じ既定の指標で計算する。
+    starts（各銘柄の先頭の行の位置）を渡すと、複数銘柄を連結したDataFrameとして銘柄ごとに計算する。
+    """
+    values = compute_indicators(_sources(df), indicators, starts)
+    # 列を1つずつ追加するより、まとめて連結する方が速い
+    return pd.concat([df.drop(columns=list(values), errors="ignore"), pd.DataFrame(values, index=df.index)], axis=1)
 
-    return df
 
+def sort_panel(daily: pd.DataFrame) -> tuple:
+    """全銘柄の日足を (Code, Date) 順に並べ、並べた日足と各銘柄の先頭の行の位置を返す。
 
-def get_latest_daily_keys(s3_client, bucket: str) -> list[str]:
-    """processed/daily/ から最新日のParquetファイルキーを取得する。"""
-    prefix = "processed/daily/"
+    同じ銘柄・日付の行が複数あれば後にある行（後のパーティションで取り直した行）だけを残す。
+    銘柄か日付が欠損している行は除く。残る行がなければ空のパネルと空の位置を返す。
+    """
+    # 文字列の列で並べ替えるより、整数の順位にしてから並べ替える方が速い
+    codes, _ = pd.factorize(daily["Code"], sort=True)
+    dates, _ = pd.factorize(daily["Date"], sort=True)
+    rows = np.flatnonzero((codes >= 0) & (dates >= 0))
+    if not len(rows):
+        # 全行の銘柄か日付が欠損していれば、列だけの空のパネルにする
+        return daily.iloc[:0].reset_index(drop=True), np.zeros(0, dtype=np.intp)
+    rows = rows[np.lexsort((dates[rows], codes[rows]))]  # lexsort は安定なので同じキーは元の順に並ぶ
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = (codes[rows][1:] != codes[rows][:-1]) | (dates[rows][1:] != dates[rows][:-1])
+    rows = rows[last]
+    panel = daily.iloc[rows].reset_index(drop=True)
+    starts = np.flatnonzero(np.diff(codes[rows], prepend=-1))
+    return panel, starts
+
+
+def enrich_with_state(daily: pd.DataFrame, states: dict, indicators=DEFAULT_INDICATORS) -> tuple:
+    """状態より後の日足に指標を付けたDataFrameと、最後の日足まで進めた状態を返す。
+
+    states は {銘柄コード: (最後に計算した日付, IndicatorState)}。状態のある銘柄はその日付より後の
+    日足だけを1本ずつ状態を進めて計算し、状態のない銘柄は全銘柄まとめて計算して状態を作る。
+    states の IndicatorState はその場で進めるので、返す辞書は states に新しい銘柄を加えたもの。
+    """
+    last_dates = daily["Code"].map({code: last for code, (last, _) in states.items()})
+    daily = daily[daily["Date"].astype(str) > last_dates.fillna("")]
+    panel, starts = sort_panel(daily)
+    columns = list(output_columns(indicators))
+    values = {column: np.full(len(panel), np.nan) for column in columns}
+    codes = panel["Code"].to_numpy()
+    dates = panel["Date"].astype(str).to_numpy()
+    resumed = panel["Code"].isin(states).to_numpy()
+
+    fresh = np.flatnonzero(~resumed)
+    if len(fresh):
+        # 状態のない銘柄は行の並びが銘柄ごとにまとまっているので、先頭の行の位置もそのまま詰められる
+        fresh_starts = np.flatnonzero(np.diff(np.searchsorted(starts, fresh, side="right"), prepend=-1))
+        fresh_values, fresh_states = compute_indicators_with_states(
+            _sources(panel.iloc[fresh]), indicators, fresh_starts
+        )
+        for column in columns:
+            values[column][fresh] = fresh_values[column]
+        ends = np.append(fresh_starts[1:], len(fresh)) - 1
+        for segment, state in enumerate(fresh_states):
+            row = fresh[ends[segment]]
+            states[codes[row]] = (dates[row], state)
+
+    sources = _sources(panel)
+    for row in np.flatnonzero(resumed):
+        _, state = states[codes[row]]
+        result = state.advance({name: series[row] for name, series in sources.items()})
+        for column in columns:
+            values[column][row] = result[column]
+        states[codes[row]] = (dates[row], state)
+
+    enriched = pd.concat(
+        [panel.drop(columns=columns, errors="ignore"), pd.DataFrame(values, index=panel.index)], axis=1
+    )
+    return enriched, states
+
+
+def list_daily_partitions(s3_client, bucket: str) -> dict:
+    """processed/daily/ のパーティション（年月日のプレフィックス）ごとのParquetファイルキーを古い順に返す。"""
     paginator = s3_client.get_paginator("list_objects_v2")
-    keys = []
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+    partitions = {}
+    for page in paginator.paginate(Bucket=bucket, Prefix=DAILY_PREFIX):
         for obj in page.get("Contents", []):
-            if obj["Key"].endswith(".parquet"):
-                keys.append(obj["Key"])
+            key = obj["Key"]
+            if key.endswith(".parquet"):
+                partitions.setdefault(key.rsplit("/", 1)[0], []).append(key)
+    return {partition: sorted(partitions[partition]) for partition in sorted(partitions)}
+
+
+def load_checkpoint(s3_client, bucket: str):
+    """チェックポイントから (最後に読んだパーティション, 銘柄ごとの状態) を読み込む。
+
+    チェックポイントがないか、読めないか、指標の組が既定の指標と違えばNone。
+    """
+    try:
+        obj = s3_client.get_object(Bucket=bucket, Key=STATE_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    table = pq.read_table(BytesIO(obj["Body"].read()))
+    partition = (table.schema.metadata or {}).get(b"partition")
+    df = table.to_pandas()
+    if partition is None or df.empty:
+        return None
+    try:
+        states = {
+            row.Code: (row.LastDate, IndicatorState.from_dict(json.loads(row.State)))
+            for row in df.itertuples(index=False)
+        }
+    except (AttributeError, KeyError, ValueError):
+        logger.warning("読み込めない指標の状態を破棄します: s3://%s/%s", bucket, STATE_KEY)
+        return None
+    if any(state.specs != DEFAULT_INDICATORS for _, state in states.values()):
+        logger.info("指標の組が変わったので全期間を計算し直します")
+        return None
+    return partition.decode(), states
+
+
+def save_checkpoint(s3_client, bucket: str, partition: str, states: dict) -> None:
+    """最後に読んだパーティションと銘柄ごとの状態をチェックポイントに書き込む。"""
+    codes = sorted(states)
+    df = pd.DataFrame(
+        {
+            "Code": codes,
+            "LastDate": [states[code][0] for code in codes],
+            "Bars": [states[code][1].bars for code in codes],
+            "State": [json.dumps(states[code][1].to_dict()) for code in codes],
+        }
+    )
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"partition": partition.encode()})
+    buf = BytesIO()
+    pq.write_table(table, buf, compression="snappy")
+    s3_client.put_object(Bucket=bucket, Key=STATE_KEY, Body=buf.getvalue())
+    logger.info("指標の状態を保存: s3://%s/%s (%d銘柄、%s まで)", bucket, STATE_KEY, len(df), partition)
 
-    if not keys:
-        return []
 
-    keys.sort(reverse=True)
-    latest_date_prefix = "/".join(keys[0].split("/")[:-1])
-    return [k for k in keys if k.startswith(latest_date_prefix)]
+def parse_parquet(body: bytes) -> pd.DataFrame:
+    """Parquetファイルの内容をDataFrameに変換する。"""
+    return pd.read_parquet(BytesIO(body))
 
 
 def read_parquet_from_s3(s3_client, bucket: str, key: str) -> pd.DataFrame:
     """S3からParquetファイルを読み込んでDataFrameに変換する。"""
     obj = s3_client.get_object(Bucket=bucket, Key=key)
-    buf = BytesIO(obj["Body"].read())
-    return pd.read_parquet(buf)
+    return parse_parquet(obj["Body"].read())
 
 
 def write_parquet_to_s3(s3_client, df: pd.DataFrame, bucket: str, key: str) -> None:
@@ -93,58 +226,55 @@ def write_parquet_to_s3(s3_client, df: pd.DataFrame, bucket: str, key: str) -> N
     logger.info("Parquet保存: s3://%s/%s (%d件)", bucket, key, len(df))
 
 
+def output_key(partition: str) -> str:
+    """日足のパーティションに対応する指標の出力先のキー。"""
+    return f"{OUTPUT_PREFIX}{partition[len(DAILY_PREFIX) :]}/technical.parquet"
+
+
 def main():
     """Glue Python Shell エントリーポイント。"""
-    args = getResolvedOptions(sys.argv, ["DATALAKE_BUCKET"])
+    optional = [name for name in ("FULL_RECOMPUTE", "READ_PARALLELISM") if f"--{name}" in sys.argv]
+    args = getResolvedOptions(sys.argv, ["DATALAKE_BUCKET", *optional])
     bucket = args["DATALAKE_BUCKET"]
+    full_recompute = args.get("FULL_RECOMPUTE", "false").lower() == "true"
+    parallelism = int(args.get("READ_PARALLELISM", DEFAULT_READ_PARALLELISM))
 
-    s3_client = boto3.client("s3")
+    s3_client = boto3.client("s3", config=s3_client_config(parallelism))
 
-    keys = get_latest_daily_keys(s3_client, bucket)
-    if not keys:
+    partitions = list_daily_partitions(s3_client, bucket)
+    if not partitions:
         logger.warning("processed/daily/ にデータが見つかりません")
         return
 
-    dfs = []
-    for key in keys:
-        df = read_parquet_from_s3(s3_client, bucket, key)
-        if not df.empty:
-            dfs.append(df)
-
-    if not dfs:
-        logger.warning("読み込み可能なデータがありません")
+    checkpoint = None if full_recompute else load_checkpoint(s3_client, bucket)
+    last_partition, states = checkpoint if checkpoint is not None else ("", {})
+    new_partitions = [partition for partition in partitions if partition > last_partition]
+    if not new_partitions:
+        logger.info("%s より後のパーティションはありません", last_partition)
         return
+    logger.info("%d パーティションを読み込みます（%s から）", len(new_partitions), new_partitions[0])
 
-    daily = pd.concat(dfs, ignore_index=True)
-    logger.info("日足データ読み込み完了: %d件", len(daily))
-
-    if "AdjC" not in daily.columns:
-        logger.error("AdjC カラムが見つかりません。テクニカル指標算出をスキップします。")
-        return
+    sources = [(partition, key) for partition in new_partitions for key in partitions[partition]]
+    frames = read_objects(s3_client, bucket, [key for _, key in sources], parse_parquet, parallelism)
+    dfs = [df.assign(**{PARTITION_COLUMN: sources[i][0]}) for i, df in enumerate(frames) if not df.empty]
 
-    # 銘柄ごとにテクニカル指標を算出
-    results = []
-    for code, group in daily.groupby("Code"):
-        group = group.sort_values("Date").copy()
-        if len(group) < 2:
-            continue
-        enriched = compute_technical_indicators(group)
-        results.append(enriched)
-
-    if not results:
-        logger.warning("テクニカル指標を算出できる銘柄がありません")
-        return
+    if dfs:
+        daily = pd.concat(dfs, ignore_index=True)
+        logger.info("日足データ読み込み完了: %d件", len(daily))
 
-    combined = pd.concat(results, ignore_index=True)
+        if "AdjC" not in daily.columns:
+            logger.error("AdjC カラムが見つかりません。テクニカル指標算出をスキップします。")
+            return
 
-    now = datetime.now(JST)
-    year = now.strftime("%Y")
-    month = now.strftime("%m")
-    day = now.strftime("%d")
-    output_key = f"analytics/technical/year={year}/month={month}/day={day}/technical.parquet"
+        enriched, states = enrich_with_state(daily, states)
+        for partition, rows in enriched.groupby(PARTITION_COLUMN, sort=True):
+            write_parquet_to_s3(s3_client, rows.drop(columns=PARTITION_COLUMN), bucket, output_key(partition))
+        logger.info("テクニカル指標算出完了: %d件", len(enriched))
+    else:
+        logger.warning("読み込み可能なデータがありません")
 
-    write_parquet_to_s3(s3_client, combined, bucket, output_key)
-    logger.info("テクニカル指標算出完了: %d件", len(combined))
+    # 出力を書き終えてから状態を進める。途中で落ちたら次の実行で同じパーティションから計算し直す
+    save_checkpoint(s3_client, bucket, new_partitions[-1], states)
 
 
 if __name__ == "__main__":
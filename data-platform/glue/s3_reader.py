@@ -0,0 +1,122 @@
+"""S3 オブジェクトの並列読み込み。transform / enrich ジョブで共有する。
+
+キーごとに get_object の往復を待つと、その間 Glue の DPU が遊んでしまう。スレッドプールで
+同時に最大 max_workers 件を取得・解析し、結果はキーの順に並べ直して返す。
+
+read_objects はオブジェクトの本文をまとめて読む。iter_objects は本文をストリームで読みながら
+解析した要素を少しずつ渡すので、オブジェクトが大きくてもメモリは一定に収まる。
+
+Glue には --extra-py-files で s3_reader.py として配布する。
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+# 同時に取得するオブジェクトの数の既定値。ジョブパラメータ --READ_PARALLELISM で変えられる
+DEFAULT_READ_PARALLELISM = 8
+
+# iter_objects でオブジェクトごとに先読みして溜めておく要素の数
+DEFAULT_PREFETCH = 2
+
+# iter_objects でオブジェクトを読み終えた印
+_DONE = object()
+
+
+def s3_client_config(max_workers: int = DEFAULT_READ_PARALLELISM) -> Config:
+    """並列に読み込むS3クライアントの設定。接続プールが同時に取得する数より小さいと待ちが出る。"""
+    return Config(max_pool_connections=max(max_workers, 10))
+
+
+def read_objects(s3_client, bucket: str, keys: list, parse, max_workers: int = DEFAULT_READ_PARALLELISM) -> list:
+    """keys のオブジェクトを並列に取得して parse(本文のバイト列) し、結果を keys と同じ順で返す。
+
+    同時に取得するのは最大 max_workers 件。1件でも失敗すればその例外を送出する。
+    boto3 のクライアントはスレッド間で共有できるので、同じ s3_client を使う。
+    """
+    if max_workers < 1:
+        raise ValueError(f"max_workers は1以上にしてください: {max_workers}")
+    if not keys:
+        return []
+
+    def fetch(key: str):
+        obj = s3_client.get_object(Bucket=bucket, Key=key)
+        return parse(obj["Body"].read())
+
+    workers = min(max_workers, len(keys))
+    logger.info("S3から%d件を読み込みます（並列数 %d）", len(keys), workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map は完了した順ではなく、渡した順に結果を返す
+        return list(executor.map(fetch, keys))
+
+
+def iter_objects(
+    s3_client,
+    bucket: str,
+    keys: list,
+    parse,
+    max_workers: int = DEFAULT_READ_PARALLELISM,
+    prefetch: int = DEFAULT_PREFETCH,
+):
+    """keys のオブジェクトを並列にストリームで読み、parse(本文のストリーム) が返す要素を keys の順に返す。
+
+    parse はオブジェクトごとに要素のイテレータを返す。同時に読むのは最大 max_workers 件で、
+    各オブジェクトは prefetch 個の要素まで先読みしたら、呼び出し側が受け取るまで読むのを待つ。
+    そのためメモリはオブジェクトの大きさや数によらず、おおよそ max_workers × prefetch 個の要素に収まる。
+    1件でも失敗すればその例外を送出し、残りの読み込みを止める。
+    """
+    if max_workers < 1 or prefetch < 1:
+        raise ValueError(f"max_workers と prefetch は1以上にしてください: {max_workers}, {prefetch}")
+    if not keys:
+        return
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=prefetch) for _ in keys]
+
+    def put(items: queue.Queue, item) -> bool:
+        # 呼び出し側が途中でやめたら、空かない待ち行列を待ち続けずに抜ける
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(key: str, items: queue.Queue) -> None:
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+            try:
+                for item in parse(body):
+                    if not put(items, (None, item)):
+                        return
+            finally:
+                body.close()
+            put(items, _DONE)
+        except Exception as exc:
+            put(items, (exc, None))
+
+    workers = min(max_workers, len(keys))
+    logger.info("S3から%d件をストリームで読み込みます（並列数 %d）", len(keys), workers)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # スレッドプールは投入した順に実行するので、先頭のキーから順に読み始める
+        for i, key in enumerate(keys):
+            executor.submit(produce, key, queues[i])
+        for items in queues:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                error, value = item
+                if error is not None:
+                    raise error
+                yield value
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -4,12 +4,26 @@ S3 raw/ レイヤーの JSON データを読み込み、型正規化・クレン
 processed/ レイヤーへ Parquet 形式で出力する。
 
 パーティション: year=YYYY/month=MM/day=DD/
+
+raw/ のJSON（レコードの配列、または1行1レコードのNDJSON。gzip 圧縮されていれば展開する）は
+s3_reader で並列にストリームで読み（並列数は --READ_PARALLELISM）、少しずつ解析したレコードを
+型正規化する。解析した表はいったんローカルの一時ファイルに書き出しながら全体のスキーマをまとめ
+（後から型が広がった列は昇格し、後から現れた列は加える）、そのスキーマに揃えて ROW_GROUP_SIZE 行ごとに
+Parquet の行グループとして書き出す。書き出したParquetは PART_SIZE ごとにS3へマルチパートで
+アップロードするので、変換中のメモリはデータ全体の大きさによらず一定に収まる。
+Glue には --extra-py-files で s3_reader.py として配布する。
 """
 
+import codecs
+import itertools
 import json
 import logging
+import os
+import re
 import sys
-from datetime import datetime, timezone, timedelta
+import tempfile
+import zlib
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
 
 import boto3
@@ -19,21 +33,46 @@ import pyarrow.parquet as pq
 
 # Glue Python Shell のジョブパラメータ取得
 from awsglue.utils import getResolvedOptions
+from s3_reader import DEFAULT_READ_PARALLELISM, iter_objects, s3_client_config
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 JST = timezone(timedelta(hours=9))
 
+# 1つの行グループに書き込む行数
+ROW_GROUP_SIZE = 100_000
+
+# 1つのファイルから1度に解析して型正規化するレコードの数。Arrowの表にしてから行グループにまとめる
+PARSE_BATCH_SIZE = 10_000
+
+# S3から1回に読む本文の大きさ
+READ_CHUNK_SIZE = 1024 * 1024
+
+# マルチパートアップロードの1パートの大きさ（S3の下限は最後のパートを除き5MiB）
+PART_SIZE = 8 * 1024 * 1024
+
+# 全体のスキーマが決まるまで表を置いておく一時ファイル（Arrow IPC）の書き出し設定
+SPILL_OPTIONS = pa.ipc.IpcWriteOptions(compression="lz4")
+
+# raw/ の変換対象のファイルの拡張子。Lambda は gzip 圧縮した NDJSON を書く
+RAW_SUFFIXES = (".json", ".ndjson", ".json.gz", ".ndjson.gz")
+
+# gzip の先頭のバイト列
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# トップレベルのレコードの間にある区切り（配列の括弧、カンマ、空白・改行）
+_SEPARATORS = re.compile(r"[\s,\[\]]*")
+
 
 def get_latest_raw_keys(s3_client, bucket: str, data_type: str) -> list[str]:
-    """raw/ レイヤーから最新日のJSONファイルキーを取得する。"""
+    """raw/ レイヤーから最新日のJSONファイル（NDJSON、gzip 圧縮を含む）キーを取得する。"""
     prefix = f"raw/{data_type}/"
     paginator = s3_client.get_paginator("list_objects_v2")
     keys = []
     for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
         for obj in page.get("Contents", []):
-            if obj["Key"].endswith(".json"):
+            if obj["Key"].endswith(RAW_SUFFIXES):
                 keys.append(obj["Key"])
 
     if not keys:
@@ -45,13 +84,79 @@ def get_latest_raw_keys(s3_client, bucket: str, data_type: str) -> list[str]:
     return [k for k in keys if k.startswith(latest_date_prefix)]
 
 
+def iter_decompressed(chunks):
+    """チャンクが gzip 圧縮されていれば展開しながら、そうでなければそのまま返す。先頭のバイト列で判定する。"""
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= len(_GZIP_MAGIC):
+            break
+    if not head.startswith(_GZIP_MAGIC):
+        if head:
+            yield head
+        yield from chunks
+        return
+
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    for chunk in itertools.chain([head], chunks):
+        while chunk:
+            yield decompressor.decompress(chunk)
+            # 連結された gzip のメンバーは、続きを新しい展開器で読む
+            chunk = decompressor.unused_data
+            if chunk:
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    yield decompressor.flush()
+    if not decompressor.eof:
+        raise ValueError("gzip のデータが途中で切れています")
+
+
+def iter_json_records(chunks):
+    """JSONの本文をチャンクごとに少しずつ解析し、レコード（オブジェクト）を1件ずつ返す。
+
+    レコードの配列（[{...}, {...}]）と、1行に1レコードのNDJSONのどちらも読める。
+    持つのは読みかけのチャンクと解析中のレコードだけなので、本文全体を読み込まない。
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    for chunk in chunks:
+        buffer += text.decode(chunk)
+        position = 0
+        while True:
+            position = _SEPARATORS.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # レコードの途中でチャンクが切れている。続きを読んでから解析し直す
+                break
+            if not isinstance(record, dict):
+                raise ValueError(f"JSONのレコードがオブジェクトではありません: {record!r}")
+            yield record
+            position = end
+        buffer = buffer[position:]
+    buffer += text.decode(b"", final=True)
+    rest = buffer.strip()
+    if rest:
+        # 最後まで読んでも解析できない部分が残っていれば、壊れたJSON
+        decoder.decode(rest)
+        raise ValueError(f"JSONのレコードを解析できません: {rest[:100]!r}")
+
+
+def parse_json(body: bytes) -> pd.DataFrame:
+    """JSONファイルの内容（レコードの配列かNDJSON。gzip 圧縮も可）をDataFrameに変換する。"""
+    records = list(iter_json_records(iter_decompressed([body])))
+    if not records:
+        return pd.DataFrame()
+    return pd.DataFrame(records)
+
+
 def read_json_from_s3(s3_client, bucket: str, key: str) -> pd.DataFrame:
     """S3からJSONファイルを読み込んでDataFrameに変換する。"""
     obj = s3_client.get_object(Bucket=bucket, Key=key)
-    data = json.loads(obj["Body"].read().decode("utf-8"))
-    if not data:
-        return pd.DataFrame()
-    return pd.DataFrame(data)
+    return parse_json(obj["Body"].read())
 
 
 def normalize_master(df: pd.DataFrame) -> pd.DataFrame:
@@ -99,53 +204,233 @@ def write_parquet_to_s3(s3_client, df: pd.DataFrame, bucket: str, key: str) -> N
     logger.info("Parquet保存: s3://%s/%s (%d件)", bucket, key, len(df))
 
 
-def transform_data_type(s3_client, bucket: str, data_type: str) -> int:
-    """指定されたdata_typeのデータを変換する。"""
+NORMALIZERS = {
+    "master": normalize_master,
+    "daily": normalize_daily,
+    "financials": normalize_financials,
+}
+
+
+def _to_table(records: list, normalizer) -> pa.Table:
+    df = pd.DataFrame(records)
+    if normalizer:
+        df = normalizer(df)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def parse_json_stream(body, normalizer=None):
+    """S3の本文のストリームを読みながら、PARSE_BATCH_SIZE 件ずつ型正規化したArrowの表を返す。"""
+    batch = []
+    for record in iter_json_records(iter_decompressed(body.iter_chunks(READ_CHUNK_SIZE))):
+        batch.append(record)
+        if len(batch) >= PARSE_BATCH_SIZE:
+            yield _to_table(batch, normalizer)
+            batch = []
+    if batch:
+        yield _to_table(batch, normalizer)
+
+
+def _merge_schema(schema: pa.Schema, other: pa.Schema) -> pa.Schema:
+    """2つの表のスキーマをまとめる。型は欠損→整数→浮動小数点のように広い方へ昇格し、新しい列は末尾に加える。
+
+    数値と文字列のように昇格できない型が混ざった列は文字列にする。
+    """
+    try:
+        return pa.unify_schemas([schema, other], promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    conflicts = set()
+    for field in other:
+        if field.name not in schema.names:
+            continue
+        try:
+            pa.unify_schemas([pa.schema([schema.field(field.name)]), pa.schema([field])], promote_options="permissive")
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            conflicts.add(field.name)
+
+    def as_string(s: pa.Schema) -> pa.Schema:
+        return pa.schema([pa.field(f.name, pa.string()) if f.name in conflicts else f for f in s])
+
+    return pa.unify_schemas([as_string(schema), as_string(other)], promote_options="permissive")
+
+
+def _output_schema(schema: pa.Schema) -> pa.Schema:
+    """すべての表をまとめたスキーマから出力のスキーマを決める。値がすべて欠損で型が決まらない列は文字列にする。
+
+    列ごとに後から昇格した型と pandas のメタデータが合わなくなるので、メタデータは付けない。
+    """
+    return pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """表の列と型をスキーマに揃える。ない列は欠損で埋め、型は schema の型に変換する。"""
+    columns = [
+        table.column(field.name).cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(len(table), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _iter_spilled(paths: list):
+    """一時ファイルに書き出した表をレコードバッチごとに読み直す。"""
+    for path in paths:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield pa.Table.from_batches([reader.get_batch(i)])
+
+
+class S3MultipartWriter:
+    """ParquetWriter の書き込み先にするS3のファイル。part_size たまるごとにパートとしてアップロードする。
+
+    close で残りをアップロードして完了する。1パートに満たない小さなファイルは put_object で書く。
+    abort で途中までのアップロードを破棄する。
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = PART_SIZE) -> None:
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = None
+        self.size = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.size += len(data)
+        if len(self.buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        pass
+
+    def _upload_part(self) -> None:
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key)
+            self.upload_id = response["UploadId"]
+        number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=bytes(self.buffer)
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": number})
+        self.buffer = bytearray()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                self._upload_part()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts}
+            )
+        self.closed = True
+
+    def abort(self) -> None:
+        if self.upload_id is not None and not self.closed:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        self.closed = True
+
+
+def transform_data_type(s3_client, bucket: str, data_type: str, max_workers: int = DEFAULT_READ_PARALLELISM) -> int:
+    """指定されたdata_typeのデータを変換する。
+
+    raw/ のファイルを最大 max_workers 件ずつ並列にストリームで読み、キーの順に ROW_GROUP_SIZE 行ずつ
+    Parquet の行グループにしてS3へマルチパートでアップロードする。全体を1度にメモリへ載せない。
+    """
     keys = get_latest_raw_keys(s3_client, bucket, data_type)
     if not keys:
         logger.warning("raw/%s にデータが見つかりません", data_type)
         return 0
 
-    dfs = []
-    for key in keys:
-        df = read_json_from_s3(s3_client, bucket, key)
-        if not df.empty:
-            dfs.append(df)
-
-    if not dfs:
-        return 0
-
-    combined = pd.concat(dfs, ignore_index=True)
-
-    normalizers = {
-        "master": normalize_master,
-        "daily": normalize_daily,
-        "financials": normalize_financials,
-    }
-    normalizer = normalizers.get(data_type)
-    if normalizer:
-        combined = normalizer(combined)
-
     now = datetime.now(JST)
     year = now.strftime("%Y")
     month = now.strftime("%m")
     day = now.strftime("%d")
     output_key = f"processed/{data_type}/year={year}/month={month}/day={day}/{data_type}.parquet"
 
-    write_parquet_to_s3(s3_client, combined, bucket, output_key)
-    return len(combined)
+    normalizer = NORMALIZERS.get(data_type)
+
+    def parse(body):
+        return parse_json_stream(body, normalizer)
+
+    with tempfile.TemporaryDirectory(prefix="transform-") as spill_dir:
+        # Parquet は書き始めたあとでスキーマを変えられない。後の表で型が広がったり列が増えたりしても
+        # 揃えられるよう、まず一時ファイルに書き出しながら全体のスキーマをまとめる。
+        # スキーマが変わるたびに一時ファイルを分けるので、書き出し済みの表を読み直して揃える必要はない
+        segments = []
+        schema = None
+        spill = None
+        try:
+            # 並列に読み込んでもキーの順に書き込むので、結果の行の順序は変わらない
+            for table in iter_objects(s3_client, bucket, keys, parse, max_workers):
+                merged = table.schema if schema is None else _merge_schema(schema, table.schema)
+                if spill is None or not merged.equals(schema):
+                    if spill is not None:
+                        spill.close()
+                    schema = merged
+                    segments.append(os.path.join(spill_dir, f"{len(segments):05d}.arrow"))
+                    spill = pa.ipc.new_file(segments[-1], schema, options=SPILL_OPTIONS)
+                spill.write_table(_conform(table, schema))
+        finally:
+            if spill is not None:
+                spill.close()
+        if schema is None:
+            return 0
+
+        output_schema = _output_schema(schema)
+        sink = S3MultipartWriter(s3_client, bucket, output_key)
+        pending = []
+        pending_rows = 0
+        count = 0
+        try:
+            writer = pq.ParquetWriter(sink, output_schema, compression="snappy")
+            for table in _iter_spilled(segments):
+                pending.append(_conform(table, output_schema))
+                pending_rows += len(table)
+                while pending_rows >= ROW_GROUP_SIZE:
+                    combined = pa.concat_tables(pending)
+                    writer.write_table(combined.slice(0, ROW_GROUP_SIZE))
+                    count += ROW_GROUP_SIZE
+                    rest = combined.slice(ROW_GROUP_SIZE)
+                    pending = [rest] if len(rest) else []
+                    pending_rows = len(rest)
+            if pending_rows:
+                writer.write_table(pa.concat_tables(pending))
+                count += pending_rows
+            writer.close()
+            sink.close()
+        except BaseException:
+            sink.abort()
+            raise
+
+    logger.info("Parquet保存: s3://%s/%s (%d件)", bucket, output_key, count)
+    return count
 
 
 def main():
     """Glue Python Shell エントリーポイント。"""
-    args = getResolvedOptions(sys.argv, ["DATALAKE_BUCKET"])
+    optional = [name for name in ("READ_PARALLELISM",) if f"--{name}" in sys.argv]
+    args = getResolvedOptions(sys.argv, ["DATALAKE_BUCKET", *optional])
     bucket = args["DATALAKE_BUCKET"]
+    parallelism = int(args.get("READ_PARALLELISM", DEFAULT_READ_PARALLELISM))
 
-    s3_client = boto3.client("s3")
+    s3_client = boto3.client("s3", config=s3_client_config(parallelism))
 
     total_records = 0
     for data_type in ["master", "daily", "financials"]:
-        count = transform_data_type(s3_client, bucket, data_type)
+        count = transform_data_type(s3_client, bucket, data_type, parallelism)
         total_records += count
         logger.info("%s: %d件変換完了", data_type, count)
 
@@ -1,7 +1,10 @@
 """Lambda Ingest ハンドラー。
 
 Step Functions から呼び出され、J-Quants API v2 からデータを取得し
-S3 raw/ レイヤーに JSON 形式で保存する。
+S3 raw/ レイヤーに gzip 圧縮した NDJSON（1行1レコード）形式で保存する。
+
+取得したデータは CHUNK_ROWS 行ずつ NDJSON にして圧縮し、PART_SIZE たまるごとに
+マルチパートアップロードするので、全体のJSON文字列をメモリに作らない。
 
 Event 例:
     {"data_type": "master"}
@@ -9,14 +12,13 @@ Event 例:
     {"data_type": "financials"}
 """
 
-import json
 import logging
 import os
-from datetime import datetime, timezone, timedelta
+import zlib
+from datetime import datetime, timedelta, timezone
 
 import boto3
 import pandas as pd
-
 from jquants_fetcher import fetch_daily, fetch_financials, fetch_master
 
 logger = logging.getLogger()
@@ -26,6 +28,15 @@ JST = timezone(timedelta(hours=9))
 
 s3_client = boto3.client("s3")
 
+# 1度に NDJSON にする行数
+CHUNK_ROWS = 20_000
+
+# gzip の圧縮レベル。6 より少し大きくなるが、圧縮にかかる時間が4分の1ほどで済む
+COMPRESSION_LEVEL = 1
+
+# マルチパートアップロードの1パートの大きさ（S3の下限は最後のパートを除き5MiB）
+PART_SIZE = 8 * 1024 * 1024
+
 
 def handler(event: dict, context: object) -> dict:
     """Lambda エントリーポイント。"""
@@ -51,18 +62,11 @@ def handler(event: dict, context: object) -> dict:
             "record_count": 0,
         }
 
-    s3_key = f"raw/{data_type}/year={year}/month={month}/day={day}/{data_type}_{timestamp}.json"
-    json_data = df.to_json(orient="records", force_ascii=False, date_format="iso")
-
-    s3_client.put_object(
-        Bucket=bucket,
-        Key=s3_key,
-        Body=json_data,
-        ContentType="application/json",
-    )
+    s3_key = f"raw/{data_type}/year={year}/month={month}/day={day}/{data_type}_{timestamp}.ndjson.gz"
+    size = _upload_ndjson_gz(df, bucket, s3_key)
 
     record_count = len(df)
-    logger.info("S3保存完了: s3://%s/%s (%d件)", bucket, s3_key, record_count)
+    logger.info("S3保存完了: s3://%s/%s (%d件、圧縮後 %dバイト)", bucket, s3_key, record_count, size)
 
     return {
         "status": "success",
@@ -72,6 +76,61 @@ def handler(event: dict, context: object) -> dict:
     }
 
 
+def _iter_ndjson_gz(df: pd.DataFrame):
+    """DataFrame を CHUNK_ROWS 行ずつ NDJSON にして gzip 圧縮し、圧縮したバイト列を少しずつ返す。"""
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for start in range(0, len(df), CHUNK_ROWS):
+        lines = df.iloc[start : start + CHUNK_ROWS].to_json(
+            orient="records", lines=True, force_ascii=False, date_format="iso"
+        )
+        if not lines.endswith("\n"):
+            lines += "\n"
+        yield compressor.compress(lines.encode("utf-8"))
+    yield compressor.flush()
+
+
+def _upload_ndjson_gz(df: pd.DataFrame, bucket: str, key: str) -> int:
+    """DataFrame を gzip 圧縮した NDJSON として S3 に書き込み、圧縮後のバイト数を返す。
+
+    PART_SIZE に満たなければ put_object で1回で書き込む。失敗したら途中までのアップロードを破棄する。
+    """
+    upload_id = None
+    parts = []
+
+    def upload_part(body: bytes) -> None:
+        nonlocal upload_id
+        if upload_id is None:
+            response = s3_client.create_multipart_upload(Bucket=bucket, Key=key, ContentType="application/gzip")
+            upload_id = response["UploadId"]
+        number = len(parts) + 1
+        response = s3_client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+        parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+    buffer = bytearray()
+    size = 0
+    try:
+        for data in _iter_ndjson_gz(df):
+            buffer += data
+            size += len(data)
+            if len(buffer) >= PART_SIZE:
+                upload_part(bytes(buffer))
+                buffer = bytearray()
+
+        if upload_id is None:
+            s3_client.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), ContentType="application/gzip")
+        else:
+            if buffer:
+                upload_part(bytes(buffer))
+            s3_client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+    except Exception:
+        if upload_id is not None:
+            s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return size
+
+
 def _fetch_data(data_type: str, api_key: str, event: dict) -> pd.DataFrame:
     """data_type に応じてデータを取得する。"""
     if data_type == "master":
@@ -1,10 +1,13 @@
 """J-Quants API v2 データフェッチャー。
 
-Freeプランのレート制限（5回/分）に対応するため、
-429エラー時は指数バックオフでリトライする。
+Freeプランのレート制限（5回/分）に対応するため、HTTPリクエストごとに
+トークンバケットで送信間隔を空ける。それでも429が返った場合は指数バックオフでリトライする。
 """
 
 import logging
+import os
+import threading
+import time
 
 import jquantsapi
 import pandas as pd
@@ -34,9 +37,52 @@ _retry_on_rate_limit = retry(
 )
 
 
+class _TokenBucket:
+    """プロセス内のトークンバケット。
+
+    ウォームスタートしたLambdaコンテナではモジュールの状態が引き継がれるため、
+    連続した起動の間でも送信間隔が保たれる。
+    """
+
+    def __init__(self, rate_per_minute, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取得する。足りなければ予約して待ち、待った秒数を返す。"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+            self._updated_at = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate_per_second
+            self._tokens -= 1
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+# プランに合わせて環境変数で変更できる（Free: 5, Light: 60, Standard: 120, Premium: 500）
+_rate_limiter = _TokenBucket(float(os.environ.get("JQUANTS_RATE_LIMIT_PER_MINUTE", "5")))
+
+
+class _RateLimitedClient(jquantsapi.ClientV2):
+    """HTTPリクエストごとにトークンを取得してから送るクライアント。ページングの各リクエストも対象になる。"""
+
+    def _get(self, url, params=None):
+        waited = _rate_limiter.acquire()
+        if waited > 0:
+            logger.info("レート制限のため %.1f 秒待機しました", waited)
+        return super()._get(url, params)
+
+
 def _get_client(api_key: str) -> jquantsapi.ClientV2:
     """J-Quants API v2 クライアントを生成する。"""
-    return jquantsapi.ClientV2(api_key=api_key)
+    return _RateLimitedClient(api_key=api_key)
 
 
 @_retry_on_rate_limit
@@ -52,9 +98,7 @@ def fetch_master(api_key: str) -> pd.DataFrame:
 def fetch_daily(api_key: str, from_date: str = "", to_date: str = "") -> pd.DataFrame:
     """株価日足データを取得する。"""
     client = _get_client(api_key)
-    df: pd.DataFrame = client.get_eq_bars_daily(
-        from_yyyymmdd=from_date, to_yyyymmdd=to_date
-    )
+    df: pd.DataFrame = client.get_eq_bars_daily(from_yyyymmdd=from_date, to_yyyymmdd=to_date)
     logger.info("株価日足取得完了: %d件", len(df))
     return df
 
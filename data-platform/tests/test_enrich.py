@@ -6,6 +6,7 @@ backend/app/analysis/technical.py との出力一致検証。
 
 import os
 import sys
+from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
@@ -20,6 +21,11 @@ sys.path.insert(
     0, os.path.join(os.path.dirname(__file__), "..", "..", "backend")
 )
 
+# Glue では --extra-py-files で配布する指標エンジン（backend/app/analysis/indicators.py）
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "app", "analysis")
+)
+
 
 def _make_daily_df(n: int = 100) -> pd.DataFrame:
     """テスト用の日足DataFrameを生成する。"""
@@ -101,6 +107,172 @@ class TestComputeTechnicalIndicators:
         result = compute_technical_indicators(df)
         assert len(result) == 5
 
+    def test_selected_indicators_use_ohlcv_columns(self):
+        """レジストリの指標を指定でき、高値・安値・出来高は Adj* カラムから読むこと。"""
+        from enrich import compute_technical_indicators
+        from indicators import parse_indicators
+
+        df = _make_daily_df()
+        result = compute_technical_indicators(df, parse_indicators("atr,obv"))
+
+        assert "sma_5" not in result.columns
+        assert result["atr_14"].notna().iloc[-1]
+        assert result["obv"].iloc[0] == 0
+
+
+INDICATOR_COLS = [
+    "sma_5", "sma_25", "sma_75",
+    "rsi_14",
+    "macd", "macd_signal", "macd_histogram",
+    "bb_upper", "bb_middle", "bb_lower",
+]
+
+
+def _make_panel() -> pd.DataFrame:
+    """長さの違う複数銘柄の日足。"""
+    frames = []
+    for i, n in enumerate([120, 1, 30, 80]):
+        df = _make_daily_df(n).assign(Code=f"{i + 1}0000")
+        df["AdjC"] = df["AdjC"] * (i + 1)
+        frames.append(df)
+    frames[3].loc[40, "AdjC"] = np.nan
+    return pd.concat(frames, ignore_index=True)
+
+
+def _per_code(panel: pd.DataFrame) -> pd.DataFrame:
+    """銘柄ごとに日付順で計算して連結した結果。"""
+    from enrich import compute_technical_indicators
+
+    return pd.concat(
+        [compute_technical_indicators(group.sort_values("Date").copy()) for _, group in panel.groupby("Code")],
+        ignore_index=True,
+    )
+
+
+def _assert_indicators_equal(result: pd.DataFrame, expected: pd.DataFrame) -> None:
+    result = result.reset_index(drop=True)
+    expected = expected.reset_index(drop=True)
+    pd.testing.assert_frame_equal(result[["Code", "Date"]], expected[["Code", "Date"]])
+    for col in INDICATOR_COLS:
+        np.testing.assert_allclose(
+            result[col], expected[col], rtol=1e-10, atol=1e-10,
+            err_msg=f"{col} の値が銘柄ごとの計算と一致しません",
+        )
+
+
+class TestEnrichWithState:
+    """状態を進めて計算した結果のテスト。"""
+
+    def test_without_state_matches_per_code_computation(self):
+        """銘柄・日付の順に並んでいなくても、銘柄ごとに日付順で計算した結果と一致すること。"""
+        from enrich import enrich_with_state
+
+        panel = _make_panel()
+        result, states = enrich_with_state(panel.sample(frac=1, random_state=0), {})
+
+        _assert_indicators_equal(result, _per_code(panel))
+        assert states["10000"][0] == panel.loc[panel["Code"] == "10000", "Date"].max()
+        assert states["10000"][1].bars == 120
+
+    def test_resumed_state_matches_full_recompute(self):
+        """前回の状態から新しい日足だけを計算した結果が、全期間を計算し直した結果と一致すること。"""
+        from enrich import enrich_with_state
+
+        panel = _make_panel()
+        cutoff = "2024-02-15"
+        _, states = enrich_with_state(panel[panel["Date"] <= cutoff], {})
+        # 取り込み期間が重なって前回と同じ日足が再び届いても、状態より後の日足だけを計算する
+        result, states = enrich_with_state(panel[panel["Date"] > "2024-02-01"], states)
+
+        expected = _per_code(panel)
+        _assert_indicators_equal(result, expected[expected["Date"] > cutoff])
+        assert states["10000"][1].bars == 120
+
+    def test_new_code_is_computed_from_its_first_bar(self):
+        from enrich import enrich_with_state
+
+        panel = _make_panel()
+        _, states = enrich_with_state(panel[panel["Code"] != "40000"], {})
+        result, _ = enrich_with_state(panel[panel["Code"] == "40000"], states)
+
+        _assert_indicators_equal(result, _per_code(panel[panel["Code"] == "40000"]))
+
+    def test_duplicate_rows_keep_the_latest(self):
+        """同じ銘柄・日付の行は後にある行の値で計算すること。"""
+        from enrich import enrich_with_state
+
+        df = _make_daily_df(30)
+        revised = df.iloc[[10]].assign(AdjC=df["AdjC"].iloc[10] + 50)
+        result, _ = enrich_with_state(pd.concat([df, revised], ignore_index=True), {})
+
+        expected = df.copy()
+        expected.loc[10, "AdjC"] = revised["AdjC"].iloc[0]
+        _assert_indicators_equal(result, _per_code(expected))
+
+    def test_rows_without_code_or_date_give_an_empty_panel(self):
+        """全行の銘柄か日付が欠損していれば、空の結果になり状態も増えないこと。"""
+        from enrich import enrich_with_state, sort_panel
+
+        df = _make_daily_df(5)
+        df["Code"] = None
+        df.loc[0, ["Code", "Date"]] = ["10000", None]
+
+        panel, starts = sort_panel(df)
+        assert panel.empty
+        assert list(panel.columns) == list(df.columns)
+        assert len(starts) == 0
+
+        result, states = enrich_with_state(df, {})
+        assert result.empty
+        assert set(INDICATOR_COLS) <= set(result.columns)
+        assert states == {}
+
+
+class TestMain:
+    """チェックポイントから再開するジョブ全体のテスト。"""
+
+    @staticmethod
+    def _put_partition(s3, bucket: str, df: pd.DataFrame, day: str) -> None:
+        from enrich import write_parquet_to_s3
+
+        write_parquet_to_s3(s3, df, bucket, f"processed/daily/year=2024/month=05/day={day}/daily.parquet")
+
+    @staticmethod
+    def _run(bucket: str, *args: str) -> None:
+        from enrich import main
+
+        with patch.object(sys, "argv", ["enrich.py", "--DATALAKE_BUCKET", bucket, *args]):
+            main()
+
+    def test_second_run_reads_only_new_partitions(self, s3_bucket):
+        import boto3
+        from enrich import STATE_KEY, read_objects, read_parquet_from_s3
+
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        panel = _make_panel()
+        self._put_partition(s3, s3_bucket, panel[panel["Date"] <= "2024-03-29"], "01")
+        self._run(s3_bucket)
+        assert s3.head_object(Bucket=s3_bucket, Key=STATE_KEY)
+
+        self._put_partition(s3, s3_bucket, panel[panel["Date"] > "2024-03-01"], "02")
+        with patch("enrich.read_objects", wraps=read_objects) as read:
+            self._run(s3_bucket)
+        assert read.call_args.args[2] == ["processed/daily/year=2024/month=05/day=02/daily.parquet"]
+
+        result = read_parquet_from_s3(
+            s3, s3_bucket, "analytics/technical/year=2024/month=05/day=02/technical.parquet"
+        )
+        expected = _per_code(panel)
+        _assert_indicators_equal(result, expected[expected["Date"] > "2024-03-29"])
+
+        # 全期間を計算し直すと、重なった日足は後のパーティションの出力に入る
+        self._run(s3_bucket, "--FULL_RECOMPUTE", "true")
+        recomputed = read_parquet_from_s3(
+            s3, s3_bucket, "analytics/technical/year=2024/month=05/day=02/technical.parquet"
+        )
+        assert "_partition" not in recomputed.columns
+        _assert_indicators_equal(recomputed, expected[expected["Date"] > "2024-03-01"])
+
 
 class TestConsistencyWithBackend:
     """backend/app/analysis/technical.py との出力一致検証。"""
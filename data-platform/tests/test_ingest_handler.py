@@ -1,5 +1,6 @@
 """Lambda Ingest ハンドラーのテスト。"""
 
+import gzip
 import json
 import os
 import sys
@@ -72,13 +73,15 @@ class TestIngestHandler:
         assert result["data_type"] == "master"
         assert result["record_count"] == 2
         assert result["s3_key"].startswith("raw/master/year=")
-        assert result["s3_key"].endswith(".json")
+        assert result["s3_key"].endswith(".ndjson.gz")
 
-        # S3にJSONが保存されたことを確認
+        # S3に gzip 圧縮した NDJSON が保存されたことを確認
         obj = s3.get_object(Bucket=bucket, Key=result["s3_key"])
-        data = json.loads(obj["Body"].read().decode("utf-8"))
+        lines = gzip.decompress(obj["Body"].read()).decode("utf-8").splitlines()
+        data = [json.loads(line) for line in lines]
         assert len(data) == 2
         assert data[0]["Code"] == "86970"
+        assert data[1]["CoName"] == "極洋"
 
     @mock_aws
     def test_ingest_daily(self, aws_credentials):
@@ -188,3 +191,42 @@ class TestIngestHandler:
 
             with pytest.raises(ValueError, match="未対応の data_type"):
                 handler.handler({"data_type": "unknown"}, None)
+
+    @mock_aws
+    def test_large_data_is_uploaded_in_parts(self, aws_credentials):
+        """圧縮後のデータがパートの大きさを超えると、マルチパートでアップロードする。"""
+        bucket = "test-datalake"
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"},
+        )
+
+        with patch.dict(
+            os.environ,
+            {"DATALAKE_BUCKET": bucket, "JQUANTS_API_KEY": "test-key"},
+        ):
+            # 圧縮しにくい値にして、圧縮後も5MiBのパートを2つ以上にする
+            n = 60_000
+            daily_df = pd.DataFrame(
+                {
+                    "Date": "2025-02-07",
+                    "Code": [f"{i:05d}" for i in range(n)],
+                    "Memo": [os.urandom(100).hex() for _ in range(n)],
+                }
+            )
+
+            with patch("jquants_fetcher.fetch_daily", return_value=daily_df):
+                import handler
+
+                with (
+                    patch.object(handler, "PART_SIZE", 5 * 1024 * 1024),
+                    patch.object(handler.s3_client, "upload_part", wraps=handler.s3_client.upload_part) as upload,
+                ):
+                    result = handler.handler({"data_type": "daily"}, None)
+
+        assert upload.call_count >= 2
+        obj = s3.get_object(Bucket=bucket, Key=result["s3_key"])
+        lines = gzip.decompress(obj["Body"].read()).decode("utf-8").splitlines()
+        assert len(lines) == n
+        assert json.loads(lines[-1]) == daily_df.iloc[-1].to_dict()
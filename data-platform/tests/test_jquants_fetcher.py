@@ -0,0 +1,60 @@
+"""J-Quants フェッチャーのレート制限のテスト。"""
+
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "ingest"))
+
+
+class FakeClock:
+    """sleepすると時刻が進むテスト用の時計。"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket:
+    """_TokenBucket のテスト。"""
+
+    def test_requests_are_spaced_by_rate(self):
+        """5回/分なら2回目以降は12秒間隔で送られる。"""
+        from jquants_fetcher import _TokenBucket
+
+        clock = FakeClock()
+        bucket = _TokenBucket(5, clock=clock.time, sleep=clock.sleep)
+        waits = [bucket.acquire() for _ in range(3)]
+        assert waits == [0.0, pytest.approx(12), pytest.approx(12)]
+
+    def test_tokens_refill_over_time(self):
+        from jquants_fetcher import _TokenBucket
+
+        clock = FakeClock()
+        bucket = _TokenBucket(60, clock=clock.time, sleep=clock.sleep)
+        bucket.acquire()
+        clock.now += 1
+        assert bucket.acquire() == 0.0
+
+
+class TestRateLimitedClient:
+    """HTTPリクエストごとのトークン取得のテスト。"""
+
+    def test_get_acquires_token(self):
+        import jquants_fetcher
+        import jquantsapi
+
+        client = jquants_fetcher._get_client("test-key")
+        with (
+            patch.object(jquants_fetcher._rate_limiter, "acquire", return_value=0.0) as mock_acquire,
+            patch.object(jquantsapi.ClientV2, "_get", return_value="response"),
+        ):
+            assert client._get("https://example.com") == "response"
+        mock_acquire.assert_called_once()
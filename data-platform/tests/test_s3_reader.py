@@ -0,0 +1,128 @@
+"""S3 オブジェクトの並列読み込みのテスト。"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import boto3
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "glue"))
+
+
+def _put_objects(bucket: str, n: int) -> list[str]:
+    s3 = boto3.client("s3", region_name="ap-northeast-1")
+    keys = [f"raw/daily/year=2025/month=02/day=07/daily_{i:03d}.json" for i in range(n)]
+    for i, key in enumerate(keys):
+        s3.put_object(Bucket=bucket, Key=key, Body=json.dumps([{"Code": str(i)}]))
+    return keys
+
+
+class TestReadObjects:
+    """read_objects のテスト。"""
+
+    def test_results_keep_key_order(self, s3_bucket):
+        """完了する順序によらず、結果がキーの順に並ぶこと。"""
+        from s3_reader import read_objects
+
+        keys = _put_objects(s3_bucket, 20)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+
+        def parse(body: bytes) -> str:
+            code = json.loads(body)[0]["Code"]
+            time.sleep(0.02 * (int(code) % 3))  # 先に渡したキーほど遅く終わる場合がある
+            return code
+
+        assert read_objects(s3, s3_bucket, keys, parse, max_workers=4) == [str(i) for i in range(20)]
+
+    def test_parallelism_is_bounded(self, s3_bucket):
+        """同時に解析するのは max_workers 件までで、並列に処理されること。"""
+        from s3_reader import read_objects
+
+        keys = _put_objects(s3_bucket, 12)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def parse(body: bytes) -> bytes:
+            with lock:
+                running.append(body)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(body)
+            return body
+
+        read_objects(s3, s3_bucket, keys, parse, max_workers=3)
+        assert max(peak) == 3
+
+    def test_no_keys(self, s3_bucket):
+        from s3_reader import read_objects
+
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        assert read_objects(s3, s3_bucket, [], json.loads) == []
+
+    def test_missing_object_raises(self, s3_bucket):
+        from s3_reader import read_objects
+
+        keys = _put_objects(s3_bucket, 3)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        with pytest.raises(s3.exceptions.NoSuchKey):
+            read_objects(s3, s3_bucket, [*keys, "raw/daily/missing.json"], json.loads)
+
+    def test_invalid_parallelism(self, s3_bucket):
+        from s3_reader import read_objects
+
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        with pytest.raises(ValueError):
+            read_objects(s3, s3_bucket, ["raw/daily/a.json"], json.loads, max_workers=0)
+
+
+class TestIterObjects:
+    """iter_objects のテスト。"""
+
+    @staticmethod
+    def _lines(body):
+        for line in body.iter_lines():
+            yield json.loads(line)["Code"]
+
+    def test_items_keep_key_order(self, s3_bucket):
+        from s3_reader import iter_objects
+
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        keys = []
+        for i in range(8):
+            key = f"raw/daily/part_{i}.ndjson"
+            lines = "\n".join(json.dumps({"Code": f"{i}-{j}"}) for j in range(5))
+            s3.put_object(Bucket=s3_bucket, Key=key, Body=lines)
+            keys.append(key)
+
+        result = list(iter_objects(s3, s3_bucket, keys, self._lines, max_workers=3, prefetch=1))
+        assert result == [f"{i}-{j}" for i in range(8) for j in range(5)]
+
+    def test_error_is_raised(self, s3_bucket):
+        from s3_reader import iter_objects
+
+        keys = _put_objects(s3_bucket, 3)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        with pytest.raises(s3.exceptions.NoSuchKey):
+            list(iter_objects(s3, s3_bucket, [*keys, "raw/daily/missing.json"], lambda body: json.loads(body.read())))
+
+    def test_stopping_early_does_not_hang(self, s3_bucket):
+        """呼び出し側が途中でやめても、先読みで待っている読み込みが止まること。"""
+        from s3_reader import iter_objects
+
+        keys = _put_objects(s3_bucket, 6)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+
+        def endless(body):
+            body.read()
+            while True:
+                yield 1
+
+        items = iter_objects(s3, s3_bucket, keys, endless, max_workers=3, prefetch=1)
+        assert next(items) == 1
+        items.close()
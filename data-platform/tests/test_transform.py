@@ -4,6 +4,7 @@ awsglue モジュールはGlue環境のみで利用可能なため、
 変換ロジック関数を直接テストする。
 """
 
+import gzip
 import json
 import os
 import sys
@@ -137,3 +138,170 @@ class TestTransformIO:
         keys = get_latest_raw_keys(s3, bucket, "master")
         assert len(keys) == 1
         assert "day=09" in keys[0]
+
+    @mock_aws
+    def test_transform_data_type_keeps_file_order(self):
+        """並列に読み込んだファイルがキーの順に連結されること。"""
+        from transform import transform_data_type
+
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        bucket = "test-bucket"
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"},
+        )
+        prefix = "raw/daily/year=2025/month=02/day=07"
+        for i in range(10):
+            body = [{"Date": f"2025-02-{i + 1:02d}", "Code": 86970, "AdjC": 4500 + i}]
+            s3.put_object(Bucket=bucket, Key=f"{prefix}/daily_{i:02d}.json", Body=json.dumps(body))
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/daily_99.json", Body=b"[]")
+
+        assert transform_data_type(s3, bucket, "daily", max_workers=4) == 10
+
+        keys = [obj["Key"] for obj in s3.list_objects_v2(Bucket=bucket, Prefix="processed/")["Contents"]]
+        obj = s3.get_object(Bucket=bucket, Key=keys[0])
+        result = pq.read_table(BytesIO(obj["Body"].read())).to_pandas()
+        # get_latest_raw_keys はキーの降順に返す
+        assert result["AdjC"].tolist() == [4500.0 + i for i in reversed(range(10))]
+
+
+class TestStreaming:
+    """ストリームでの変換のテスト。"""
+
+    RECORDS = [
+        {"Code": "86970", "CoName": "日本取引所グループ", "Note": None},
+        {"Code": "13010", "CoName": "極洋", "Note": "[注記], {括弧}"},
+        {"Code": "72030", "CoName": "トヨタ自動車", "Note": "\"引用\""},
+    ]
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+    def test_iter_json_records_across_chunks(self, chunk_size):
+        """チャンクの境目がレコードや多バイト文字の途中にあっても、配列とNDJSONを読めること。"""
+        from transform import iter_json_records
+
+        array = json.dumps(self.RECORDS, ensure_ascii=False).encode("utf-8")
+        ndjson = "\n".join(json.dumps(r, ensure_ascii=False) for r in self.RECORDS).encode("utf-8") + b"\n"
+        for body in (array, ndjson):
+            chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+            assert list(iter_json_records(chunks)) == self.RECORDS
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+    def test_iter_decompressed(self, chunk_size):
+        """gzip 圧縮されたチャンクは展開し、そうでないチャンクはそのまま返すこと。"""
+        from transform import iter_decompressed
+
+        ndjson = "\n".join(json.dumps(r, ensure_ascii=False) for r in self.RECORDS).encode("utf-8")
+        # Lambda の分割アップロードのように複数の gzip メンバーを連結したものも読める
+        compressed = gzip.compress(ndjson[:10]) + gzip.compress(ndjson[10:])
+        for body in (ndjson, compressed):
+            chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+            assert b"".join(iter_decompressed(chunks)) == ndjson
+        with pytest.raises(ValueError):
+            list(iter_decompressed([compressed[:-20]]))
+
+    def test_iter_json_records_empty_and_broken(self):
+        from transform import iter_json_records
+
+        assert list(iter_json_records([b"[", b"]"])) == []
+        with pytest.raises(ValueError):
+            list(iter_json_records([b'[{"Code": "86970"}, {"Code": ']))
+        with pytest.raises(ValueError):
+            list(iter_json_records([b"[1, 2]"]))
+
+    @mock_aws
+    def test_multipart_writer(self):
+        """パートの大きさを超えるとマルチパートで、超えなければ1回でアップロードすること。"""
+        from transform import S3MultipartWriter
+
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        bucket = "test-bucket"
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"},
+        )
+        part_size = 5 * 1024 * 1024
+        data = os.urandom(part_size // 2)
+
+        sink = S3MultipartWriter(s3, bucket, "large.bin", part_size=part_size)
+        for _ in range(5):
+            sink.write(data)
+        sink.close()
+        assert len(sink.parts) == 3
+        assert s3.get_object(Bucket=bucket, Key="large.bin")["Body"].read() == data * 5
+
+        sink = S3MultipartWriter(s3, bucket, "small.bin", part_size=part_size)
+        sink.write(b"abc")
+        sink.close()
+        assert sink.upload_id is None
+        assert s3.get_object(Bucket=bucket, Key="small.bin")["Body"].read() == b"abc"
+
+        sink = S3MultipartWriter(s3, bucket, "aborted.bin", part_size=part_size)
+        sink.write(data * 2)
+        sink.abort()
+        assert s3.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
+        assert "aborted.bin" not in [obj["Key"] for obj in s3.list_objects_v2(Bucket=bucket)["Contents"]]
+
+    @mock_aws
+    def test_transform_writes_row_groups(self, monkeypatch):
+        """ファイルをまたいで ROW_GROUP_SIZE 行ずつ行グループにし、途中で型の推定が変わっても揃えること。"""
+        import transform
+        from transform import transform_data_type
+
+        monkeypatch.setattr(transform, "ROW_GROUP_SIZE", 4)
+        monkeypatch.setattr(transform, "PARSE_BATCH_SIZE", 3)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        bucket = "test-bucket"
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"},
+        )
+        prefix = "raw/financials/year=2025/month=02/day=07"
+        records = [{"Code": 86970 + i, "Shares": 100 + i, "Note": None} for i in range(11)]
+        records[5]["Shares"] = None  # 2つ目の表では整数の列が浮動小数点になる
+        records[7]["Note"] = "注記"  # 最初の表では型の決まらない列
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/b.json", Body=json.dumps(records[:5]))
+        ndjson = "\n".join(json.dumps(r) for r in records[5:])
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/a.ndjson.gz", Body=gzip.compress(ndjson.encode("utf-8")))
+
+        assert transform_data_type(s3, bucket, "financials", max_workers=2) == 11
+
+        key = s3.list_objects_v2(Bucket=bucket, Prefix="processed/")["Contents"][0]["Key"]
+        parquet = pq.ParquetFile(BytesIO(s3.get_object(Bucket=bucket, Key=key)["Body"].read()))
+        assert [parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)] == [4, 4, 3]
+        # キーの降順（b.json, a.ndjson.gz）に連結される
+        result = parquet.read().to_pylist()
+        assert [r["Code"] for r in result] == [str(86970 + i) for i in range(11)]
+        assert [r["Shares"] for r in result] == [None if i == 5 else 100 + i for i in range(11)]
+        assert [r["Note"] for r in result] == ["注記" if i == 7 else None for i in range(11)]
+
+    @mock_aws
+    def test_transform_promotes_types_and_keeps_late_columns(self, monkeypatch):
+        """最初の表で欠損だけの列は後の表の型に昇格し、後から現れた列も出力すること。"""
+        import transform
+        from transform import transform_data_type
+
+        monkeypatch.setattr(transform, "PARSE_BATCH_SIZE", 2)
+        s3 = boto3.client("s3", region_name="ap-northeast-1")
+        bucket = "test-bucket"
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"},
+        )
+        records = [
+            {"Date": "2025-02-07", "Code": "86970", "MO": None, "Memo": 1},
+            {"Date": "2025-02-07", "Code": "13010", "MO": None, "Memo": 2},
+            {"Date": "2025-02-07", "Code": "72030", "MO": 1234.5, "Memo": "備考"},
+            {"Date": "2025-02-07", "Code": "67580", "MO": 98.0, "Memo": None, "NewCol": "x"},
+        ]
+        key = "raw/daily/year=2025/month=02/day=07/daily.json"
+        s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(records))
+
+        assert transform_data_type(s3, bucket, "daily", max_workers=1) == 4
+
+        key = s3.list_objects_v2(Bucket=bucket, Prefix="processed/")["Contents"][0]["Key"]
+        table = pq.read_table(BytesIO(s3.get_object(Bucket=bucket, Key=key)["Body"].read()))
+        assert str(table.schema.field("MO").type) == "double"
+        assert table.column("MO").to_pylist() == [None, None, 1234.5, 98.0]
+        # 数値と文字列が混ざった列は文字列にする
+        assert table.column("Memo").to_pylist() == ["1", "2", "備考", None]
+        assert table.column("NewCol").to_pylist() == [None, None, None, "x"]
@@ -30,23 +30,35 @@ export function classifyError(err: unknown): string {
   return "予期しないエラーが発生しました。";
 }
 
-export async function searchStocks(query: string): Promise<StockInfo[]> {
+/**
+ * 銘柄をコードまたは名称で検索する。
+ * 結果はコード完全一致→前方一致→部分一致の順に並び、limit件まで返る。
+ */
+export async function searchStocks(
+  query: string,
+  limit = 50,
+  offset = 0
+): Promise<StockInfo[]> {
   const { data } = await client.get<StockInfo[]>("/stocks/master", {
-    params: { q: query },
+    params: { q: query, limit, offset },
   });
   return data;
 }
 
 /**
  * 銘柄コードから銘柄情報を取得する。
- * マスタAPIで検索し、完全一致する銘柄を返す。
+ * マスタにないコードの場合はnullを返す。
  */
 export async function getStockInfo(code: string): Promise<StockInfo | null> {
-  const { data } = await client.get<StockInfo[]>("/stocks/master", {
-    params: { q: code },
-  });
-  // 銘柄コードが完全一致するものを返す
-  return data.find((s) => s.code === code) ?? null;
+  try {
+    const { data } = await client.get<StockInfo>(`/stocks/${code}`);
+    return data;
+  } catch (err) {
+    if (err instanceof AxiosError && err.response?.status === 404) {
+      return null;
+    }
+    throw err;
+  }
 }
 
 export async function getDailyQuotes(
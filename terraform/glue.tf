@@ -24,6 +24,22 @@ resource "aws_s3_object" "enrich_script" {
   etag   = filemd5("${path.module}/../data-platform/glue/enrich.py")
 }
 
+# テクニカル指標のエンジン（backend と共通）。enrich ジョブが --extra-py-files で読み込む
+resource "aws_s3_object" "indicators_module" {
+  bucket = aws_s3_bucket.glue_scripts.id
+  key    = "scripts/lib/indicators.py"
+  source = "${path.module}/../backend/app/analysis/indicators.py"
+  etag   = filemd5("${path.module}/../backend/app/analysis/indicators.py")
+}
+
+# S3 オブジェクトの並列読み込み。transform / enrich ジョブが --extra-py-files で読み込む
+resource "aws_s3_object" "s3_reader_module" {
+  bucket = aws_s3_bucket.glue_scripts.id
+  key    = "scripts/lib/s3_reader.py"
+  source = "${path.module}/../data-platform/glue/s3_reader.py"
+  etag   = filemd5("${path.module}/../data-platform/glue/s3_reader.py")
+}
+
 # ====================
 # Glue Python Shell ジョブ: Transform
 # ====================
@@ -44,12 +60,14 @@ resource "aws_glue_job" "transform" {
   default_arguments = {
     "--DATALAKE_BUCKET"           = aws_s3_bucket.datalake.id
     "--additional-python-modules" = "pyarrow==15.0.0"
+    "--extra-py-files"            = "s3://${aws_s3_bucket.glue_scripts.id}/scripts/lib/s3_reader.py"
+    "--READ_PARALLELISM"          = "8" # raw/ のファイルを同時に読み込む数
     "--job-language"              = "python"
     "--TempDir"                   = "s3://${aws_s3_bucket.glue_scripts.id}/temp/"
     "--enable-metrics"            = "true"
   }
 
-  depends_on = [aws_s3_object.transform_script]
+  depends_on = [aws_s3_object.transform_script, aws_s3_object.s3_reader_module]
 }
 
 # ====================
@@ -71,13 +89,16 @@ resource "aws_glue_job" "enrich" {
 
   default_arguments = {
     "--DATALAKE_BUCKET"           = aws_s3_bucket.datalake.id
-    "--additional-python-modules" = "pyarrow==15.0.0,ta==0.11.0"
+    "--additional-python-modules" = "pyarrow==15.0.0"
+    "--extra-py-files"            = "s3://${aws_s3_bucket.glue_scripts.id}/scripts/lib/indicators.py,s3://${aws_s3_bucket.glue_scripts.id}/scripts/lib/s3_reader.py"
+    "--READ_PARALLELISM"          = "8" # processed/daily/ のファイルを同時に読み込む数
+    "--FULL_RECOMPUTE"            = "false" # true で状態を使わず全期間を計算し直す（株式分割の遡及調整時など）
     "--job-language"              = "python"
     "--TempDir"                   = "s3://${aws_s3_bucket.glue_scripts.id}/temp/"
     "--enable-metrics"            = "true"
   }
 
-  depends_on = [aws_s3_object.enrich_script]
+  depends_on = [aws_s3_object.enrich_script, aws_s3_object.indicators_module, aws_s3_object.s3_reader_module]
 }
 
 # ====================
@@ -95,6 +116,8 @@ resource "aws_glue_crawler" "main" {
 
   s3_target {
     path = "s3://${aws_s3_bucket.datalake.id}/analytics/"
+    # enrich ジョブの指標の状態（チェックポイント）はテーブルにしない
+    exclusions = ["state/**"]
   }
 
   schema_change_policy {
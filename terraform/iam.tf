@@ -32,7 +32,8 @@ resource "aws_iam_role_policy" "lambda_ingest" {
         Action = [
           "s3:PutObject",
           "s3:GetObject",
-          "s3:ListBucket"
+          "s3:ListBucket",
+          "s3:AbortMultipartUpload" # 失敗時に途中までのマルチパートアップロードを破棄する
         ]
         Resource = [
           aws_s3_bucket.datalake.arn,
@@ -87,7 +88,8 @@ resource "aws_iam_role_policy" "glue_job" {
           "s3:GetObject",
           "s3:PutObject",
           "s3:ListBucket",
-          "s3:DeleteObject"
+          "s3:DeleteObject",
+          "s3:AbortMultipartUpload" # transform の失敗時に途中までのマルチパートアップロードを破棄する
         ]
         Resource = [
           aws_s3_bucket.datalake.arn,
@@ -24,8 +24,9 @@ resource "aws_lambda_function" "ingest" {
 
   environment {
     variables = {
-      DATALAKE_BUCKET = aws_s3_bucket.datalake.id
-      JQUANTS_API_KEY = var.jquants_api_key
+      DATALAKE_BUCKET               = aws_s3_bucket.datalake.id
+      JQUANTS_API_KEY               = var.jquants_api_key
+      JQUANTS_RATE_LIMIT_PER_MINUTE = var.jquants_rate_limit_per_minute
     }
   }
 
@@ -22,6 +22,12 @@ variable "jquants_api_key" {
   sensitive   = true
 }
 
+variable "jquants_rate_limit_per_minute" {
+  description = "J-Quants APIのリクエスト上限（回/分）。Free: 5, Light: 60, Standard: 120, Premium: 500"
+  type        = number
+  default     = 5
+}
+
 variable "schedule_expression" {
   description = "EventBridge Schedulerのスケジュール式"
   type        = string